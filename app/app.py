@@ -1,12 +1,21 @@
 #----------------------------------------------------------------------------#
 # Imports
 #----------------------------------------------------------------------------#
+from app.services.startup_profiler import startup_profiler
 from flask import Flask, render_template, redirect, url_for, request, abort, send_from_directory, render_template_string, current_app
 from flask_login import LoginManager, current_user, login_required
 from jinja2 import FileSystemLoader, ChoiceLoader, PrefixLoader
 from jinja2.exceptions import TemplateNotFound
-from app.services.auth_service_db import setup_database, init_db
+from app.services.module_loader import import_timed, load_module, get_loading_strategy, warm_up_modules, get_all_import_times
+
+# The services create_app needs are imported here, before register_blueprints; time them the same way
+for service_name in ('auth_service_db', 'log_service', 'email_queue', 'email_resender', 'email_templates'):
+    import_timed(f"app.services.{service_name}")
+from app.services.auth_service_db import setup_database, init_db, get_public_endpoints
 from app.services.log_service import init_logger
+from app.services.email_queue import init_email_queue
+from app.services.email_resender import start_resender
+from app.services.email_templates import init_email_templates
 import pkgutil
 import importlib
 from dotenv import load_dotenv
@@ -14,6 +23,8 @@ from app.app_config import Config
 from app.mod_config_manager import ConfigManager
 import os
 
+startup_profiler.mark('imports')
+
 #----------------------------------------------------------------------------#
 # Helper functions to register services and modules
 #----------------------------------------------------------------------------#
@@ -23,9 +34,10 @@ def register_blueprints(app, package_name):
     for _, module_name, is_pkg in pkgutil.iter_modules(package.__path__):
         if is_pkg:
             continue
-        module = importlib.import_module(f"app.{package_name}.{module_name}")
-        if hasattr(module, 'blueprint'):
-            app.register_blueprint(getattr(module, 'blueprint'))
+        with startup_profiler.phase(module_name):
+            module = import_timed(f"app.{package_name}.{module_name}")
+            if hasattr(module, 'blueprint'):
+                app.register_blueprint(getattr(module, 'blueprint'))
 
 #----------------------------------------------------------------------------#
 # Establish Flask User Mgmt
@@ -68,20 +80,25 @@ def setup_module_loader(app):
 #----------------------------------------------------------------------------#
 def create_app():
     # Load environment variables from .env file
-    load_dotenv()
+    with startup_profiler.phase('load_dotenv'):
+        load_dotenv()
     
     # Create the Flask app with the specified template folder
-    app = Flask(__name__)
-    app.config.from_object(Config)
+    with startup_profiler.phase('flask_app'):
+        app = Flask(__name__)
+        app.config.from_object(Config)
 
     # Setup and initialize the database
-    setup_database(app.config)
-    with app.app_context():
-        init_db()
+    with startup_profiler.phase('setup_database'):
+        setup_database(app.config)
+    with startup_profiler.phase('init_db'):
+        with app.app_context():
+            init_db()
 
     # Initialize login and config managers
-    init_login_manager(app)
-    config_manager.init_app(app)
+    with startup_profiler.phase('init_managers'):
+        init_login_manager(app)
+        config_manager.init_app(app)
 
     # Store config_manager in app for access in route functions
     app.config_manager = config_manager
@@ -89,24 +106,31 @@ def create_app():
     # Establish method to require login when enabled
     @app.before_request
     def require_login():
-        # List of endpoints that don't require login
-        public_endpoints = ['static', 'auth.login', 'auth.forgot', 'auth.reset_password', 'auth.create_password']
-        
-        if app.config['REQUIRE_LOGIN_FOR_SITE_ACCESS']:
-            if not current_user.is_authenticated and request.endpoint not in public_endpoints:
-                return redirect(url_for('auth.login', next=request.url))
+        # Public endpoints (static files, login pages) return before current_user is loaded from the database
+        if not app.config['REQUIRE_LOGIN_FOR_SITE_ACCESS'] or request.endpoint in get_public_endpoints():
+            return None
+        if not current_user.is_authenticated:
+            return redirect(url_for('auth.login', next=request.url))
 
     # Initialize the app logger service
-    init_logger(app)
+    with startup_profiler.phase('init_logger'):
+        init_logger(app)
     app.logger.info("Application started")
 
+    # Start the background email workers (routes queue emails instead of waiting on SMTP)
+    with startup_profiler.phase('email_workers'):
+        init_email_queue(app)
+        start_resender(app)
+
     return app
 
 #----------------------------------------------------------------------------#
 # Create App
 #----------------------------------------------------------------------------#
-app = create_app()
-setup_module_loader(app)
+with startup_profiler.phase('create_app'):
+    app = create_app()
+with startup_profiler.phase('setup_module_loader'):
+    setup_module_loader(app)
 
 #----------------------------------------------------------------------------#
 # Inject Config for calls to "render_template"
@@ -144,7 +168,17 @@ def about():
     return render_template('pages/about.html')
 
 # Register blueprint routes for 'services'
-register_blueprints(app, 'services')
+with startup_profiler.phase('register_blueprints'):
+    register_blueprints(app, 'services')
+
+# Precompile the email templates (blueprint template folders are now known)
+with startup_profiler.phase('init_email_templates'):
+    init_email_templates(app)
+
+# Import the enabled modules before serving when MODULE_LOADING is 'eager'
+if get_loading_strategy(app.config) == 'eager':
+    with startup_profiler.phase('warm_up_modules'):
+        warm_up_modules(app)
 
 # Error handlers
 @app.errorhandler(500)
@@ -224,7 +258,7 @@ def module_proxy(module_path):
             module_file_name = module['module_file']
             
             try:
-                module_file = importlib.import_module(f"app.modules.{module_name}.{module_file_name}")
+                module_file = load_module(module)
                 
                 if not hasattr(module_file, 'blueprint'):
                     current_app.logger.error(f"Blueprint '{blueprint_name}' not found for Module: {module_name} in File: {module_file_name}.py")
@@ -298,4 +332,9 @@ def module_proxy(module_path):
                 abort(500)
 
     # If no module matched, it's a 404
-    abort(404)
\ No newline at end of file
+    abort(404)
+
+#----------------------------------------------------------------------------#
+# Log and save the startup profile (STARTUP_PROFILE=True)
+#----------------------------------------------------------------------------#
+startup_profiler.finish(app, get_all_import_times())
@@ -1,6 +1,6 @@
 import os
 import binascii
-import json
+from app.config_store import CONFIG_SOURCES, get_config_store
 
 class Config:
     # Set debug mode 
@@ -22,6 +22,7 @@ class Config:
     USER_DATABASE_FILENAME = os.environ.get('USER_DATABASE_FILENAME') or 'users.db'
     USER_DATABASE_DIRECTORY = os.environ.get('USER_DATABASE_DIRECTORY') or './app_data/users'
     USER_DATABASE_PATH = os.path.join(USER_DATABASE_DIRECTORY, USER_DATABASE_FILENAME)
+    ROLE_COUNT_CACHE_SECONDS = float(os.environ.get('ROLE_COUNT_CACHE_SECONDS', 60))  # How long a worker reuses the users per role count
 
     # Admin User List (email addess)
     ADMIN_USER_LIST = os.environ.get('ADMIN_USER_LIST', '').split(',')
@@ -29,10 +30,25 @@ class Config:
     # Log Settings
     LOG_FILE_DIRECTORY = os.environ.get('LOG_FILE_DIRECTORY') or './app_logs'
     LOG_FILE_LEVEL = os.environ.get('LOG_FILE_LEVEL') or 'INFO'
+    LOG_FILE_FORMAT = (os.environ.get('LOG_FILE_FORMAT') or 'tsv').lower()  # 'tsv' or 'jsonl'
     LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 30))
     LOG_EMAIL_ENABLE = os.environ.get('LOG_EMAIL_ENABLE', '0').lower() in ('1', 'true', 'yes', 'on')
     LOG_EMAIL_LEVEL = os.environ.get('LOG_EMAIL_LEVEL') or 'ERROR'
     # Log email is sent to the Admin User List (above)
+    LOG_EMAIL_DIGEST_INTERVAL = float(os.environ.get('LOG_EMAIL_DIGEST_INTERVAL', 0))  # Seconds, 0 = one email per record
+    LOG_EMAIL_DIGEST_MAX_RECORDS = int(os.environ.get('LOG_EMAIL_DIGEST_MAX_RECORDS', 100))
+    LOG_EMAIL_RATE_LIMIT = float(os.environ.get('LOG_EMAIL_RATE_LIMIT', 10))  # Emails per minute
+    LOG_EMAIL_RATE_BURST = int(os.environ.get('LOG_EMAIL_RATE_BURST', 5))
+    LOG_EMAIL_MAX_PENDING = int(os.environ.get('LOG_EMAIL_MAX_PENDING', 1000))
+
+    # Live Log Tail Settings (Log Viewer)
+    LOG_TAIL_MAX_SUBSCRIBERS = int(os.environ.get('LOG_TAIL_MAX_SUBSCRIBERS', 4))
+    LOG_TAIL_POLL_INTERVAL = float(os.environ.get('LOG_TAIL_POLL_INTERVAL', 1.0))
+    LOG_TAIL_MAX_SECONDS = int(os.environ.get('LOG_TAIL_MAX_SECONDS', 300))
+
+    # Log Search Settings (Log Viewer and "flask log search")
+    LOG_SEARCH_WORKERS = int(os.environ.get('LOG_SEARCH_WORKERS', 0))  # 0 = one per CPU
+    LOG_SEARCH_MAX_RESULTS = int(os.environ.get('LOG_SEARCH_MAX_RESULTS', 5000))
 
     # Email Settings
     EMAIL_FAIL_DIRECTORY = os.environ.get('EMAIL_FAIL_DIRECTORY') or './app_data/email'
@@ -41,28 +57,49 @@ class Config:
     SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
     SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
     SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', '1').lower() in ('1', 'true', 'yes', 'on')
+    SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 4))
+    SMTP_POOL_IDLE_TIMEOUT = int(os.environ.get('SMTP_POOL_IDLE_TIMEOUT', 60))
+    EMAIL_STREAMING_THRESHOLD = int(os.environ.get('EMAIL_STREAMING_THRESHOLD', 1048576))  # Attachment bytes, -1 = never stream
+
+    # Outbound Email Queue (spooled under EMAIL_FAIL_DIRECTORY/queue)
+    EMAIL_QUEUE_ENABLE = os.environ.get('EMAIL_QUEUE_ENABLE', '1').lower() in ('1', 'true', 'yes', 'on')
+    EMAIL_QUEUE_WORKERS = int(os.environ.get('EMAIL_QUEUE_WORKERS', 2))
+    EMAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('EMAIL_QUEUE_MAX_ATTEMPTS', 6))
+    EMAIL_QUEUE_RETRY_BASE = float(os.environ.get('EMAIL_QUEUE_RETRY_BASE', 30))  # Seconds, doubled after each attempt
+
+    # Failed Email Resend (background run and "flask email resend")
+    EMAIL_RESEND_INTERVAL = int(os.environ.get('EMAIL_RESEND_INTERVAL', 300))  # Seconds, 0 = CLI only
+    EMAIL_RESEND_WORKERS = int(os.environ.get('EMAIL_RESEND_WORKERS', 4))
+    EMAIL_RESEND_RATE = float(os.environ.get('EMAIL_RESEND_RATE', 5))  # Messages per second
+    EMAIL_RESEND_MAX_ATTEMPTS = int(os.environ.get('EMAIL_RESEND_MAX_ATTEMPTS', 8))
+
+    # Announcement Emails (batch send to all users, resumable jobs under JOB_DIRECTORY)
+    EMAIL_BATCH_RATE = float(os.environ.get('EMAIL_BATCH_RATE', 10))  # Messages per second
+    EMAIL_BATCH_CHUNK_SIZE = int(os.environ.get('EMAIL_BATCH_CHUNK_SIZE', 500))  # Users read from the database per query
+    JOB_DIRECTORY = os.environ.get('JOB_DIRECTORY') or './app_data/jobs'
+
+    # Bulk user changes on the User Setup page (resumable jobs under JOB_DIRECTORY)
+    USER_BULK_CHUNK_SIZE = int(os.environ.get('USER_BULK_CHUNK_SIZE', 500))  # Users changed per statement
 
     # User Authentication reCAPTCHA
     ENABLE_REGISTRATION_CAPTCHA = False
     RECAPTCHA_SITE_KEY = os.environ.get('RECAPTCHA_SITE_KEY', '')
     RECAPTCHA_SECRET_KEY = os.environ.get('RECAPTCHA_SECRET_KEY', '')
 
+    #----------------------------------------------------------------------------
+    # Seconds between checks for .cnf files changed by another worker (0 = load once at startup)
+    CONFIG_RELOAD_INTERVAL = float(os.environ.get('CONFIG_RELOAD_INTERVAL', 2))
+
     #----------------------------------------------------------------------------
     # Module Configuration from "mod_config.cnf"
+    # Processes used to parse module files on the Module Setup page (0 = one per CPU, 1 = no process pool)
+    MODULE_DISCOVERY_WORKERS = int(os.environ.get('MODULE_DISCOVERY_WORKERS', 0))
+    # 'lazy' imports a module on its first request, 'eager' imports all enabled modules at startup
+    MODULE_LOADING = (os.environ.get('MODULE_LOADING') or 'lazy').lower()
+    MODULE_IMPORT_BUDGET_MS = int(os.environ.get('MODULE_IMPORT_BUDGET_MS', 500))  # Slower imports are logged and flagged
     MOD_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'mod_config.cnf')
 
-    @staticmethod
-    def load_module_config(MOD_CONFIG_PATH):
-        if os.path.exists(MOD_CONFIG_PATH):
-            with open(MOD_CONFIG_PATH, 'r') as f:
-                config = json.load(f)
-                # Only return the config if it's in the new format (list of dicts)
-                if isinstance(config, list) and all(isinstance(item, dict) for item in config):
-                    return config
-        return []  # Return an empty list if the file doesn't exist or is in the old format
-
-    MODULE_LIST = load_module_config(MOD_CONFIG_PATH)
-    
     # Define the GUI config path to part of the Config class
     GUI_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'gui_config.cnf')
 
@@ -73,33 +110,10 @@ class Config:
     USER_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'user_config.cnf')
 
 #----------------------------------------------------------------------------
-# Integrate GUI Config attributes from "gui_config.cnf"
-# Must be done AFTER the class has been defined
-with open(Config.GUI_CONFIG_PATH, 'r') as f:
-    gui_config = json.load(f)
+# Integrate the admin-saved settings (GUI, role, user and module .cnf files)
+# Must be done AFTER the class has been defined. The files are read and
+# validated once into CONFIG_STORE; Config gets plain copies for app.config.
+CONFIG_STORE = get_config_store({key: getattr(Config, key) for key in CONFIG_SOURCES})
 
-for key, value in gui_config.items():
+for key, value in CONFIG_STORE.as_config().items():
     setattr(Config, key, value)
-
-#----------------------------------------------------------------------------
-# Integrate Role Config attributes from "role_config.cnf"
-# Must be done AFTER the class has been defined
-if os.path.exists(Config.ROLE_CONFIG_PATH):
-    with open(Config.ROLE_CONFIG_PATH, 'r') as f:
-        role_config = json.load(f)
-    setattr(Config, 'ROLE_LIST', role_config)
-else:
-    setattr(Config, 'ROLE_LIST', [])
-
-#----------------------------------------------------------------------------
-# Integrate User Config attributes from "user_config.cnf"
-# Must be done AFTER the class has been defined
-if os.path.exists(Config.USER_CONFIG_PATH):
-    with open(Config.USER_CONFIG_PATH, 'r') as f:
-        user_config = json.load(f)
-    for key, value in user_config.items():
-        setattr(Config, key, value)
-else:
-    # Set default values if the file doesn't exist
-    setattr(Config, 'DISABLE_SELF_REGISTRATION', False)
-    setattr(Config, 'REQUIRE_LOGIN_FOR_SITE_ACCESS', False)
\ No newline at end of file
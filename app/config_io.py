@@ -0,0 +1,106 @@
+import os
+import json
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class ConfigConflictError(Exception):
+    # The file was saved by someone else since it was read
+    def __init__(self, path, expected_version, current_version):
+        super().__init__(f"{os.path.basename(path)} was changed by another user (version {current_version}, expected {expected_version})")
+        self.path = path
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+#----------------------------------------------------------------------------#
+# Config file persistence shared by the admin setup pages (.cnf JSON files)
+#
+# Writers hold an advisory lock on "<file>.lock", write a temporary file,
+# fsync it and rename it over the config file, so readers in any worker see
+# either the old or the new file. The lock file also holds a version number
+# that goes up with every save; a writer that passes the version it read
+# gets ConfigConflictError instead of overwriting a newer save.
+#----------------------------------------------------------------------------#
+def _lock_path(path):
+    return f"{path}.lock"
+
+@contextmanager
+def config_lock(path, shared=False):
+    # Yields the open lock file (its content is the version number). Only writers create
+    # the lock file; a shared lock on a file that was never saved yields None (version 0)
+    if shared:
+        try:
+            lock_file = open(_lock_path(path), 'r')
+        except FileNotFoundError:
+            yield None
+            return
+    else:
+        lock_file = open(_lock_path(path), 'a+')
+
+    with lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield lock_file
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _read_version(lock_file):
+    if lock_file is None:
+        return 0
+    lock_file.seek(0)
+    content = lock_file.read().strip()
+    return int(content) if content.isdigit() else 0
+
+def _write_version(lock_file, version):
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(version))
+    lock_file.flush()
+
+def get_config_version(path):
+    with config_lock(path, shared=True) as lock_file:
+        return _read_version(lock_file)
+
+def read_config(path, default=None):
+    # Returns (data, version); data is "default" if the file does not exist
+    with config_lock(path, shared=True) as lock_file:
+        version = _read_version(lock_file)
+        if not os.path.exists(path):
+            return default, version
+        with open(path, 'r') as f:
+            return json.load(f), version
+
+def write_config(path, data, expected_version=None, indent=4):
+    # Returns the new version
+    with config_lock(path) as lock_file:
+        version = _read_version(lock_file)
+        if expected_version is not None and expected_version != version:
+            raise ConfigConflictError(path, expected_version, version)
+
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        _write_version(lock_file, version + 1)
+        return version + 1
@@ -0,0 +1,275 @@
+import os
+import logging
+from types import MappingProxyType
+from app.config_io import read_config
+
+logger = logging.getLogger(__name__)
+
+class ConfigValidationError(ValueError):
+    def __init__(self, source, message):
+        super().__init__(f"{source}: {message}")
+        self.source = source
+
+def _frozen(value):
+    # JSON lists and objects as tuples and read-only mappings
+    if isinstance(value, dict):
+        return MappingProxyType({key: _frozen(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_frozen(item) for item in value)
+    return value
+
+def _plain(value):
+    # Mutable copy for app.config
+    if isinstance(value, FrozenConfig):
+        return value.to_dict()
+    if isinstance(value, MappingProxyType):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_plain(item) for item in value]
+    return value
+
+#----------------------------------------------------------------------------#
+# Typed, read-only config records (validation on load)
+#
+# FIELDS lists (name, type(s), default); a default of REQUIRED must be in the
+# file. Values are checked on load: a value of the wrong type is logged and
+# replaced by the default. Lists become tuples and objects become read-only
+# mappings. Keys without a field are kept as they are (item access and
+# to_dict), so settings added by hand or by newer code still reach
+# app.config. The records are not read on the request path: app.config gets
+# plain copies (ConfigStore.as_config), which the admin pages edit in place.
+#----------------------------------------------------------------------------#
+REQUIRED = object()
+
+class FrozenConfig:
+    __slots__ = ('_extra',)
+    FIELDS = ()
+
+    def __init__(self, _extra=None, **values):
+        for name, _, default in self.FIELDS:
+            object.__setattr__(self, name, values.get(name, default))
+        object.__setattr__(self, '_extra', MappingProxyType(dict(_extra or {})))
+
+    @classmethod
+    def from_dict(cls, data, source):
+        if not isinstance(data, dict):
+            raise ConfigValidationError(source, f"expected an object, got {type(data).__name__}")
+        values = {}
+        for name, kinds, default in cls.FIELDS:
+            if name not in data:
+                if default is REQUIRED:
+                    raise ConfigValidationError(source, f"'{name}' is required")
+                continue
+            value = data[name]
+            if not isinstance(value, kinds) or (isinstance(value, bool) and bool not in _as_tuple(kinds)):
+                if default is REQUIRED:
+                    raise ConfigValidationError(source, f"'{name}' must be {_type_names(kinds)}, got {type(value).__name__}")
+                logger.warning(f"{source}: '{name}' must be {_type_names(kinds)}, got {type(value).__name__}; using the default")
+                continue
+            values[name] = _frozen(value)
+        extra = {key: _frozen(value) for key, value in data.items() if key not in cls.__slots__}
+        return cls(_extra=extra, **values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __getitem__(self, name):
+        if name in self.__slots__:
+            return getattr(self, name)
+        return self._extra[name]
+
+    def __contains__(self, name):
+        return name in self.__slots__ or name in self._extra
+
+    def keys(self):
+        return self.__slots__ + tuple(self._extra)
+
+    def to_dict(self):
+        return {name: _plain(self[name]) for name in self.keys()}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+def _as_tuple(kinds):
+    return kinds if isinstance(kinds, tuple) else (kinds,)
+
+def _type_names(kinds):
+    return ' or '.join('null' if kind is type(None) else kind.__name__ for kind in _as_tuple(kinds))
+
+class GuiSettings(FrozenConfig):
+    __slots__ = ('COMPANY_NAME', 'COMPANY_ADDRESS', 'COMPANY_CONTACT', 'JURISDICTION', 'BODY_COLOR', 'PROJECT_NAME', 'PROJECT_NAME_COLOR')
+    FIELDS = (
+        ('COMPANY_NAME', str, ''),
+        ('COMPANY_ADDRESS', str, ''),
+        ('COMPANY_CONTACT', str, ''),
+        ('JURISDICTION', str, ''),
+        ('BODY_COLOR', str, '#ffffff'),
+        ('PROJECT_NAME', str, 'Flask Modular Template'),
+        ('PROJECT_NAME_COLOR', str, '#000000'),
+    )
+
+class AccessSettings(FrozenConfig):
+    __slots__ = ('REQUIRE_LOGIN_FOR_SITE_ACCESS', 'DISABLE_SELF_REGISTRATION', 'ENABLE_REGISTRATION_CAPTCHA', 'ENABLE_EULA', 'ENABLE_EULA_ACKNOWLEDGEMENT')
+    FIELDS = (
+        ('REQUIRE_LOGIN_FOR_SITE_ACCESS', bool, False),
+        ('DISABLE_SELF_REGISTRATION', bool, False),
+        ('ENABLE_REGISTRATION_CAPTCHA', bool, False),
+        ('ENABLE_EULA', bool, False),
+        ('ENABLE_EULA_ACKNOWLEDGEMENT', bool, False),
+    )
+
+class RoleConfig(FrozenConfig):
+    __slots__ = ('name', 'description', 'modules')
+    FIELDS = (
+        ('name', str, REQUIRED),
+        ('description', (str, type(None)), ''),
+        ('modules', list, ()),
+    )
+
+class ModuleConfig(FrozenConfig):
+    __slots__ = ('name', 'blueprint', 'primary_route', 'routes', 'module_file', 'menu_name', 'enabled', 'order')
+    FIELDS = (
+        ('name', str, REQUIRED),
+        ('blueprint', (str, type(None)), None),
+        ('primary_route', (str, type(None)), None),
+        ('routes', dict, MappingProxyType({})),
+        ('module_file', (str, type(None)), None),
+        ('menu_name', (str, type(None)), None),
+        ('enabled', bool, False),
+        ('order', int, 0),
+    )
+
+#----------------------------------------------------------------------------#
+# Section loaders: parsed JSON of one .cnf file -> typed section
+#----------------------------------------------------------------------------#
+def load_gui(data, source):
+    return GuiSettings.from_dict(data, source)
+
+def load_access(data, source):
+    return AccessSettings.from_dict(data, source)
+
+def load_roles(data, source):
+    if not isinstance(data, list):
+        raise ConfigValidationError(source, f"expected a list of roles, got {type(data).__name__}")
+    roles = tuple(RoleConfig.from_dict(role, f"{source}[{i}]") for i, role in enumerate(data))
+    if len({role.name for role in roles}) != len(roles):
+        raise ConfigValidationError(source, "role names must be unique")
+    return roles
+
+def load_modules(data, source):
+    # Files in the old (pre list of dicts) format are ignored, the module scan writes a new one
+    if not isinstance(data, list) or not all(isinstance(module, dict) for module in data):
+        return ()
+    return tuple(ModuleConfig.from_dict(module, f"{source}[{i}]") for i, module in enumerate(data))
+
+# app.config path key -> (ConfigStore section, loader)
+CONFIG_SOURCES = {
+    'MOD_CONFIG_PATH': ('modules', load_modules),
+    'GUI_CONFIG_PATH': ('gui', load_gui),
+    'ROLE_CONFIG_PATH': ('roles', load_roles),
+    'USER_CONFIG_PATH': ('access', load_access),
+}
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def read_source(path_key, path):
+    # Returns (section name, typed section, signature, version); raises ConfigValidationError or OSError
+    # The data and its version come from one read under the config file lock
+    section, loader = CONFIG_SOURCES[path_key]
+    signature = file_signature(path)
+    try:
+        data, version = read_config(path)
+    except ValueError as e:
+        raise ConfigValidationError(os.path.basename(path), f"invalid JSON ({str(e)})")
+    return section, loader(data, os.path.basename(path)), signature, version
+
+#----------------------------------------------------------------------------#
+# All admin-saved settings in one read-only object
+#
+# Holds the validated files with their signatures (change detection) and
+# config_io versions (the admin pages' conflict check), and fills app.config
+#----------------------------------------------------------------------------#
+class ConfigStore:
+    __slots__ = ('gui', 'access', 'roles', 'modules', 'signatures', 'versions')
+
+    def __init__(self, gui=None, access=None, roles=(), modules=(), signatures=None, versions=None):
+        object.__setattr__(self, 'gui', gui or GuiSettings())
+        object.__setattr__(self, 'access', access or AccessSettings())
+        object.__setattr__(self, 'roles', tuple(roles))
+        object.__setattr__(self, 'modules', tuple(modules))
+        object.__setattr__(self, 'signatures', MappingProxyType(dict(signatures or {})))
+        object.__setattr__(self, 'versions', MappingProxyType(dict(versions or {})))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigStore is read-only")
+
+    def replace(self, signatures=None, versions=None, **sections):
+        values = {name: getattr(self, name) for name in ('gui', 'access', 'roles', 'modules')}
+        values.update(sections)
+        merged = dict(self.signatures)
+        merged.update(signatures or {})
+        merged_versions = dict(self.versions)
+        merged_versions.update(versions or {})
+        return ConfigStore(signatures=merged, versions=merged_versions, **values)
+
+    def version(self, path_key):
+        # config_io version of the file the section was read from (0 if it was never saved)
+        return self.versions.get(path_key, 0)
+
+    def section_keys(self, section):
+        # app.config keys filled from one section
+        if section == 'roles':
+            return ('ROLE_LIST',)
+        if section == 'modules':
+            return ('MODULE_LIST',)
+        return getattr(self, section).keys()
+
+    def __getitem__(self, key):
+        if key == 'ROLE_LIST':
+            return self.roles
+        if key == 'MODULE_LIST':
+            return self.modules
+        for section in (self.gui, self.access):
+            if key in section:
+                return section[key]
+        raise KeyError(key)
+
+    def as_config(self, sections=('gui', 'access', 'roles', 'modules')):
+        # Plain (mutable) values for app.config, which admin pages edit in place
+        config = {}
+        for section in sections:
+            for key in self.section_keys(section):
+                config[key] = _plain(self[key])
+        return config
+
+def load_config_store(paths):
+    # paths: app.config path key -> file; missing files keep the defaults
+    sections = {}
+    signatures = {}
+    versions = {}
+    for path_key, path in paths.items():
+        if path_key not in CONFIG_SOURCES or not path or not os.path.exists(path):
+            continue
+        section, value, signatures[path_key], versions[path_key] = read_source(path_key, path)
+        sections[section] = value
+    return ConfigStore(signatures=signatures, versions=versions, **sections)
+
+# Stores already loaded in this process, so app_config and the ConfigManager share one read
+_loaded_stores = {}
+
+def get_config_store(paths):
+    key = tuple(sorted((path_key, path) for path_key, path in paths.items() if path_key in CONFIG_SOURCES))
+    if key not in _loaded_stores:
+        _loaded_stores[key] = load_config_store(dict(key))
+    return _loaded_stores[key]
@@ -1,7 +1,17 @@
-import json
 import threading
+import time
 import os
+from app.config_store import CONFIG_SOURCES, ConfigStore, file_signature, read_source, get_config_store
 
+#----------------------------------------------------------------------------#
+# Config snapshot service
+#
+# Every worker process watches the .cnf files (mtime and size, checked at most
+# every CONFIG_RELOAD_INTERVAL seconds before a request). A change builds a new
+# read-only ConfigStore that replaces the old one in a single assignment, and
+# the changed keys are copied into app.config, so a save in one worker reaches
+# the others without a restart.
+#----------------------------------------------------------------------------#
 class ConfigManager:
     _instance = None
     _lock = threading.Lock()
@@ -11,24 +21,76 @@ class ConfigManager:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(ConfigManager, cls).__new__(cls)
-                    cls._instance.module_config = {}
+                    cls._instance.snapshot = ConfigStore()
+                    cls._instance.version = 0
+                    cls._instance.next_check = 0
+                    cls._instance.reload_lock = threading.Lock()
         return cls._instance
 
     def init_app(self, app):
         self.app = app
+        self.interval = float(app.config.get('CONFIG_RELOAD_INTERVAL', 2))
+
+        # Start from the store read when app_config was imported (same files), or read them now
+        try:
+            self.snapshot = get_config_store({key: app.config.get(key) for key in CONFIG_SOURCES})
+        except (OSError, ValueError) as e:
+            app.logger.warning(f"Failed to load the config files, using defaults. Reason: {str(e)}")
+            self.snapshot = ConfigStore()
+        loaded = [CONFIG_SOURCES[path_key][0] for path_key in self.snapshot.signatures]
+        app.config.update(self.snapshot.as_config(loaded))
         self.load_config()
 
+        if self.interval > 0:
+            app.before_request(self.check_for_changes)
+
     def load_config(self):
-        with self.app.app_context():
-            mod_config_path = self.app.config['MOD_CONFIG_PATH']
-            if os.path.exists(mod_config_path):
-                with open(mod_config_path, 'r') as f:
-                    self.module_config = json.load(f)
-            else:
-                self.module_config = {"MODULE_LIST": []}
+        # Re-read the files that changed since the last load; returns True if the snapshot was replaced
+        with self.reload_lock:
+            store = self.snapshot
+            sections = {}
+            signatures = {}
+            versions = {}
+            for path_key in CONFIG_SOURCES:
+                path = self.app.config.get(path_key)
+                signature = file_signature(path)
+                if signature is None or signature == store.signatures.get(path_key):
+                    continue
+                try:
+                    section, value, signature, version = read_source(path_key, path)
+                except (OSError, ValueError) as e:
+                    # Possibly caught mid-write (or not valid), the file is read again at the next check
+                    self.app.logger.warning(f"Failed to load {os.path.basename(path)}, keeping the current settings. Reason: {str(e)}")
+                    continue
+                sections[section] = value
+                signatures[path_key] = signature
+                versions[path_key] = version
+
+            if not sections:
+                return False
+
+            self.snapshot = store.replace(signatures=signatures, versions=versions, **sections)
+            self.version += 1
+            self.app.config.update(self.snapshot.as_config(sections))
+            return True
+
+    def check_for_changes(self):
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.interval
+        if self.load_config():
+            self.app.logger.info(f"Configuration reloaded from disk (version {self.version})")
+
+    def get_config_version(self, path_key):
+        # Version of the file the current settings were read from, for the admin pages' conflict check
+        return self.snapshot.version(path_key)
 
     def get_module_config(self):
-        return self.module_config
+        return self.snapshot.as_config(['modules'])['MODULE_LIST']
 
     def reload_config(self):
-        self.load_config()
\ No newline at end of file
+        with self.reload_lock:
+            store = self.snapshot
+            self.snapshot = ConfigStore(gui=store.gui, access=store.access, roles=store.roles, modules=store.modules)
+        return self.load_config()
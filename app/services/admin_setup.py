@@ -1,19 +1,33 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, session, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, session, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from app.services.auth_service import create_user_account
-from app.services.auth_service_db import is_email_taken, get_user, admin_required, get_all_users, update_user_role, delete_user, get_role_user_counts, get_default_role, update_default_role, generate_token
+from app.services.auth_service_db import is_email_taken, get_user, admin_required, query_users, count_user_list, USER_SORT_KEYS, update_user_role, delete_user, get_role_user_counts, get_default_role, update_default_role, generate_token
 from app.services.email_service import EmailService
+from app.services.email_pool import new_smtp_pool
+from app.services.email_queue import queue_email, get_email_queue
+from app.services.email_templates import render_email
+from app.services.email_resender import FailedEmailResender
+from app.services.email_batch import create_announcement, start_announcement, list_announcements
+from app.services.job_service import is_job_interrupted
+from app.services.user_csv import import_users_csv, iter_users_csv, iter_roles_csv, CsvImportError
+from app.services.user_bulk import BULK_USER_ACTIONS, create_bulk_job, list_bulk_jobs, start_bulk_job, describe_bulk_job
+from app.services.module_discovery import discover_modules, get_discovery_workers
+from app.services.module_loader import get_module_import_times, get_service_import_times, get_loading_strategy
 from app.mod_config_manager import ConfigManager
+from app.config_io import write_config, get_config_version, ConfigConflictError
 import os
+import csv
 import json
-import ast
 import re
+from datetime import datetime
 from collections import defaultdict
 
 blueprint = Blueprint('admin', __name__, template_folder='admin_templates')
 config_manager = ConfigManager()
 
+CONFIG_CONFLICT_MSG = 'These settings were changed by another administrator. The page now shows the latest settings, please make your change again.'
+
 # Define the admin sidebar menu once
 ADMIN_SIDEBAR_MENU = [
     {'icon': 'fas fa-cog', 'text': 'GUI Setup', 'action': 'showAdminSetup', 'params': ['gui']},
@@ -33,76 +47,53 @@ def update_module_list(app):
     existing_modules = {m['name']: m for m in app.config.get('MODULE_LIST', [])}
     updated_modules = []
 
-    for module_folder in os.listdir(modules_dir):
-        module_path = os.path.join(modules_dir, module_folder)
-        
-        if os.path.isdir(module_path):
-            try:
-                module_info = extract_module_info(module_path, module_folder)
-                if module_info:
-                    if module_folder in existing_modules:
-                        # Preserve existing menu name, enabled status, and order
-                        module_info['menu_name'] = existing_modules[module_folder]['menu_name']
-                        module_info['enabled'] = existing_modules[module_folder]['enabled']
-                        module_info['order'] = existing_modules[module_folder]['order']
-                    else:
-                        # New module: use primary route as menu name, set as disabled by default, and add to end of list
-                        default_menu_name = ' '.join(word.capitalize() for word in module_info['primary_route'].strip('/').replace('_', ' ').split())
-                        module_info['menu_name'] = default_menu_name
-                        module_info['enabled'] = False
-                        module_info['order'] = len(existing_modules)
-                    updated_modules.append(module_info)
-            except Exception as e:
-                current_app.logger.error(f"Error processing module {module_folder}: {str(e)}")
+    for module_folder, module_info in discover_modules(modules_dir, get_discovery_workers(app.config)):
+        if module_info:
+            if module_folder in existing_modules:
+                # Preserve existing menu name, enabled status, and order
+                module_info['menu_name'] = existing_modules[module_folder]['menu_name']
+                module_info['enabled'] = existing_modules[module_folder]['enabled']
+                module_info['order'] = existing_modules[module_folder]['order']
+            else:
+                # New module: use primary route as menu name, set as disabled by default, and add to end of list
+                default_menu_name = ' '.join(word.capitalize() for word in module_info['primary_route'].strip('/').replace('_', ' ').split())
+                module_info['menu_name'] = default_menu_name
+                module_info['enabled'] = False
+                module_info['order'] = len(existing_modules)
+            updated_modules.append(module_info)
 
     # Sort modules based on their order
     updated_modules.sort(key=lambda x: x['order'])
 
+    # Only save when a module was added, removed or changed (every save bumps the config version)
+    changed = strip_module_status(updated_modules) != strip_module_status(app.config.get('MODULE_LIST', []))
+
     # Update the MODULE_LIST in the app config
     app.config['MODULE_LIST'] = updated_modules
 
-    # Save the updated MODULE_LIST to mod_config.cnf
-    try:
-        save_module_config(app)
-    except Exception as e:
-        current_app.logger.error(f"Error saving module configuration: {str(e)}")
-
-def extract_module_info(module_path, module_name):
-    module_info = {
-        'name': module_name,
-        'blueprint': None,
-        'primary_route': None,
-        'routes': {},
-        'module_file': None
-    }
-    
-    for file_name in os.listdir(module_path):
-        if file_name.endswith('.py'):
-            file_path = os.path.join(module_path, file_name)
-            try:
-                with open(file_path, 'r') as file:
-                    tree = ast.parse(file.read())
-                    for node in ast.walk(tree):
-                        if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name) and node.targets[0].id == 'blueprint':
-                            if isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name) and node.value.func.id == 'Blueprint':
-                                module_info['blueprint'] = node.value.args[0].s
-                                module_info['module_file'] = file_name[:-3]  # Remove .py extension
-                        elif isinstance(node, ast.FunctionDef):
-                            for decorator in node.decorator_list:
-                                if isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute) and decorator.func.attr == 'route':
-                                    route = decorator.args[0].s if decorator.args else ''
-                                    module_info['routes'][route] = node.name
-                                    if module_info['primary_route'] is None or len(route) < len(module_info['primary_route']):
-                                        module_info['primary_route'] = route
-            except Exception as e:
-                current_app.logger.error(f"Error parsing file {file_path}: {str(e)}")
-    
-    return module_info if module_info['routes'] and module_info['module_file'] else None
+    # Save the updated MODULE_LIST to mod_config.cnf (returns the new version)
+    if changed:
+        try:
+            return save_module_config(app)
+        except Exception as e:
+            current_app.logger.error(f"Error saving module configuration: {str(e)}")
+
+def strip_module_status(modules):
+    # "status" is only computed for display on the module setup page
+    return [{key: value for key, value in module.items() if key != 'status'} for module in modules]
+
+def save_module_config(app, expected_version=None):
+    return write_config(app.config['MOD_CONFIG_PATH'], strip_module_status(app.config['MODULE_LIST']), expected_version, indent=2)
 
-def save_module_config(app):
-    config_path = os.path.join(app.root_path, 'mod_config.cnf')
-    with open(config_path, 'w') as config_file:
-        json.dump(app.config['MODULE_LIST'], config_file, indent=2)
+def load_config_version(path_key):
+    # Re-read the config files saved since the last check, so a page shows the settings
+    # and the version they were read with (the version a save is checked against)
+    if getattr(current_app, 'config_manager', None) is not config_manager:
+        # App without the config reload service (tests), read the version from the file
+        path = current_app.config.get(path_key)
+        return get_config_version(path) if path else 0
+    config_manager.load_config()
+    return config_manager.get_config_version(path_key)
 
 # Define blueprint for setup routes
 @blueprint.route('/setup', methods=['GET', 'POST'])
@@ -131,6 +122,7 @@ def setup_type(setup_type):
 
 def setup_gui():
     gui_config_path = current_app.config['GUI_CONFIG_PATH']
+    config_version = load_config_version('GUI_CONFIG_PATH')
     
     if request.method == 'POST':
         try:
@@ -147,8 +139,7 @@ def setup_gui():
                 'PROJECT_NAME_COLOR': request.form.get('project_name_color')
             }
 
-            with open(gui_config_path, 'w') as f:
-                json.dump(new_gui_values, f, indent=4)
+            config_version = write_config(gui_config_path, new_gui_values, request.form.get('config_version', type=int))
             
             for key, value in new_gui_values.items():
                 current_app.config[key] = value
@@ -156,6 +147,12 @@ def setup_gui():
             flash('GUI configuration updated successfully!', 'success')
             current_app.logger.info("GUI configuration updated successfully")
 
+        except ConfigConflictError as e:
+            flash(CONFIG_CONFLICT_MSG, 'warning')
+            current_app.logger.warning(f"GUI configuration not saved: {str(e)}")
+            config_manager.reload_config()
+            config_version = config_manager.get_config_version('GUI_CONFIG_PATH')
+
         except Exception as e:
             flash(f'Error updating GUI configuration: {str(e)}', 'danger')
             current_app.logger.error(f"Error updating GUI configuration: {str(e)}")
@@ -209,11 +206,13 @@ def setup_gui():
 
     return render_template('pages/admin_setup_gui.html', 
                            form_data=form_data, 
+                           config_version=config_version,
                            use_sidebar=True,
                            sidebar_menu=ADMIN_SIDEBAR_MENU)
 
 def setup_modules():
-    update_module_list(current_app)
+    config_version = load_config_version('MOD_CONFIG_PATH')
+    config_version = update_module_list(current_app) or config_version  # A module scan that finds changes saves the file
     
     # Get the list of roles
     roles = current_app.config.get('ROLE_LIST', [])
@@ -263,12 +262,21 @@ def setup_modules():
                     module['menu_name'] = request.form.get(f"menu_name_{module_name}", module['menu_name'])
             
             current_app.config['MODULE_LIST'].sort(key=lambda x: x['order'])
-            save_module_config(current_app)
+            config_version = save_module_config(current_app, request.form.get('config_version', type=int))
             
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({'status': 'success', 'message': 'Module configuration updated successfully!'})
             else:
                 flash('Module configuration updated successfully!', 'success')
+
+        except ConfigConflictError as e:
+            current_app.logger.warning(f"Module configuration not saved: {str(e)}")
+            config_manager.reload_config()
+            config_version = config_manager.get_config_version('MOD_CONFIG_PATH')
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({'status': 'error', 'message': CONFIG_CONFLICT_MSG}), 409
+            else:
+                flash(CONFIG_CONFLICT_MSG, 'warning')
                 
         except Exception as e:
             current_app.logger.error(f"Error saving module configuration: {str(e)}")
@@ -279,10 +287,16 @@ def setup_modules():
     
     return render_template('pages/admin_setup_modules.html', 
                            modules=current_app.config['MODULE_LIST'],
+                           import_times=get_module_import_times(current_app.config['MODULE_LIST']),
+                           service_import_times=get_service_import_times(),
+                           loading_strategy=get_loading_strategy(current_app.config),
+                           import_budget_ms=current_app.config.get('MODULE_IMPORT_BUDGET_MS', 500),
+                           config_version=config_version,
                            use_sidebar=True,
                            sidebar_menu=ADMIN_SIDEBAR_MENU)
 
 def setup_roles():
+    config_version = load_config_version('ROLE_CONFIG_PATH')
     roles = current_app.config['ROLE_LIST']
     modules = current_app.config['MODULE_LIST']
     default_role = get_default_role()
@@ -330,7 +344,7 @@ def setup_roles():
         
         elif action == 'delete_role':
             role_name = request.form.get('role_name')
-            if user_counts.get(role_name, 0) == 0:
+            if count_user_list(role=role_name) == 0:  # Exact count, not the cached one
                 roles = [role for role in roles if role['name'] != role_name]
                 if default_role == role_name:
                     update_default_role(None)
@@ -367,30 +381,40 @@ def setup_roles():
         # Save updated roles (if changed)
         if ( len(success_msg) > 0) :
             try:
-                with open(current_app.config['ROLE_CONFIG_PATH'], 'w') as f:
-                    json.dump(roles, f, indent=4)
+                config_version = write_config(current_app.config['ROLE_CONFIG_PATH'], roles, request.form.get('config_version', type=int))
 
                 flash(success_msg, 'success')
 
+                # Update the config
+                current_app.config['ROLE_LIST'] = roles
+
+            except ConfigConflictError as e:
+                current_app.logger.warning(f"Role configuration not saved: {str(e)}")
+                flash(CONFIG_CONFLICT_MSG, 'warning')
+                config_manager.reload_config()
+                config_version = config_manager.get_config_version('ROLE_CONFIG_PATH')
+                roles = current_app.config['ROLE_LIST']
+
             except Exception as e:
                 current_app.logger.error(f"Error saving role configuration: {str(e)}")
                 flash('Error saving role config (for details, see \'Log Viewer\')', 'danger')        
 
-            # Update the config
-            current_app.config['ROLE_LIST'] = roles
+                # Update the config
+                current_app.config['ROLE_LIST'] = roles
 
             # Refresh roles_with_counts after any changes
             roles_with_counts = add_user_counts(roles)
 
     return render_template('pages/admin_setup_roles.html', 
                         roles=roles_with_counts, 
+                        config_version=config_version,
                         modules=modules,
                         default_role=default_role,
                         use_sidebar=True,
                         sidebar_menu=ADMIN_SIDEBAR_MENU)
 
 def setup_users():
-    users = get_all_users()
+    config_version = load_config_version('USER_CONFIG_PATH')
     roles = current_app.config['ROLE_LIST']
 
     if request.method == 'POST':
@@ -437,12 +461,16 @@ def setup_users():
                     'ENABLE_EULA_ACKNOWLEDGEMENT': request.form.get('enable_eula_acknowledgement') == 'on'
                 }
 
-                with open(current_app.config['USER_CONFIG_PATH'], 'w') as f:
-                    json.dump(user_config, f, indent=4)
+                config_version = write_config(current_app.config['USER_CONFIG_PATH'], user_config, request.form.get('config_version', type=int))
 
                 current_app.config.update(user_config)
                 flash('Access options updated successfully', 'success')
 
+            except ConfigConflictError as e:
+                current_app.logger.warning(f"Access options not saved: {str(e)}")
+                flash(CONFIG_CONFLICT_MSG, 'warning')
+                config_manager.reload_config()
+
             except Exception as e:
                 current_app.logger.error(f"Failed to update access options: {str(e)}")
                 flash(f'Failed to update access options: {str(e)}', 'danger')
@@ -468,10 +496,9 @@ def setup_users():
             activation_link = url_for('auth.create_password', token=token, _external=True)
             
             # Send activation email
-            email_body = render_template('email/new_user_activation_email.html', username=new_username, activation_link=activation_link)
+            email_body, email_text = render_email('email/new_user_activation_email.html', username=new_username, activation_link=activation_link)
             
-            email_service = EmailService(current_app.config)
-            result = email_service.send_email([new_email], f"Activate your {current_app.config['PROJECT_NAME']} Account", email_body, html=True)
+            result = queue_email(current_app.config, [new_email], f"Activate your {current_app.config['PROJECT_NAME']} Account", email_body, html=True, text=email_text)
 
             if result.success:
                 flash(f'User {new_username} added successfully. An activation email has been sent.', 'success')
@@ -480,16 +507,123 @@ def setup_users():
                 flash(f'User {new_username} added successfully, but failed to send activation email: {result.message} (for details, see \'Log Viewer\')', 'danger no-auto-dismiss')
                 return jsonify({'status': 'success', 'message': f'User {new_username} added successfully. BUT activation email has NOT been sent.'})
             
+        elif action == 'import_users':
+            upload = request.files.get('users_csv')
+            if not upload or not upload.filename:
+                return jsonify({'status': 'error', 'message': 'Choose a CSV file to import'}), 400
+
+            try:
+                result = import_users_csv(upload.stream, {role['name'] for role in roles},
+                                          send_activation=request.form.get('send_activation') == 'on')
+            except CsvImportError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            except (UnicodeDecodeError, csv.Error) as e:
+                return jsonify({'status': 'error', 'message': f'The file is not a valid UTF-8 CSV file: {str(e)}'}), 400
+
+            message = (f"{result['added']} users added, {result['existing']} already registered, "
+                       f"{result['duplicates']} duplicate and {result['invalid']} invalid rows skipped.")
+            if result['email_failed']:
+                message += f" {result['email_failed']} activation emails could not be sent (for details, see 'Log Viewer')."
+            flash(message, 'success' if not result['invalid'] and not result['email_failed'] else 'warning')
+            return jsonify({'status': 'success', 'message': message, 'result': result})
+
+        elif action == 'bulk_users':
+            bulk_action = request.form.get('bulk_action')
+            bulk_role = request.form.get('bulk_role') or None
+            if bulk_action not in BULK_USER_ACTIONS:
+                return jsonify({'status': 'error', 'message': 'Choose a bulk action'}), 400
+            if bulk_role and bulk_role not in {role['name'] for role in roles}:
+                return jsonify({'status': 'error', 'message': f"Unknown role: {bulk_role}"}), 400
+
+            # The admin never deactivates or deletes their own account this way
+            filters = user_list_filters(request.form.get('filter_role'), request.form.get('filter_active'), request.form.get('filter_email'))
+            job = create_bulk_job(current_app.config, bulk_action, filters, role=bulk_role,
+                                  exclude_ids=[current_user.id] if bulk_action in ('deactivate', 'delete') else [],
+                                  created_by=current_user.email)
+            start_bulk_job(current_app._get_current_object(), job['id'])
+            current_app.logger.info(f"Bulk user change {describe_bulk_job(job['params'])} started for {job['progress']['total']} users")
+            return jsonify({'status': 'success', 'message': f"Changing {job['progress']['total']} users", 'job': job})
+
+        elif action == 'bulk_status':
+            jobs = list_bulk_jobs(current_app.config)
+            for job in jobs:
+                job['interrupted'] = is_job_interrupted(job)
+                job['description'] = describe_bulk_job(job['params'])
+                job['params'].pop('exclude_ids', None)
+            return jsonify({'status': 'success', 'jobs': jobs})
+
+        elif action == 'resume_bulk':
+            if start_bulk_job(current_app._get_current_object(), request.form.get('job_id')):
+                return jsonify({'status': 'success', 'message': 'Bulk change resumed'})
+            return jsonify({'status': 'error', 'message': 'Bulk change is finished or still running'})
+
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'status': 'success'})
         return redirect(url_for('admin.setup_type', setup_type='users'))
 
     return render_template('pages/admin_setup_users.html', 
-                           users=users,
                            roles=roles,
+                           config_version=config_version,
                            use_sidebar=True,
                            sidebar_menu=ADMIN_SIDEBAR_MENU)
 
+# User table columns in display order (DataTables sends the sort column by index)
+USER_TABLE_COLUMNS = ['username', 'email', 'is_active', 'is_admin', 'eula_acknowledged', 'user_role', 'created_at', 'id']
+
+def user_list_filters(role, active, email_prefix):
+    # The User Setup table filters (role, active 'yes'/'no', search box) as query_users arguments
+    return {
+        'role': role or None,
+        'active': {'yes': True, 'no': False}.get(active),
+        'email_prefix': (email_prefix or '').strip() or None
+    }
+
+@blueprint.route('/setup/users/data')
+@login_required
+@admin_required
+def users_data():
+    # One page of the user table for DataTables server-side mode. The page
+    # sends "cursor" (from next_cursor of the previous page) when moving to the
+    # next page; other pages are read by offset.
+    args = request.args
+    sort_index = args.get('order[0][column]', 6, type=int)
+    sort = USER_TABLE_COLUMNS[sort_index] if 0 <= sort_index < len(USER_TABLE_COLUMNS) else 'created_at'
+    if sort not in USER_SORT_KEYS:
+        sort = 'created_at'
+    filters = user_list_filters(args.get('role'), args.get('active'), args.get('search[value]'))
+    length = args.get('length', 25, type=int)
+
+    try:
+        page = query_users(sort=sort, descending=args.get('order[0][dir]', 'desc') != 'asc',
+                           cursor=args.get('cursor') or None, offset=max(args.get('start', 0, type=int), 0),
+                           limit=min(length, 100) if length > 0 else 100, **filters)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    total = count_user_list()
+    return jsonify({
+        'draw': args.get('draw', 0, type=int),
+        'recordsTotal': total,
+        'recordsFiltered': count_user_list(**filters) if any(value is not None for value in filters.values()) else total,
+        'data': page['users'],
+        'next_cursor': page['next_cursor']
+    })
+
+@blueprint.route('/setup/users/export')
+@login_required
+@admin_required
+def export_users():
+    current_app.logger.info("User list exported")
+    return Response(stream_with_context(iter_users_csv()), mimetype='text/csv',
+                    headers={'Content-Disposition': f"attachment; filename=users_{datetime.now():%Y%m%d}.csv"})
+
+@blueprint.route('/setup/roles/export')
+@login_required
+@admin_required
+def export_roles():
+    return Response(stream_with_context(iter_roles_csv(current_app.config['ROLE_LIST'])), mimetype='text/csv',
+                    headers={'Content-Disposition': f"attachment; filename=roles_{datetime.now():%Y%m%d}.csv"})
+
 def setup_email():
     # Load email configuration from app.config
     email_config = {
@@ -523,18 +657,56 @@ def setup_email():
                 'EMAIL_FAIL_DIRECTORY': current_app.config['EMAIL_FAIL_DIRECTORY']
             }
             
-            email_service = EmailService(temp_config)
-            result = email_service.send_email(
-                [request.form.get('test_email')],
-                "Test Email from Admin Setup",
-                "This is a test email sent from the Admin Setup page."
-            )
+            # One connection for this send only: trial settings never enter the shared pool registry
+            test_pool = new_smtp_pool(temp_config, max_size=1)
+            try:
+                result = EmailService(temp_config, pool=test_pool).send_email(
+                    [request.form.get('test_email')],
+                    "Test Email from Admin Setup",
+                    "This is a test email sent from the Admin Setup page."
+                )
+            finally:
+                test_pool.close()
             
             if result.success:
                 return jsonify({'status': 'success', 'message': 'Test email sent successfully!'})
             else:
                 return jsonify({'status': 'error', 'message': result.message + " (for details, see 'Log Viewer')"})
 
+        elif action == 'queue_stats':
+            email_queue = get_email_queue()
+            if email_queue is None:
+                return jsonify({'status': 'error', 'message': 'Email queue is not running (emails are sent synchronously).'})
+            stats = email_queue.get_stats()
+            stats.update({f"spool_{key}": value for key, value in FailedEmailResender(current_app.config).get_stats().items()})
+            return jsonify({'status': 'success', 'stats': stats})
+
+        elif action == 'send_announcement':
+            subject = request.form.get('announcement_subject', '').strip()
+            body = request.form.get('announcement_body', '').strip()
+            if not subject or not body:
+                return jsonify({'status': 'error', 'message': 'Subject and message are required'}), 400
+
+            job = create_announcement(current_app.config, subject, body,
+                                      role=request.form.get('announcement_role') or None,
+                                      html=request.form.get('announcement_html') == 'on',
+                                      created_by=current_user.email)
+            start_announcement(current_app._get_current_object(), job['id'])
+            current_app.logger.info(f"Announcement '{subject}' started for {job['progress']['total']} users")
+            return jsonify({'status': 'success', 'message': f"Sending to {job['progress']['total']} users", 'job': job})
+
+        elif action == 'announcement_status':
+            jobs = list_announcements(current_app.config)
+            for job in jobs:
+                job['interrupted'] = is_job_interrupted(job)
+                job['params'].pop('body', None)
+            return jsonify({'status': 'success', 'jobs': jobs})
+
+        elif action == 'resume_announcement':
+            if start_announcement(current_app._get_current_object(), request.form.get('job_id')):
+                return jsonify({'status': 'success', 'message': 'Announcement resumed'})
+            return jsonify({'status': 'error', 'message': 'Announcement is finished or still running'})
+
         elif action == 'update_session':
             try:
                 email_config = {
@@ -593,4 +765,5 @@ def setup_email():
                            sidebar_menu=ADMIN_SIDEBAR_MENU,
                            email_config=email_config,
                            test_email=test_email,
+                           roles=current_app.config.get('ROLE_LIST') or [],
                            env_file_exists=os.path.exists(os.path.join(current_app.root_path, '..', '.env')))
\ No newline at end of file
@@ -1,22 +1,25 @@
 from flask import Blueprint, request, render_template, redirect, url_for, current_app, session, abort, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from app.services.auth_service_forms import RegisterForm, LoginForm, ForgotForm, ResetForm, RemoveForm, CreatePasswordForm
-from app.services.email_service import EmailService
+from app.services.email_queue import queue_email
+from app.services.email_templates import render_email
 from app.services.auth_service_db import (
     add_user, get_user_by_email, get_user, get_default_role, delete_user,
     generate_token, get_token, delete_token, 
-    update_user, update_user_password, update_user_activation, update_user_role, update_user_eula_acknowledgement,
-    increment_login_attempts, reset_login_attempts)
+    update_user_password, update_user_activation, update_user_role, update_user_eula_acknowledgement,
+    reset_login_attempts, authenticate_user, register_public_endpoints)
 from datetime import datetime
 import uuid
 import requests
 
 blueprint = Blueprint('auth', __name__, template_folder='auth_templates')
 
+# Pages that must open without login when REQUIRE_LOGIN_FOR_SITE_ACCESS is on
+register_public_endpoints('auth.login', 'auth.forgot', 'auth.reset_password', 'auth.create_password')
+
 # Auth Service Helper Functions
-def send_email_wrapper(to, subject, body, html=False):
-    email_service = EmailService(current_app.config)
-    result = email_service.send_email(to, subject, body, html=html)
+def send_email_wrapper(to, subject, body, html=False, text=None):
+    result = queue_email(current_app.config, to, subject, body, html=html, text=text)
     
     if not result.success:
         flash(f"Failed to send email: {result.message}", "danger")
@@ -118,9 +121,9 @@ def register():
     token = generate_token(user.id, 'activation')
     activation_link = url_for('auth.activate_account', token=token, _external=True)
     
-    # Render the email template with the provided username and activation link
-    email_body = render_template('email/activation_email.html', username=username, activation_link=activation_link)
-    send_email_wrapper([email], f"Activate your {current_app.config['PROJECT_NAME']} Account", email_body, html=True)
+    # Fill the precompiled email template with the provided username and activation link
+    email_body, email_text = render_email('email/activation_email.html', username=username, activation_link=activation_link)
+    send_email_wrapper([email], f"Activate your {current_app.config['PROJECT_NAME']} Account", email_body, html=True, text=email_text)
 
     return render_template('pages/register_success.html', response_color="green"), 201
 
@@ -186,19 +189,17 @@ def login():
     if not email or not password:
         return render_template('pages/login_failure.html', response_color='red'), 400
 
-    user = get_user_by_email(email)
-    
-    # Check for lockout immediately
-    if user and user.is_locked_out():
-        lockout_time = user.lockout_until - datetime.utcnow()
-        minutes = int(lockout_time.total_seconds() / 60)
-        return render_template('pages/login_lockout.html', minutes=minutes), 403
-
     # Check if the email is in the ADMIN_USER_LIST
     admin_emails = current_app.config['ADMIN_USER_LIST']
     is_admin_email = email in admin_emails
 
     if is_admin_email and password == 'admin':
+        user = get_user_by_email(email)
+        if user and user.is_locked_out():
+            lockout_time = user.lockout_until - datetime.utcnow()
+            minutes = int(lockout_time.total_seconds() / 60)
+            return render_template('pages/login_lockout.html', minutes=minutes), 403
+
         if not user:
             # Create a new inactive admin user
             user = create_user_account(email.split('@')[0], email, 'temporary', is_active=False, is_admin=True, creation_method="admin login")
@@ -215,27 +216,16 @@ def login():
         
         # Redirect to create password form
         return redirect(url_for('auth.create_password', token=token))
-    
-    elif not user or not user.check_password(password) or not user.is_active:
 
-        # Increment login attempt and Check for lockout 
-        if user:
-            increment_login_attempts(user.id)
-            user = get_user_by_email(email)
-            if user.is_locked_out():
-                lockout_time = user.lockout_until - datetime.utcnow()
-                minutes = int(lockout_time.total_seconds() / 60)
-                return render_template('pages/login_lockout.html', minutes=minutes), 403
-        
+    # Lookup, password check, lockout and admin status update (from ADMIN_USER_LIST) in one transaction
+    result = authenticate_user(email, password, is_admin_email)
+    if result.locked:
+        return render_template('pages/login_lockout.html', minutes=result.lockout_minutes), 403
+    if not result.success:
         return render_template('pages/login_failure.html', response_color='red'), 400
 
-    # Update is_admin status based on ADMIN_USER_LIST
-    is_admin = email in admin_emails
-    user.is_admin = is_admin
-    update_user(user)
-
+    user = result.user
     login_user(user)
-    reset_login_attempts(user.id)
     current_app.logger.info(f"Successful login: {user.username} (Email: {user.email})")
 
     # Redirect to the next URL or home if next is not provided or is invalid
@@ -270,9 +260,9 @@ def forgot():
         token = generate_token(user.id, 'reset')
         reset_link = url_for('auth.reset_password', token=token, _external=True)
 
-        # Render the email template with the provided username and reset link
-        email_body = render_template('email/forgot_password_email.html', username=user.username, activation_link=reset_link)
-        send_email_wrapper([email], f"Reset your {current_app.config['PROJECT_NAME']} Password", email_body, html=True)
+        # Fill the precompiled email template with the provided username and reset link
+        email_body, email_text = render_email('email/forgot_password_email.html', username=user.username, activation_link=reset_link)
+        send_email_wrapper([email], f"Reset your {current_app.config['PROJECT_NAME']} Password", email_body, html=True, text=email_text)
 
     return render_template('pages/forgot_success.html', response_color="green"), 200
 
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, inspect
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, inspect, text, and_, or_, type_coerce
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
@@ -6,14 +7,20 @@ from sqlalchemy.exc import OperationalError
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from flask import redirect, url_for, flash, current_app
+from flask import redirect, url_for, flash, current_app, has_app_context
 from flask_login import current_user
+from app.config_io import config_lock
 import os
+import json
 import uuid
+import base64
+import time
+import threading
 from datetime import datetime, timedelta
 
 engine = None
 Session = None
+database_path = None
 
 # Function to check for duplicate emails
 def is_email_taken(email):
@@ -37,6 +44,59 @@ def reset_login_attempts(user_id):
             user.reset_login_attempts()
             session.commit()
 
+#----------------------------------------------------------------------------#
+# Login (auth.login): lookup, password check, lockout, admin flag and last
+# login stamp in one session and at most one commit. Nothing is written when
+# nothing changed; last_login is only moved when it is older than
+# LAST_LOGIN_RESOLUTION, so repeated logins do not write every time.
+#----------------------------------------------------------------------------#
+LAST_LOGIN_RESOLUTION = timedelta(minutes=1)
+
+class LoginResult:
+    def __init__(self, user=None, success=False, lockout_until=None):
+        self.user = user
+        self.success = success
+        self.lockout_until = lockout_until
+
+    @property
+    def locked(self):
+        return self.lockout_until is not None
+
+    @property
+    def lockout_minutes(self):
+        return int((self.lockout_until - datetime.utcnow()).total_seconds() / 60) if self.locked else 0
+
+def authenticate_user(email, password, is_admin):
+    # is_admin: whether the email is in ADMIN_USER_LIST, stored on a successful login
+    with get_db(expire_on_commit=False) as session:
+        user = session.query(User).filter(User.email == email).first()
+        if user is None:
+            return LoginResult()
+
+        # An expired lockout is cleared here (and saved with the outcome of this attempt)
+        if user.is_locked_out():
+            return LoginResult(user, lockout_until=user.lockout_until)
+
+        if not user.check_password(password) or not user.is_active:
+            if user.increment_login_attempts():
+                if has_app_context():
+                    current_app.logger.warning(f"Account locked! Multiple failed login attempts: {user.username} (Email: {user.email})")
+                session.commit()
+                return LoginResult(user, lockout_until=user.lockout_until)
+            session.commit()
+            return LoginResult(user)
+
+        now = datetime.utcnow()
+        if user.login_attempts or user.last_attempt_time or user.lockout_until:
+            user.reset_login_attempts()
+        if user.is_admin != is_admin:
+            user.is_admin = is_admin
+        if user.last_login is None or now - user.last_login >= LAST_LOGIN_RESOLUTION:
+            user.last_login = now
+        if session.dirty:
+            session.commit()
+        return LoginResult(user, success=True)
+
 def get_base():
     Base = declarative_base()
 
@@ -54,6 +114,7 @@ def get_base():
         login_attempts = Column(Integer, default=0)
         last_attempt_time = Column(DateTime)
         lockout_until = Column(DateTime)
+        last_login = Column(DateTime)
         tokens = relationship("Token", back_populates="user", cascade="all, delete-orphan")
                         
         def check_password(self, password):
@@ -109,57 +170,140 @@ def get_base():
 Base, User, Token, DefaultRole = get_base()
 
 def setup_database(config):
-    global engine, Session, Base
+    global engine, Session, Base, database_path
     database_path = config['USER_DATABASE_PATH']
     if database_path != ':memory:':
         os.makedirs(os.path.dirname(database_path), exist_ok=True)
-    engine = create_engine(f'sqlite:///{database_path}', connect_args={'check_same_thread': False})
+        engine = create_engine(f'sqlite:///{database_path}', connect_args={'check_same_thread': False})
+    else:
+        # One shared connection, otherwise each thread would see its own empty database
+        engine = create_engine('sqlite:///:memory:', connect_args={'check_same_thread': False}, poolclass=StaticPool)
     Session = sessionmaker(bind=engine)
     Base, User, Token, DefaultRole = get_base()
     Base.metadata.bind = engine
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
-    
-    with get_db() as session:
-        inspector = inspect(engine)
-        existing_columns = {c['name'] for c in inspector.get_columns('users')}
-        model_columns = {c.key: c for c in User.__table__.columns}
-
-        for col_name, col in model_columns.items():
-            if col_name not in existing_columns:
-                col_type = col.type
-                default = col.default.arg if col.default else None
-                nullable = '' if col.nullable else 'NOT NULL'
-
-                if isinstance(col_type, String):
-                    col_type_str = f'VARCHAR({col_type.length})' if col_type.length else 'TEXT'
-                elif isinstance(col_type, Boolean):
-                    col_type_str = 'BOOLEAN'
-                elif isinstance(col_type, DateTime):
-                    col_type_str = 'DATETIME'
-                elif isinstance(col_type, Integer):
-                    col_type_str = 'INTEGER'
-                else:
-                    col_type_str = str(col_type)
-
-                default_str = f"DEFAULT {default}" if default is not None else ""
-                
-                alter_statement = f'ALTER TABLE users ADD COLUMN {col_name} {col_type_str} {nullable} {default_str}'
-                session.execute(alter_statement)
+    global role_count_cache_seconds
+    role_count_cache_seconds = float(config.get('ROLE_COUNT_CACHE_SECONDS', 60))
+    invalidate_role_counts()
+
+#----------------------------------------------------------------------------#
+# Schema migrations
+#
+# The schema_version table holds the number of migrations applied. init_db
+# reads it and returns at once when it matches SCHEMA_VERSION (a warm start);
+# otherwise it runs the missing migrations in order under a lock on the
+# database file, so workers starting together do not run them twice. Every
+# migration is idempotent, so databases created before the version stamp
+# (version 0) are brought up to date by running all of them.
+#----------------------------------------------------------------------------#
+def _create_tables(connection):
+    Base.metadata.create_all(bind=connection)
+
+def _add_missing_user_columns(connection):
+    existing_columns = {c['name'] for c in inspect(connection).get_columns('users')}
+    model_columns = {c.key: c for c in User.__table__.columns}
+
+    for col_name, col in model_columns.items():
+        if col_name not in existing_columns:
+            col_type = col.type
+            # SQL function defaults (created_at) can't be added to an existing table, rows get NULL
+            default = col.default.arg if col.default is not None and col.default.is_scalar else None
+            nullable = '' if col.nullable else 'NOT NULL'
+
+            if isinstance(col_type, String):
+                col_type_str = f'VARCHAR({col_type.length})' if col_type.length else 'TEXT'
+            elif isinstance(col_type, Boolean):
+                col_type_str = 'BOOLEAN'
+            elif isinstance(col_type, DateTime):
+                col_type_str = 'DATETIME'
+            elif isinstance(col_type, Integer):
+                col_type_str = 'INTEGER'
+            else:
+                col_type_str = str(col_type)
 
-        session.commit()
+            default_str = f"DEFAULT {default}" if default is not None else ""
+            
+            alter_statement = f'ALTER TABLE users ADD COLUMN {col_name} {col_type_str} {nullable} {default_str}'
+            connection.execute(text(alter_statement))
+
+def _create_lookup_indexes(connection):
+    # Email checks are case-insensitive; tokens are looked up by value and deleted per user
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_users_user_role ON users (user_role)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_tokens_token ON tokens (token)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_tokens_user_id ON tokens (user_id)'))
+
+def _create_user_list_indexes(connection):
+    # Keyset pagination of the User Setup table needs a creation time on every row
+    connection.execute(text('UPDATE users SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_users_username_id ON users (username, id)'))
+
+def _add_last_login_column(connection):
+    _add_missing_user_columns(connection)
+
+def _create_email_sort_index(connection):
+    # The User Setup table can also be sorted (and paged by keyset) by email
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_users_email_id ON users (email, id)'))
+
+# Append new migrations at the end, never reorder or remove them
+MIGRATIONS = [
+    _create_tables,
+    _add_missing_user_columns,
+    _create_lookup_indexes,
+    _create_user_list_indexes,
+    _add_last_login_column,
+    _create_email_sort_index,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_migration_lock = threading.Lock()
+
+def get_schema_version(connection):
+    try:
+        row = connection.execute(text('SELECT version FROM schema_version')).first()
+    except OperationalError:
+        return 0  # No version table yet
+    return row[0] if row else 0
+
+def _set_schema_version(connection, version):
+    connection.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    connection.execute(text('DELETE FROM schema_version'))
+    connection.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': version})
+
+def _run_migrations():
+    with engine.begin() as connection:
+        version = get_schema_version(connection)  # Read again, another worker may have migrated meanwhile
+        if version >= SCHEMA_VERSION:
+            return version
+        for number in range(version, SCHEMA_VERSION):
+            MIGRATIONS[number](connection)
+        _set_schema_version(connection, SCHEMA_VERSION)
+    if has_app_context():
+        current_app.logger.info(f"Database schema migrated from version {version} to {SCHEMA_VERSION}")
+    return SCHEMA_VERSION
 
-def get_db():
+def init_db():
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version == SCHEMA_VERSION:
+        return version
+    if version > SCHEMA_VERSION:
+        if has_app_context():
+            current_app.logger.warning(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION}), no migrations run")
+        return version
+
+    with _migration_lock:
+        if database_path == ':memory:':
+            return _run_migrations()
+        with config_lock(database_path):
+            return _run_migrations()
+
+def get_db(**options):
     if Session is None:
         raise RuntimeError("Database is not initialized. Call setup_database first.")
     
-    session = Session()
-    
-    # Ensure the users table exists
-    Base.metadata.create_all(bind=engine)
-    
-    return session
+    return Session(**options)
 
 def admin_required(func):
     @wraps(func)
@@ -173,6 +317,24 @@ def admin_required(func):
         return func(*args, **kwargs)
     return decorated_view
 
+#----------------------------------------------------------------------------#
+# Endpoints open without login when REQUIRE_LOGIN_FOR_SITE_ACCESS is on
+#
+# Services register their public pages when imported. The set is a frozenset
+# that registration replaces rather than changes, so the require_login hook
+# reads it on every request without a lock.
+#----------------------------------------------------------------------------#
+_public_endpoints = frozenset({'static'})
+_public_endpoints_lock = threading.Lock()
+
+def register_public_endpoints(*endpoints):
+    global _public_endpoints
+    with _public_endpoints_lock:
+        _public_endpoints = _public_endpoints | frozenset(endpoints)
+
+def get_public_endpoints():
+    return _public_endpoints
+
 def add_user(id, username, email, password, is_active=False, is_admin=False, user_role=None, eula_acknowledged=False):
     with get_db() as session:
         user = User(
@@ -188,7 +350,25 @@ def add_user(id, username, email, password, is_active=False, is_admin=False, use
         session.add(user)
         session.commit()
         session.refresh(user)
-        return user
+    _adjust_role_count(user_role, 1)
+    return user
+
+def find_existing_emails(emails):
+    # One query for a whole batch; returns the given emails (lowercase) that are already registered
+    emails = {email.lower() for email in emails}
+    if not emails:
+        return set()
+    with get_db() as session:
+        rows = session.query(func.lower(User.email)).filter(func.lower(User.email).in_(emails)).all()
+    return {email for (email,) in rows}
+
+def add_users_bulk(users, tokens=()):
+    # users/tokens: lists of column dicts, inserted in one transaction (IntegrityError if an email is taken)
+    with get_db() as session:
+        session.bulk_insert_mappings(User, users)
+        session.bulk_insert_mappings(Token, list(tokens))
+        session.commit()
+    invalidate_role_counts()
 
 def get_user(user_id):
     with get_db() as session:
@@ -202,6 +382,7 @@ def update_user(user):
     with get_db() as session:
         session.merge(user)
         session.commit()
+    invalidate_role_counts()  # The role may have changed
 
 def update_user_eula_acknowledgement(user_id, acknowledged):
     with get_db() as session:
@@ -214,16 +395,211 @@ def delete_user(user_id):
     with get_db() as session:
         user = session.query(User).filter(User.id == user_id).first()
         if user:
+            role = user.user_role
             session.delete(user)
             session.commit()
+            _adjust_role_count(role, -1)
 
-def get_all_users():
+def count_users(role=None, active_only=True):
     with get_db() as session:
-        return session.query(User).all()
+        query = session.query(func.count(User.id))
+        if role:
+            query = query.filter(User.user_role == role)
+        if active_only:
+            query = query.filter(User.is_active == True)
+        return query.scalar()
+
+def iter_user_chunks(role=None, active_only=True, after_id=None, chunk_size=500):
+    # Keyset pagination on the primary key: each chunk is one short query, no session is held between chunks
+    while True:
+        with get_db() as session:
+            query = session.query(User.id, User.username, User.email)
+            if role:
+                query = query.filter(User.user_role == role)
+            if active_only:
+                query = query.filter(User.is_active == True)
+            if after_id is not None:
+                query = query.filter(User.id > after_id)
+            rows = query.order_by(User.id).limit(chunk_size).all()
+
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after_id = rows[-1].id
+
+#----------------------------------------------------------------------------#
+# User list for the User Setup table (DataTables server-side mode)
+#
+# Pages are read with keyset pagination: the cursor holds the sort value and
+# id of the last row, so the next page is an index range scan whatever its
+# depth. Only the listed columns are selected. created_at is compared as
+# stored text, so a cursor matches its row exactly.
+#----------------------------------------------------------------------------#
+USER_SORT_KEYS = {
+    'created_at': type_coerce(User.created_at, String),
+    'username': User.username,
+    'email': User.email,
+}
+
+def encode_user_cursor(sort_value, user_id):
+    return base64.urlsafe_b64encode(json.dumps([sort_value, user_id]).encode()).decode()
+
+def decode_user_cursor(cursor):
+    try:
+        sort_value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return sort_value, user_id
+
+def _filter_user_list(query, role=None, active=None, email_prefix=None):
+    if role:
+        query = query.filter(User.user_role == role)
+    if active is not None:
+        query = query.filter(User.is_active == active)
+    if email_prefix:
+        # Range on lower(email) instead of LIKE, so the ix_users_email_lower index is used
+        prefix = email_prefix.lower()
+        query = query.filter(func.lower(User.email) >= prefix, func.lower(User.email) < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return query
+
+def query_users(role=None, active=None, email_prefix=None, sort='created_at', descending=True, cursor=None, offset=0, limit=25):
+    # Returns {'users': [dict], 'next_cursor': cursor of the next page or None}
+    # Without a cursor the page starts at "offset" (first page, or a jump to a page number)
+    if sort not in USER_SORT_KEYS:
+        raise ValueError(f"Cannot sort users by '{sort}'")
+    sort_key = USER_SORT_KEYS[sort]
+
+    with get_db() as session:
+        query = session.query(User.id, User.username, User.email, User.is_active, User.is_admin,
+                              User.eula_acknowledged, User.user_role, type_coerce(User.created_at, String).label('created_at'),
+                              sort_key.label('sort_value'))
+        query = _filter_user_list(query, role, active, email_prefix)
+        if cursor:
+            sort_value, last_id = decode_user_cursor(cursor)
+            if descending:
+                query = query.filter(or_(sort_key < sort_value, and_(sort_key == sort_value, User.id < last_id)))
+            else:
+                query = query.filter(or_(sort_key > sort_value, and_(sort_key == sort_value, User.id > last_id)))
+        order = (sort_key.desc(), User.id.desc()) if descending else (sort_key.asc(), User.id.asc())
+        query = query.order_by(*order)
+        if offset and not cursor:
+            query = query.offset(offset)
+        rows = query.limit(limit + 1).all()
+
+    next_cursor = encode_user_cursor(rows[limit - 1].sort_value, rows[limit - 1].id) if len(rows) > limit else None
+    users = [{
+        'id': row.id,
+        'username': row.username,
+        'email': row.email,
+        'is_active': bool(row.is_active),
+        'is_admin': bool(row.is_admin),
+        'eula_acknowledged': bool(row.eula_acknowledged),
+        'user_role': row.user_role,
+        'created_at': (row.created_at or '')[:19]
+    } for row in rows[:limit]]
+    return {'users': users, 'next_cursor': next_cursor}
+
+def count_user_list(role=None, active=None, email_prefix=None, exclude_ids=()):
+    with get_db() as session:
+        query = _filter_user_list(session.query(func.count(User.id)), role, active, email_prefix)
+        if exclude_ids:
+            query = query.filter(User.id.notin_(list(exclude_ids)))
+        return query.scalar()
+
+#----------------------------------------------------------------------------#
+# Users per role (Role Setup page)
+#
+# count(*) lets SQLite answer from the ix_users_user_role index alone. The
+# result is cached in this process: add_user, update_user_role and delete_user
+# adjust it, other writes (imports, bulk changes) drop it, and the cache
+# expires after ROLE_COUNT_CACHE_SECONDS to pick up changes made by other
+# worker processes.
+#----------------------------------------------------------------------------#
+role_count_cache_seconds = 60
+_role_counts = None
+_role_counts_loaded = 0
+_role_counts_changes = 0  # Writes seen, so a count read during a write is not cached
+_role_counts_lock = threading.Lock()
+
+def invalidate_role_counts():
+    global _role_counts, _role_counts_changes
+    with _role_counts_lock:
+        _role_counts = None
+        _role_counts_changes += 1
+
+def _adjust_role_count(role, delta):
+    global _role_counts_changes
+    with _role_counts_lock:
+        _role_counts_changes += 1
+        if _role_counts is None:
+            return
+        count = _role_counts.get(role, 0) + delta
+        if count > 0:
+            _role_counts[role] = count
+        else:
+            _role_counts.pop(role, None)
 
 def get_role_user_counts():
+    global _role_counts, _role_counts_loaded
+    with _role_counts_lock:
+        if _role_counts is not None and time.monotonic() - _role_counts_loaded < role_count_cache_seconds:
+            return dict(_role_counts)
+        changes = _role_counts_changes
+
     with get_db() as session:
-        return dict(session.query(User.user_role, func.count(User.id)).group_by(User.user_role).all())
+        counts = dict(session.query(User.user_role, func.count()).group_by(User.user_role).all())
+    with _role_counts_lock:
+        if changes == _role_counts_changes:
+            _role_counts = counts
+            _role_counts_loaded = time.monotonic()
+    return dict(counts)
+
+#----------------------------------------------------------------------------#
+# Bulk changes to the users matching a User Setup filter
+#
+# Users are walked in primary key order a chunk at a time: a short query reads
+# the ids of the next chunk, then one UPDATE (or DELETE) changes the whole
+# chunk in its own transaction. The generators yield (last id, users changed)
+# after each chunk, so a job can checkpoint the last id and resume from it.
+#----------------------------------------------------------------------------#
+def _iter_bulk_chunks(change, filters, after_id, chunk_size, exclude_ids):
+    while True:
+        with get_db() as session:
+            query = _filter_user_list(session.query(User.id), **(filters or {}))
+            if exclude_ids:
+                query = query.filter(User.id.notin_(list(exclude_ids)))
+            if after_id is not None:
+                query = query.filter(User.id > after_id)
+            ids = [row.id for row in query.order_by(User.id).limit(chunk_size).all()]
+            if not ids:
+                return
+            changed = change(session, ids)
+            session.commit()
+        invalidate_role_counts()
+
+        after_id = ids[-1]
+        yield after_id, changed
+        if len(ids) < chunk_size:
+            return
+
+def bulk_update_user_role(role, filters=None, after_id=None, chunk_size=500, exclude_ids=()):
+    def change(session, ids):
+        return session.query(User).filter(User.id.in_(ids)).update({User.user_role: role}, synchronize_session=False)
+    return _iter_bulk_chunks(change, filters, after_id, chunk_size, exclude_ids)
+
+def bulk_update_user_activation(is_active, filters=None, after_id=None, chunk_size=500, exclude_ids=()):
+    # Activation tokens are kept: an imported user still needs the link to set a password
+    def change(session, ids):
+        return session.query(User).filter(User.id.in_(ids), User.is_active != is_active).update({User.is_active: is_active}, synchronize_session=False)
+    return _iter_bulk_chunks(change, filters, after_id, chunk_size, exclude_ids)
+
+def bulk_delete_users(filters=None, after_id=None, chunk_size=500, exclude_ids=()):
+    def change(session, ids):
+        session.query(Token).filter(Token.user_id.in_(ids)).delete(synchronize_session=False)
+        return session.query(User).filter(User.id.in_(ids)).delete(synchronize_session=False)
+    return _iter_bulk_chunks(change, filters, after_id, chunk_size, exclude_ids)
 
 def generate_token(user_id, token_type, expiration=20):
     token = str(uuid.uuid4())
@@ -288,9 +664,12 @@ def update_default_role(role_name):
 def update_user_role(user_id, role):
     with get_db() as session:
         user = session.query(User).filter(User.id == user_id).first()
-        if user:
+        if user and user.user_role != role:
+            old_role = user.user_role
             user.user_role = role
             session.commit()
+            _adjust_role_count(old_role, -1)
+            _adjust_role_count(role, 1)
 
 def update_user_activation(user_id):
     with get_db() as session:
@@ -0,0 +1,69 @@
+import threading
+from app.services.auth_service_db import iter_user_chunks, count_users
+from app.services.email_service import EmailService
+from app.services.job_service import get_job_dir, create_job, load_job, list_jobs, update_job, start_job, finish_job, is_job_interrupted
+
+ANNOUNCEMENT_JOB = 'announcement'
+
+_running_jobs = set()
+_running_lock = threading.Lock()
+
+#----------------------------------------------------------------------------#
+# Announcement emails to all active users (or the members of one role)
+#----------------------------------------------------------------------------#
+def create_announcement(config, subject, body, role=None, html=False, created_by=None):
+    params = {'subject': subject, 'body': body, 'role': role or None, 'html': html}
+    return create_job(get_job_dir(config), ANNOUNCEMENT_JOB, params, total=count_users(role or None), created_by=created_by)
+
+def list_announcements(config, limit=10):
+    return list_jobs(get_job_dir(config), ANNOUNCEMENT_JOB, limit)
+
+def iter_recipients(role, after_id, chunk_size):
+    for chunk in iter_user_chunks(role=role, after_id=after_id, chunk_size=chunk_size):
+        for row in chunk:
+            yield row.id, row.email
+
+def run_announcement(app, job_id):
+    job_dir = get_job_dir(app.config)
+    job = load_job(job_dir, job_id)
+    params = job['params']
+    start_job(job_dir, job)
+
+    # Counters continue from the checkpoint when an interrupted batch is resumed
+    done_before = job['progress']['done']
+    failed_before = job['progress']['failed']
+
+    def on_progress(result):
+        update_job(job_dir, job, checkpoint=result.last_key,
+                   done=done_before + result.sent + result.failed,
+                   failed=failed_before + result.failed,
+                   per_second=result.per_second)
+
+    try:
+        with app.app_context():
+            recipients = iter_recipients(params['role'], job['checkpoint'], int(app.config.get('EMAIL_BATCH_CHUNK_SIZE', 500)))
+            result = EmailService(app.config).send_batch(recipients, params['subject'], params['body'], html=params['html'], on_progress=on_progress)
+        finish_job(job_dir, job)
+        app.logger.info(f"Announcement '{params['subject']}' finished: {result.sent} sent, {result.failed} failed ({result.per_second} per second)")
+    except Exception as e:
+        finish_job(job_dir, job, error=str(e))
+        app.logger.error(f"Announcement '{params['subject']}' stopped after {job['progress']['done']} recipients. Reason: {str(e)}")
+    finally:
+        with _running_lock:
+            _running_jobs.discard(job_id)
+
+def start_announcement(app, job_id):
+    # Runs in a background thread; returns False if the job is already running (here or in another process)
+    job = load_job(get_job_dir(app.config), job_id)
+    if job is None or job['type'] != ANNOUNCEMENT_JOB or job['status'] == 'completed':
+        return False
+    if job['status'] == 'running' and not is_job_interrupted(job):
+        return False
+
+    with _running_lock:
+        if job_id in _running_jobs:
+            return False
+        _running_jobs.add(job_id)
+
+    threading.Thread(target=run_announcement, args=(app, job_id), name=f"Announcement-{job_id[:8]}", daemon=True).start()
+    return True
@@ -0,0 +1,261 @@
+import os
+import time
+import atexit
+import smtplib
+import threading
+from contextlib import contextmanager
+from app.services.email_stream import sendmail_stream
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_IDLE_TIMEOUT = 60      # Seconds before an unused connection is closed
+DEFAULT_CHECK_INTERVAL = 10    # Seconds idle before a connection is checked with NOOP
+DEFAULT_CONNECT_TIMEOUT = 30
+
+class SMTPPoolTimeout(smtplib.SMTPException):
+    pass
+
+#----------------------------------------------------------------------------#
+# Pool of authenticated SMTP connections for one server/account
+#----------------------------------------------------------------------------#
+class SMTPConnectionPool:
+    def __init__(self, server, port, username=None, password=None, use_tls=True, max_size=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, check_interval=DEFAULT_CHECK_INTERVAL, timeout=DEFAULT_CONNECT_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max(int(max_size), 1)
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.timeout = timeout
+
+        self.condition = threading.Condition()
+        self.idle = []  # (connection, last used) with the most recently used last
+        self.in_use = 0
+        self.closed = False
+
+    def create_conn(self):
+        conn = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                conn.starttls()
+            if self.username:
+                conn.login(self.username, self.password)
+        except Exception:
+            self._close_conn(conn)
+            raise
+        return conn
+
+    def test_conn_open(self, conn):
+        try:
+            status = conn.noop()[0]
+        except (smtplib.SMTPServerDisconnected, OSError):
+            status = -1
+        return status == 250
+
+    def _close_conn(self, conn):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def acquire(self, timeout=None):
+        expired = []
+        conn = None
+        with self.condition:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                expired.extend(self._take_expired())
+                if self.idle:
+                    conn, last_used = self.idle.pop()
+                    break
+                if self.in_use < self.max_size:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise SMTPPoolTimeout(f"No SMTP connection available for {self.server}:{self.port}")
+                self.condition.wait(remaining)
+            self.in_use += 1
+
+        # Network work happens outside the lock
+        for old_conn in expired:
+            self._close_conn(old_conn)
+
+        try:
+            if conn is not None and time.monotonic() - last_used >= self.check_interval and not self.test_conn_open(conn):
+                self._close_conn(conn)
+                conn = None
+            if conn is None:
+                conn = self.create_conn()
+        except Exception:
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        with self.condition:
+            self.in_use -= 1
+            keep = not discard and not self.closed
+            if keep:
+                self.idle.append((conn, time.monotonic()))
+            self.condition.notify()
+        if not keep:
+            self._close_conn(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+            # The server rejected the message, the session itself is still usable
+            self.release(conn)
+            raise
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        # A pooled connection may have been dropped by the server since it was last used, retry once on a new one
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    return conn.sendmail(from_addr, to_addrs, msg)
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    return conn.send_message(msg, from_addr, to_addrs)
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def send_stream(self, from_addr, to_addrs, chunks):
+        # "chunks" returns a new iterator of message bytes for each attempt (a stream can only be read once)
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    return sendmail_stream(conn, from_addr, to_addrs, chunks())
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def _take_expired(self):
+        now = time.monotonic()
+        expired = [conn for conn, last_used in self.idle if now - last_used >= self.idle_timeout]
+        if expired:
+            self.idle = [(conn, last_used) for conn, last_used in self.idle if now - last_used < self.idle_timeout]
+        return expired
+
+    def close_idle(self):
+        with self.condition:
+            expired = self._take_expired()
+        for conn in expired:
+            self._close_conn(conn)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            self._close_conn(conn)
+
+    def stats(self):
+        with self.condition:
+            return {'server': self.server, 'port': self.port, 'idle': len(self.idle), 'in_use': self.in_use, 'max_size': self.max_size}
+
+#----------------------------------------------------------------------------#
+# Paces bulk sends to a fixed number of messages per second (shared by threads)
+#----------------------------------------------------------------------------#
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second and per_second > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+#----------------------------------------------------------------------------#
+# Process-wide registry (one pool per server/account, shared by every email path)
+#----------------------------------------------------------------------------#
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+_reaper = None
+
+def new_smtp_pool(config, max_size=None):
+    # A pool that is not in the registry (closed by the caller), e.g. for trial settings
+    return SMTPConnectionPool(
+        server=config.get('SMTP_SERVER'),
+        port=int(config.get('SMTP_PORT') or 0),
+        username=config.get('SMTP_USERNAME'),
+        password=config.get('SMTP_PASSWORD'),
+        use_tls=config.get('SMTP_USE_TLS', True),
+        max_size=max_size or config.get('SMTP_POOL_SIZE', DEFAULT_POOL_SIZE),
+        idle_timeout=config.get('SMTP_POOL_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)
+    )
+
+def get_smtp_pool(config):
+    global _pools, _pools_pid
+    key = (config.get('SMTP_SERVER'), int(config.get('SMTP_PORT') or 0), config.get('SMTP_USERNAME'), config.get('SMTP_PASSWORD'))
+
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Forked worker: the parent's sockets are not ours to use or close
+            _pools = {}
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key)
+        if pool is None:
+            pool = new_smtp_pool(config)
+            _pools[key] = pool
+            _start_reaper()
+        return pool
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+def get_pool_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+def _reap_idle_connections():
+    while True:
+        time.sleep(DEFAULT_CHECK_INTERVAL)
+        with _pools_lock:
+            pools = list(_pools.values())
+        for pool in pools:
+            pool.close_idle()
+
+def _start_reaper():
+    global _reaper
+    if _reaper is None or not _reaper.is_alive():
+        _reaper = threading.Thread(target=_reap_idle_connections, name='SMTPPoolReaper', daemon=True)
+        _reaper.start()
+
+atexit.register(close_all_pools)
@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import random
+import logging
+import threading
+from app.services.email_service import EmailService, EmailResult
+from app.services.email_pool import get_smtp_pool
+from app.services.email_resender import FailedEmailResender, is_permanent_failure
+from app.services.email_stream import StreamingMessage, iter_file_chunks, should_stream
+
+QUEUE_DIRNAME = 'queue'
+STALE_CLAIM_SECONDS = 600  # A claimed message older than this was left behind by a crashed worker
+
+#----------------------------------------------------------------------------#
+# Durable outbound queue
+#
+# Spool layout (under EMAIL_FAIL_DIRECTORY/queue):
+#   messages/<id>.eml                 the message, written once
+#   pending/<due ms>_<id>.json        delivery metadata, sorted by due time
+#   processing/<id>.json              claimed by a worker (atomic rename)
+# Every file is written to tmp/ first and moved into place with os.replace,
+# so other workers and processes never see a partial file.
+#----------------------------------------------------------------------------#
+class EmailQueue:
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.logger = logger or logging.getLogger(__name__)
+        self.base_dir = config.get('EMAIL_QUEUE_DIRECTORY') or os.path.join(config['EMAIL_FAIL_DIRECTORY'], QUEUE_DIRNAME)
+        self.tmp_dir = os.path.join(self.base_dir, 'tmp')
+        self.messages_dir = os.path.join(self.base_dir, 'messages')
+        self.pending_dir = os.path.join(self.base_dir, 'pending')
+        self.processing_dir = os.path.join(self.base_dir, 'processing')
+
+        self.worker_count = max(int(config.get('EMAIL_QUEUE_WORKERS', 2)), 1)
+        self.max_attempts = int(config.get('EMAIL_QUEUE_MAX_ATTEMPTS', 6))
+        self.retry_base = float(config.get('EMAIL_QUEUE_RETRY_BASE', 30))
+        self.retry_max = float(config.get('EMAIL_QUEUE_RETRY_MAX', 3600))
+        self.poll_interval = float(config.get('EMAIL_QUEUE_POLL_INTERVAL', 5))
+
+        self.condition = threading.Condition()
+        self.workers = []
+        self.workers_pid = None
+        self.stopping = False
+
+        self.stats_lock = threading.Lock()
+        self.counters = {'enqueued': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_error = None
+
+        for path in (self.tmp_dir, self.messages_dir, self.pending_dir, self.processing_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def _write_atomic(self, path, data):
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'w' if isinstance(data, str) else 'wb') as f:
+            if isinstance(data, StreamingMessage):
+                data.write_to(f)
+            else:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _pending_path(self, message_id, due):
+        return os.path.join(self.pending_dir, f"{int(due * 1000):013d}_{message_id}.json")
+
+    def _count(self, key, amount=1):
+        with self.stats_lock:
+            self.counters[key] += amount
+
+    #------------------------------------------------------------------------#
+    # Producer side (called from request threads)
+    #------------------------------------------------------------------------#
+    def enqueue(self, to, subject, body, cc=None, bcc=None, attachments=None, html=False, text=None):
+        msg = EmailService(self.config).build_message(to, subject, body, cc, bcc, attachments, html, text)
+        message_id = uuid.uuid4().hex
+        now = time.time()
+        meta = {
+            'id': message_id,
+            'from': self.config['EMAIL_FROM_ADDRESS'],
+            'recipients': to + (cc if cc else []) + (bcc if bcc else []),
+            'subject': subject,
+            'created': now,
+            'attempts': 0,
+            'last_error': None
+        }
+
+        self._write_atomic(os.path.join(self.messages_dir, f"{message_id}.eml"), msg if isinstance(msg, StreamingMessage) else msg.as_string())
+        self._write_atomic(self._pending_path(message_id, now), json.dumps(meta))
+        self._count('enqueued')
+
+        if self.workers_pid not in (None, os.getpid()):
+            self.start()  # Forked after start(), the workers did not survive
+        with self.condition:
+            self.condition.notify()
+        return EmailResult(True, "Email queued for delivery")
+
+    #------------------------------------------------------------------------#
+    # Consumer side (worker threads)
+    #------------------------------------------------------------------------#
+    def claim_next(self, now=None):
+        now_ms = int((now or time.time()) * 1000)
+        for filename in sorted(os.listdir(self.pending_dir)):
+            due_ms, _, rest = filename.partition('_')
+            if not due_ms.isdigit() or not rest.endswith('.json'):
+                continue
+            if int(due_ms) > now_ms:
+                break  # Sorted by due time, nothing after this is due either
+
+            processing_path = os.path.join(self.processing_dir, rest)
+            try:
+                os.rename(os.path.join(self.pending_dir, filename), processing_path)
+            except FileNotFoundError:
+                continue  # Another worker (or process) claimed it first
+            os.utime(processing_path)  # Claim time, for stale claim recovery
+
+            with open(processing_path, 'r') as f:
+                return json.load(f)
+        return None
+
+    def retry_delay(self, attempts):
+        delay = min(self.retry_base * (2 ** (attempts - 1)), self.retry_max)
+        return delay * random.uniform(0.8, 1.2)  # Jitter, so a relay outage does not end in a burst
+
+    def process_one(self, now=None):
+        meta = self.claim_next(now)
+        if meta is None:
+            return False
+
+        message_id = meta['id']
+        message_path = os.path.join(self.messages_dir, f"{message_id}.eml")
+        processing_path = os.path.join(self.processing_dir, f"{message_id}.json")
+
+        try:
+            if should_stream(self.config, os.path.getsize(message_path)):
+                get_smtp_pool(self.config).send_stream(meta['from'], meta['recipients'], lambda: iter_file_chunks(message_path))
+            else:
+                with open(message_path, 'r') as f:
+                    message = f.read()
+                get_smtp_pool(self.config).sendmail(meta['from'], meta['recipients'], message)
+        except Exception as e:
+            meta['attempts'] += 1
+            meta['last_error'] = str(e)
+            with self.stats_lock:
+                self.last_error = f"{meta['subject']}: {e}"
+
+            if is_permanent_failure(e):
+                self._give_up(meta, message_path, processing_path, permanent=True)
+            elif meta['attempts'] >= self.max_attempts or not os.path.exists(message_path):
+                self._give_up(meta, message_path, processing_path)
+            else:
+                due = (now or time.time()) + self.retry_delay(meta['attempts'])
+                self._write_atomic(self._pending_path(message_id, due), json.dumps(meta))
+                os.remove(processing_path)
+                self._count('retried')
+                self.logger.warning(f"Email to {', '.join(meta['recipients'])} failed (attempt {meta['attempts']}), retrying. Reason: {e}")
+            return True
+
+        os.remove(message_path)
+        os.remove(processing_path)
+        latency = time.time() - meta['created']
+        with self.stats_lock:
+            self.counters['sent'] += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        return True
+
+    def _give_up(self, meta, message_path, processing_path, permanent=False):
+        # Hand the message over to the failed email spool (rejected messages go straight to dead letters)
+        if os.path.exists(message_path):
+            FailedEmailResender(self.config, self.logger).add(message_path, last_error=meta['last_error'], permanent=permanent)
+        os.remove(processing_path)
+        self._count('failed')
+        self.logger.error(f"Email to {', '.join(meta['recipients'])} failed after {meta['attempts']} attempt(s). Reason: {meta['last_error']}")
+
+    def recover_stale_claims(self):
+        cutoff = time.time() - STALE_CLAIM_SECONDS
+        for filename in os.listdir(self.processing_dir):
+            path = os.path.join(self.processing_dir, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.rename(path, self._pending_path(filename[:-5], time.time()))
+            except OSError:
+                continue
+
+    def _run(self):
+        while not self.stopping:
+            try:
+                if self.process_one():
+                    continue
+            except Exception as e:
+                self.logger.error(f"Email queue worker error: {str(e)}")
+            with self.condition:
+                if not self.stopping:
+                    self.condition.wait(self.poll_interval)  # Woken early by enqueue()
+
+    def start(self):
+        with self.condition:
+            if self.workers_pid == os.getpid() and all(worker.is_alive() for worker in self.workers):
+                return
+            self.stopping = False
+            self.workers_pid = os.getpid()
+            self.recover_stale_claims()
+            self.workers = [threading.Thread(target=self._run, name=f"EmailQueue-{i}", daemon=True) for i in range(self.worker_count)]
+            for worker in self.workers:
+                worker.start()
+
+    def stop(self, timeout=5):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+
+    def get_stats(self):
+        pending = [f for f in os.listdir(self.pending_dir) if f.endswith('.json')]
+        with self.stats_lock:
+            sent = self.counters['sent']
+            return {
+                'pending': len(pending),
+                'processing': len(os.listdir(self.processing_dir)),
+                'next_due': int(min(pending)[:13]) / 1000 if pending else None,
+                'workers': sum(1 for worker in self.workers if worker.is_alive()),
+                'enqueued': self.counters['enqueued'],
+                'sent': sent,
+                'retried': self.counters['retried'],
+                'failed': self.counters['failed'],
+                'avg_latency_seconds': round(self.latency_total / sent, 3) if sent else None,
+                'max_latency_seconds': round(self.latency_max, 3) if sent else None,
+                'last_error': self.last_error
+            }
+
+#----------------------------------------------------------------------------#
+# Application wiring
+#----------------------------------------------------------------------------#
+_email_queue = None
+
+def init_email_queue(app):
+    global _email_queue
+    if not app.config.get('EMAIL_QUEUE_ENABLE', True):
+        return None
+    try:
+        _email_queue = EmailQueue(app.config, app.logger)
+        _email_queue.start()
+        atexit.register(_email_queue.stop)
+    except OSError as e:
+        app.logger.error(f"Failed to start the email queue, sending synchronously. Reason: {str(e)}")
+        _email_queue = None
+    return _email_queue
+
+def get_email_queue():
+    return _email_queue
+
+def queue_email(config, to, subject, body, cc=None, bcc=None, attachments=None, html=False, text=None):
+    # Queue for background delivery, or send right away if the queue is not running
+    email_queue = get_email_queue()
+    if email_queue is not None:
+        try:
+            return email_queue.enqueue(to, subject, body, cc, bcc, attachments, html, text)
+        except OSError as e:
+            email_queue.logger.error(f"Failed to queue email, sending synchronously. Reason: {str(e)}")
+    return EmailService(config).send_email(to, subject, body, cc=cc, bcc=bcc, attachments=attachments, html=html, text=text)
@@ -0,0 +1,261 @@
+from flask import Blueprint, current_app
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import getaddresses
+from datetime import datetime
+import os
+import json
+import time
+import uuid
+import email
+import click
+import random
+import logging
+import smtplib
+import threading
+from app.services.email_pool import get_smtp_pool, RateLimiter
+
+blueprint = Blueprint('email', __name__)
+
+FAILED_PREFIX = 'failed_'
+FAILED_EXT = '.eml'
+STALE_CLAIM_SECONDS = 600
+
+#----------------------------------------------------------------------------#
+# Failed email spool
+#
+#   EMAIL_FAIL_DIRECTORY/failed_<time>_<id>.eml     waiting to be resent
+#   EMAIL_FAIL_DIRECTORY/meta/<name>.json           attempts and next attempt time
+#   EMAIL_FAIL_DIRECTORY/resending/<name>           claimed by a resender (atomic rename)
+#   EMAIL_FAIL_DIRECTORY/dead/<name>(.json)         given up, kept for inspection
+#
+# Files without metadata (older installs, or dropped in by hand) are due now.
+#----------------------------------------------------------------------------#
+def failed_email_filename():
+    return f"{FAILED_PREFIX}{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}{FAILED_EXT}"
+
+def is_permanent_failure(error):
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+class FailedEmailResender:
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.logger = logger or logging.getLogger(__name__)
+        self.fail_dir = config['EMAIL_FAIL_DIRECTORY']
+        self.meta_dir = os.path.join(self.fail_dir, 'meta')
+        self.resending_dir = os.path.join(self.fail_dir, 'resending')
+        self.dead_dir = os.path.join(self.fail_dir, 'dead')
+
+        self.workers = max(int(config.get('EMAIL_RESEND_WORKERS', 4)), 1)
+        self.rate = float(config.get('EMAIL_RESEND_RATE', 5))
+        self.max_attempts = int(config.get('EMAIL_RESEND_MAX_ATTEMPTS', 8))
+        self.retry_base = float(config.get('EMAIL_RESEND_RETRY_BASE', 300))
+        self.retry_max = float(config.get('EMAIL_RESEND_RETRY_MAX', 21600))
+
+    def _ensure_dirs(self):
+        for path in (self.fail_dir, self.meta_dir, self.resending_dir, self.dead_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _meta_path(self, name):
+        return os.path.join(self.meta_dir, f"{name}.json")
+
+    def load_meta(self, name):
+        try:
+            with open(self._meta_path(name), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'attempts': 0, 'next_attempt': 0, 'last_error': None}
+
+    def add(self, message_path, attempts=0, last_error=None, delay=None, permanent=False):
+        # Move a message file into the spool (or straight to dead letters)
+        self._ensure_dirs()
+        name = failed_email_filename()
+        meta = {
+            'attempts': attempts,
+            'next_attempt': time.time() + (self.retry_base if delay is None else delay),
+            'last_error': last_error
+        }
+        if permanent:
+            os.replace(message_path, os.path.join(self.dead_dir, name))
+            self._write_json(os.path.join(self.dead_dir, f"{name}.json"), meta)
+        else:
+            self._write_json(self._meta_path(name), meta)
+            os.replace(message_path, os.path.join(self.fail_dir, name))
+        return name
+
+    def list_waiting(self):
+        if not os.path.isdir(self.fail_dir):
+            return []
+        return sorted(name for name in os.listdir(self.fail_dir)
+                      if name.endswith(FAILED_EXT) and os.path.isfile(os.path.join(self.fail_dir, name)))
+
+    def list_due(self, now=None, ignore_schedule=False):
+        now = now or time.time()
+        due = []
+        for name in self.list_waiting():
+            meta = self.load_meta(name)
+            if ignore_schedule or meta.get('next_attempt', 0) <= now:
+                due.append((name, meta))
+        return due
+
+    def claim(self, name):
+        claimed_path = os.path.join(self.resending_dir, name)
+        try:
+            os.rename(os.path.join(self.fail_dir, name), claimed_path)
+        except FileNotFoundError:
+            return None  # Already claimed by another resender
+        os.utime(claimed_path)
+        return claimed_path
+
+    def recover_stale_claims(self):
+        cutoff = time.time() - STALE_CLAIM_SECONDS
+        for name in os.listdir(self.resending_dir):
+            path = os.path.join(self.resending_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.rename(path, os.path.join(self.fail_dir, name))
+            except OSError:
+                continue
+
+    def retry_delay(self, attempts):
+        delay = min(self.retry_base * (2 ** (attempts - 1)), self.retry_max)
+        return delay * random.uniform(0.8, 1.2)
+
+    def resend(self, name, meta, rate_limiter):
+        claimed_path = self.claim(name)
+        if claimed_path is None:
+            return 'skipped'
+
+        try:
+            with open(claimed_path, 'r') as f:
+                msg = email.message_from_file(f)
+            recipients = [address for _, address in getaddresses(msg.get_all('To', []) + msg.get_all('Cc', []) + msg.get_all('Bcc', [])) if address]
+            del msg['Bcc']  # Recipients are in the envelope, don't reveal them in the message
+
+            rate_limiter.wait()
+            get_smtp_pool(self.config).sendmail(self.config['EMAIL_FROM_ADDRESS'], recipients, msg.as_string())
+        except Exception as e:
+            meta = dict(meta, attempts=meta.get('attempts', 0) + 1, last_error=str(e))
+            if is_permanent_failure(e) or meta['attempts'] >= self.max_attempts:
+                self._write_json(os.path.join(self.dead_dir, f"{name}.json"), meta)
+                os.replace(claimed_path, os.path.join(self.dead_dir, name))
+                self._remove_meta(name)
+                self.logger.error(f"Giving up on failed email {name} after {meta['attempts']} attempt(s). Reason: {str(e)}")
+                return 'dead'
+            meta['next_attempt'] = time.time() + self.retry_delay(meta['attempts'])
+            self._write_json(self._meta_path(name), meta)
+            os.rename(claimed_path, os.path.join(self.fail_dir, name))
+            return 'retried'
+
+        os.remove(claimed_path)
+        self._remove_meta(name)
+        return 'sent'
+
+    def _remove_meta(self, name):
+        try:
+            os.remove(self._meta_path(name))
+        except FileNotFoundError:
+            pass
+
+    def run_once(self, ignore_schedule=False, workers=None, rate=None):
+        # Resend every due message; safe to run from several threads or processes at once
+        self._ensure_dirs()
+        self.recover_stale_claims()
+        due = self.list_due(ignore_schedule=ignore_schedule)
+        results = {'due': len(due), 'sent': 0, 'retried': 0, 'dead': 0, 'skipped': 0}
+        if not due:
+            return dict(results, seconds=0.0, per_second=0.0)
+
+        started = time.monotonic()
+        rate_limiter = RateLimiter(self.rate if rate is None else rate)
+        with ThreadPoolExecutor(max_workers=min(workers or self.workers, len(due))) as executor:
+            for outcome in executor.map(lambda item: self._resend_safely(item, rate_limiter), due):
+                results[outcome] += 1
+
+        elapsed = time.monotonic() - started
+        results['seconds'] = round(elapsed, 3)
+        results['per_second'] = round(results['sent'] / elapsed, 2) if elapsed > 0 else 0.0
+        self.logger.info(f"Failed email resend: {results}")
+        return results
+
+    def _resend_safely(self, item, rate_limiter):
+        try:
+            return self.resend(item[0], item[1], rate_limiter)
+        except OSError as e:
+            self.logger.error(f"Failed to resend email {item[0]}. Reason: {str(e)}")
+            return 'skipped'
+
+    def requeue_dead(self):
+        # Give dead letters a fresh set of attempts (e.g. after fixing a mail server setting)
+        self._ensure_dirs()
+        count = 0
+        for name in sorted(os.listdir(self.dead_dir)):
+            if not name.endswith(FAILED_EXT):
+                continue
+            try:
+                os.remove(os.path.join(self.dead_dir, f"{name}.json"))
+            except FileNotFoundError:
+                pass
+            os.replace(os.path.join(self.dead_dir, name), os.path.join(self.fail_dir, name))
+            count += 1
+        return count
+
+    def get_stats(self):
+        dead = os.listdir(self.dead_dir) if os.path.isdir(self.dead_dir) else []
+        return {
+            'waiting': len(self.list_waiting()),
+            'dead': sum(1 for name in dead if name.endswith(FAILED_EXT))
+        }
+
+#----------------------------------------------------------------------------#
+# Periodic background resend
+#----------------------------------------------------------------------------#
+_resender_thread = None
+_resender_stop = threading.Event()
+
+def start_resender(app):
+    global _resender_thread
+    interval = float(app.config.get('EMAIL_RESEND_INTERVAL', 300))
+    if interval <= 0 or (_resender_thread is not None and _resender_thread.is_alive()):
+        return
+
+    def run():
+        while not _resender_stop.wait(interval):
+            try:
+                FailedEmailResender(app.config, app.logger).run_once()
+            except Exception as e:
+                app.logger.error(f"Failed email resend run failed. Reason: {str(e)}")
+
+    _resender_stop.clear()
+    _resender_thread = threading.Thread(target=run, name='FailedEmailResender', daemon=True)
+    _resender_thread.start()
+
+def stop_resender():
+    _resender_stop.set()
+
+#----------------------------------------------------------------------------#
+# CLI: flask email resend
+#----------------------------------------------------------------------------#
+@blueprint.cli.command('resend')
+@click.option('--now', 'ignore_schedule', is_flag=True, help='Resend every waiting email, ignoring the retry schedule.')
+@click.option('--dead', 'include_dead', is_flag=True, help='Move dead letters back to the spool first.')
+@click.option('--workers', type=int, default=None, help='Concurrent senders (default: EMAIL_RESEND_WORKERS).')
+@click.option('--rate', type=float, default=None, help='Messages per second (default: EMAIL_RESEND_RATE).')
+def resend_command(ignore_schedule, include_dead, workers, rate):
+    """Resend emails saved in EMAIL_FAIL_DIRECTORY."""
+    resender = FailedEmailResender(current_app.config, current_app.logger)
+    if include_dead:
+        click.echo(f"Requeued {resender.requeue_dead()} dead letter(s)")
+
+    results = resender.run_once(ignore_schedule=ignore_schedule, workers=workers, rate=rate)
+    click.echo(f"Due: {results['due']}  Sent: {results['sent']}  Retry later: {results['retried']}  "
+               f"Dead: {results['dead']}  ({results['seconds']}s, {results['per_second']}/s)")
+    stats = resender.get_stats()
+    click.echo(f"Waiting: {stats['waiting']}  Dead letters: {stats['dead']}")
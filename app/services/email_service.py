@@ -1,21 +1,35 @@
 import os
+import time
 import smtplib
-import email
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from datetime import datetime, timedelta
 from flask import current_app
+from app.services.email_pool import get_smtp_pool, SMTPPoolTimeout, RateLimiter
+from app.services.email_resender import FailedEmailResender, failed_email_filename, is_permanent_failure
+from app.services.email_stream import StreamingMessage, should_stream
 
 class EmailResult:
     def __init__(self, success, message):
         self.success = success
         self.message = message
 
+class EmailBatchResult:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.last_key = None
+        self.seconds = 0.0
+
+    @property
+    def per_second(self):
+        return round(self.sent / self.seconds, 2) if self.seconds > 0 else None
+
 class EmailService:
-    def __init__(self, config):
+    def __init__(self, config, pool=None):
         self.config = config
-        self.smtp_server = None
+        self.pool = pool
         self.last_logged_error = None
         self.last_logged_time = None
 
@@ -39,61 +53,64 @@ class EmailService:
         self.last_logged_error = error_details
         self.last_logged_time = current_time
 
-    def connect_to_smtp(self):
-        try:
-            if self.smtp_server is None or not self.test_conn_open(self.smtp_server):
-                self.smtp_server = self.create_conn()
-            return True
-        except (smtplib.SMTPException, ConnectionRefusedError, OSError) as e:
-            self._log_error("Failed to connect to SMTP server", "connection_error", str(e))
-            return False
-
-    def test_conn_open(self, conn):
-        try:
-            status = conn.noop()[0]
-        except smtplib.SMTPServerDisconnected:
-            status = -1
-        return status == 250
-
-    def create_conn(self):
+    def get_pool(self):
+        # Connections are shared by every EmailService instance (and the error log handler) in this process,
+        # unless the service was given its own pool
+        return self.pool if self.pool is not None else get_smtp_pool(self.config)
+
+    def build_message(self, to, subject, body, cc=None, bcc=None, attachments=None, html=False, text=None):
+        msg = MIMEMultipart()
+        msg['From'] = self.config['EMAIL_FROM_ADDRESS']
+        msg['To'] = ", ".join(to)
+        if cc:
+            msg['Cc'] = ", ".join(cc)
+        if bcc:
+            msg['Bcc'] = ", ".join(bcc)
+        msg['Subject'] = subject
+
+        if html and text:
+            # Plain-text alternative first, mail clients show the last part they can display
+            alternative = MIMEMultipart('alternative')
+            alternative.attach(MIMEText(text, 'plain'))
+            alternative.attach(MIMEText(body, 'html'))
+            msg.attach(alternative)
+        elif html:
+            msg.attach(MIMEText(body, 'html'))
+        else:
+            msg.attach(MIMEText(body, 'plain'))
+
+        if attachments and should_stream(self.config, sum(os.path.getsize(attachment) for attachment in attachments)):
+            return StreamingMessage(msg, attachments)  # Attachments are encoded from disk as the message is sent
+
+        if attachments:
+            for attachment in attachments:
+                with open(attachment, 'rb') as f:
+                    part = MIMEApplication(f.read(), Name=os.path.basename(attachment))
+                    part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment)}"'
+                    msg.attach(part)
+        return msg
+
+    def send_email(self, to, subject, body, cc=None, bcc=None, attachments=None, html=False, text=None):
+        msg = None
         try:
-            new_smtp_server = smtplib.SMTP(self.config['SMTP_SERVER'], self.config['SMTP_PORT'])
-            new_smtp_server.starttls()
-            new_smtp_server.login(self.config['SMTP_USERNAME'], self.config['SMTP_PASSWORD'])
-            return new_smtp_server
-        except smtplib.SMTPException as e:
-            self._log_error("Failed to create SMTP connection", "smtp_error", str(e))
-            raise
+            msg = self.build_message(to, subject, body, cc, bcc, attachments, html, text)
+            recipients = to + (cc if cc else []) + (bcc if bcc else [])
 
-    def send_email(self, to, subject, body, cc=None, bcc=None, attachments=None, html=False):
-        try:
-            if not self.connect_to_smtp():
+            try:
+                if isinstance(msg, StreamingMessage):
+                    self.get_pool().send_stream(self.config['EMAIL_FROM_ADDRESS'], recipients, msg.iter_bytes)
+                else:
+                    self.get_pool().sendmail(self.config['EMAIL_FROM_ADDRESS'], recipients, msg.as_string())
+            except (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, smtplib.SMTPAuthenticationError, SMTPPoolTimeout) as e:
+                self._log_error("Failed to connect to SMTP server", "connection_error", str(e))
+                return EmailResult(False, "Failed to connect to SMTP server")
+            except smtplib.SMTPException:
+                raise  # The server rejected this message, not the connection (SMTP errors are OSErrors too)
+            except OSError as e:
+                # Socket level errors (refused, unreachable, DNS, timeout)
+                self._log_error("Failed to connect to SMTP server", "connection_error", str(e))
                 return EmailResult(False, "Failed to connect to SMTP server")
 
-            msg = MIMEMultipart()
-            msg['From'] = self.config['EMAIL_FROM_ADDRESS']
-            msg['To'] = ", ".join(to)
-            if cc:
-                msg['Cc'] = ", ".join(cc)
-            if bcc:
-                msg['Bcc'] = ", ".join(bcc)
-            msg['Subject'] = subject
-
-            if html:
-                msg.attach(MIMEText(body, 'html'))
-            else:
-                msg.attach(MIMEText(body, 'plain'))
-
-            if attachments:
-                for attachment in attachments:
-                    with open(attachment, 'rb') as f:
-                        part = MIMEApplication(f.read(), Name=os.path.basename(attachment))
-                        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment)}"'
-                        msg.attach(part)
-
-            recipients = to + (cc if cc else []) + (bcc if bcc else [])
-            self.smtp_server.sendmail(self.config['EMAIL_FROM_ADDRESS'], recipients, msg.as_string())
-            
             return EmailResult(True, "Email sent successfully")
 
         except smtplib.SMTPException as e:
@@ -105,6 +122,55 @@ class EmailService:
             self._log_error("Unexpected error occurred", "unexpected_error", str(e))
             return EmailResult(False, "Failed to send email due to an unexpected error")
         
+    def send_batch(self, recipients, subject, body, html=False, rate=None, on_progress=None, progress_every=25):
+        # One message per recipient over a single pooled connection, paced to "rate" messages per second.
+        # "recipients" yields (key, email address); on_progress(result) gets the last finished key as a checkpoint.
+        result = EmailBatchResult()
+        rate_limiter = RateLimiter(self.config.get('EMAIL_BATCH_RATE', 10) if rate is None else rate)
+        pool = self.get_pool()
+        started = time.monotonic()
+        conn = None
+        completed = False
+
+        try:
+            for key, address in recipients:
+                msg = self.build_message([address], subject, body, html=html)
+                rate_limiter.wait()
+
+                for attempt in range(2):
+                    if conn is None:
+                        conn = pool.acquire()  # Raises if the server is down, the caller keeps the checkpoint
+                    try:
+                        conn.sendmail(self.config['EMAIL_FROM_ADDRESS'], [address], msg.as_string())
+                        result.sent += 1
+                    except smtplib.SMTPServerDisconnected:
+                        pool.release(conn, discard=True)
+                        conn = None
+                        if attempt == 0:
+                            continue  # Reconnect and try this recipient again
+                        result.failed += 1
+                        self.save_failed_email(msg)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                        result.failed += 1
+                        if not is_permanent_failure(e):
+                            self.save_failed_email(msg)  # Temporary rejection, the resender retries it
+                    break
+
+                result.last_key = key
+                if on_progress and (result.sent + result.failed) % progress_every == 0:
+                    result.seconds = time.monotonic() - started
+                    on_progress(result)
+            completed = True
+        finally:
+            if conn is not None:
+                # After an unexpected error the connection may be mid-command, never hand it to the next user
+                pool.release(conn, discard=not completed)
+            result.seconds = time.monotonic() - started
+
+        if on_progress:
+            on_progress(result)
+        return result
+
     def save_failed_email(self, msg):
         try:
             if 'EMAIL_FAIL_DIRECTORY' not in self.config:
@@ -113,29 +179,20 @@ class EmailService:
             if not os.path.exists(self.config['EMAIL_FAIL_DIRECTORY']):
                 os.makedirs(self.config['EMAIL_FAIL_DIRECTORY'])
                 
-            failed_email_path = os.path.join(self.config['EMAIL_FAIL_DIRECTORY'], f"failed_{int(datetime.now().timestamp())}.eml")
-            with open(failed_email_path, 'w') as f:
-                f.write(msg.as_string())
+            # Unique name, written under a temporary name so the resender never reads a partial file
+            failed_email_path = os.path.join(self.config['EMAIL_FAIL_DIRECTORY'], failed_email_filename())
+            if isinstance(msg, StreamingMessage):
+                with open(f"{failed_email_path}.tmp", 'wb') as f:
+                    msg.write_to(f)
+            else:
+                with open(f"{failed_email_path}.tmp", 'w') as f:
+                    f.write(msg.as_string())
+            os.replace(f"{failed_email_path}.tmp", failed_email_path)
         except Exception as e:
             self._log_error("Failed to save failed email", "file_error", str(e))
 
     def check_and_resend_failed_emails(self):
+        # Concurrent, rate limited resend of the due emails (also scheduled in the background and "flask email resend")
         if not os.path.exists(self.config['EMAIL_FAIL_DIRECTORY']):
             return
-        
-        try:
-            self.connect_to_smtp()  # Connect once at the beginning
-            for filename in os.listdir(self.config['EMAIL_FAIL_DIRECTORY']):
-                file_path = os.path.join(self.config['EMAIL_FAIL_DIRECTORY'], filename)
-                with open(file_path, 'r') as f:
-                    msg = email.message_from_file(f)
-                try:
-                    recipients = msg['To'].split(", ") + msg.get_all('Cc', []) + msg.get_all('Bcc', [])
-                    self.smtp_server.sendmail(self.config['EMAIL_FROM_ADDRESS'], recipients, msg.as_string())
-                    os.remove(file_path)
-                except Exception:
-                    continue  # Skip this email if there's an error, but continue with others
-        finally:
-            if self.smtp_server:
-                self.smtp_server.quit()  # Close the connection when done
-            self.smtp_server = None  # Reset the connection
\ No newline at end of file
+        return FailedEmailResender(self.config).run_once()
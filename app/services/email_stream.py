@@ -0,0 +1,132 @@
+import os
+import re
+import uuid
+import base64
+import smtplib
+from email.policy import SMTP as SMTP_POLICY
+from email.mime.application import MIMEApplication
+
+CRLF = b'\r\n'
+ENCODE_CHUNK = 57 * 1024   # Multiple of 57 bytes, so every chunk encodes to whole 76 character base64 lines
+READ_CHUNK = 64 * 1024
+DEFAULT_STREAMING_THRESHOLD = 1048576  # Bytes, -1 never streams
+
+EOL_PATTERN = re.compile(br'(?:\r\n|\n|\r(?!\n))')
+PERIOD_PATTERN = re.compile(br'(?m)^\.')
+
+def should_stream(config, size):
+    threshold = int(config.get('EMAIL_STREAMING_THRESHOLD', DEFAULT_STREAMING_THRESHOLD))
+    return 0 <= threshold < size
+
+#----------------------------------------------------------------------------#
+# Message with attachments that are encoded from disk while it is written
+#
+# The headers and text parts come from a normal MIMEMultipart; attachments
+# are read and base64 encoded one chunk at a time, so the message is never
+# held in memory as a whole (for SMTP, the failed email spool or the queue).
+#----------------------------------------------------------------------------#
+class StreamingMessage:
+    def __init__(self, msg, attachments):
+        self.msg = msg
+        self.attachments = attachments or []
+        self.boundary = f"==============={uuid.uuid4().hex}=="
+        self.msg.set_boundary(self.boundary)
+
+    def __getitem__(self, name):
+        return self.msg[name]
+
+    def _attachment_headers(self, path):
+        part = MIMEApplication(b'', Name=os.path.basename(path))
+        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(path)}"'
+        return b''.join(SMTP_POLICY.fold_binary(name, value) for name, value in part.items()) + CRLF
+
+    def iter_bytes(self):
+        delimiter = f"--{self.boundary}".encode()
+        head = self.msg.as_bytes(policy=SMTP_POLICY)
+        yield head[:head.rindex(delimiter + b'--')]  # Headers and text parts, without the closing delimiter
+
+        for path in self.attachments:
+            yield delimiter + CRLF + self._attachment_headers(path)
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(ENCODE_CHUNK)
+                    if not chunk:
+                        break
+                    yield base64.encodebytes(chunk).replace(b'\n', CRLF)
+        yield delimiter + b'--' + CRLF
+
+    def write_to(self, f):
+        for chunk in self.iter_bytes():
+            f.write(chunk)
+
+def iter_file_chunks(path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+#----------------------------------------------------------------------------#
+# SMTP send without building the message first (smtplib.SMTP.sendmail needs
+# the whole message as one string)
+#----------------------------------------------------------------------------#
+def _rset(conn):
+    try:
+        conn.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+def _write_data(conn, chunks):
+    # Normalize line endings and escape leading periods; a partial last line waits for the next chunk
+    pending = b''
+    ends_with_crlf = True
+    for chunk in chunks:
+        data = pending + chunk
+        cut = data.rfind(b'\n') + 1
+        pending = data[cut:]
+        if cut:
+            conn.send(PERIOD_PATTERN.sub(b'..', EOL_PATTERN.sub(CRLF, data[:cut])))
+            ends_with_crlf = True
+    if pending:
+        conn.send(PERIOD_PATTERN.sub(b'..', EOL_PATTERN.sub(CRLF, pending)))
+        ends_with_crlf = pending.endswith(b'\n')
+    conn.send((b'' if ends_with_crlf else CRLF) + b'.' + CRLF)
+
+def sendmail_stream(conn, from_addr, to_addrs, chunks):
+    conn.ehlo_or_helo_if_needed()
+    code, resp = conn.mail(from_addr)
+    if code != 250:
+        if code == 421:
+            conn.close()
+        else:
+            _rset(conn)
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+    refused = {}
+    for addr in to_addrs:
+        code, resp = conn.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+        if code == 421:
+            conn.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(to_addrs):
+        _rset(conn)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    conn.putcmd('data')
+    code, resp = conn.getreply()
+    if code != 354:
+        _rset(conn)
+        raise smtplib.SMTPDataError(code, resp)
+
+    _write_data(conn, chunks)
+    code, resp = conn.getreply()
+    if code != 250:
+        if code == 421:
+            conn.close()
+        else:
+            _rset(conn)
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
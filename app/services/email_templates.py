@@ -0,0 +1,94 @@
+import re
+import html
+from flask import current_app
+from jinja2 import meta
+from markupsafe import escape
+
+FIELD_MARKER = '\ue000'  # Private use character, never whitespace or escaped by Jinja
+FIELD_PATTERN = re.compile(FIELD_MARKER + r'(\w+)' + FIELD_MARKER)
+
+#----------------------------------------------------------------------------#
+# Precompiled email templates
+#
+# An email template is rendered through Jinja once, with a marker in place of
+# each per-message field (username, activation_link, ...). The result is split
+# into literal text and field slots, so a message body is a join of strings.
+# A plain-text alternative is made from the same render.
+#
+# Per-message fields may only be output ({{ username }}); a template that
+# filters or tests them is rendered through Jinja for every message instead.
+#----------------------------------------------------------------------------#
+def html_to_text(body):
+    text = re.sub(r'(?is)<(head|style|script)\b.*?</\1>', '', body)
+    text = re.sub(r'(?is)<a\b[^>]*href="([^"]*)"[^>]*>(.*?)</a>', r'\2 (\1)', text)
+    text = re.sub(r'(?i)<br\s*/?>', '\n', text)
+    text = re.sub(r'(?i)</(p|div|h[1-6]|li|tr)>', '\n\n', text)
+    text = html.unescape(re.sub(r'<[^>]+>', '', text))
+
+    lines = [' '.join(line.split()) for line in text.splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip() + '\n'
+
+def _split_fields(text):
+    # "Hello <m>username<m>," -> ['Hello ', 'username', ','] (fields at odd positions)
+    return FIELD_PATTERN.split(text)
+
+class EmailTemplate:
+    def __init__(self, template, fields, config):
+        self.template = template
+        self.fields = fields
+
+        markers = {field: f"{FIELD_MARKER}{field}{FIELD_MARKER}" for field in fields}
+        body = template.render(config=config, **markers)
+        self.html_parts = _split_fields(body)
+        self.text_parts = _split_fields(html_to_text(body))
+
+        # Every field must come back as a marker, otherwise the template did more than output it
+        self.precompiled = set(self.html_parts[1::2]) == set(fields) and FIELD_MARKER not in ''.join(self.html_parts[::2])
+
+    def render(self, config=None, **values):
+        if not self.precompiled:
+            body = self.template.render(config=config, **values)
+            return body, html_to_text(body)
+
+        html_parts = self.html_parts[:]
+        for i in range(1, len(html_parts), 2):
+            html_parts[i] = escape(values.get(html_parts[i], ''))
+        text_parts = self.text_parts[:]
+        for i in range(1, len(text_parts), 2):
+            text_parts[i] = str(values.get(text_parts[i], ''))
+        return ''.join(html_parts), ''.join(text_parts)
+
+def _compile(app, name):
+    source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+    fields = sorted(meta.find_undeclared_variables(app.jinja_env.parse(source)) - {'config'})
+    return EmailTemplate(app.jinja_env.get_template(name), fields, app.config)
+
+def get_email_template(name, app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.setdefault('email_templates', {})
+
+    project_name = app.config.get('PROJECT_NAME')
+    cached = cache.get(name)
+    if cached is not None and cached[1] == project_name and not app.jinja_env.auto_reload:
+        return cached[2]
+
+    # Jinja returns the same Template object until the file changes (auto reload in debug)
+    template = app.jinja_env.get_template(name)
+    if cached is None or cached[0] is not template or cached[1] != project_name:
+        cached = (template, project_name, _compile(app, name))
+        cache[name] = cached
+    return cached[2]
+
+def render_email(name, **fields):
+    # Returns (html body, plain-text body)
+    app = current_app._get_current_object()
+    return get_email_template(name, app).render(app.config, **fields)
+
+def init_email_templates(app):
+    names = app.jinja_env.list_templates(filter_func=lambda name: name.startswith('email/'))
+    for name in names:
+        try:
+            get_email_template(name, app)
+        except Exception as e:
+            app.logger.error(f"Failed to precompile email template {name}. Reason: {str(e)}")
+    app.logger.debug(f"Precompiled {len(names)} email templates")
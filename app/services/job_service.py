@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import uuid
+
+JOB_STALL_SECONDS = 120  # A running job that has not reported progress for this long was interrupted
+
+#----------------------------------------------------------------------------#
+# File backed job records (one JSON file per job) for long running admin tasks
+#
+# A job keeps its parameters, progress counters and a checkpoint, so a task
+# that was interrupted (restart, crash) can pick up where it stopped.
+#----------------------------------------------------------------------------#
+def get_job_dir(config):
+    return config.get('JOB_DIRECTORY') or './app_data/jobs'
+
+def _job_path(job_dir, job_id):
+    return os.path.join(job_dir, f"{job_id}.json")
+
+def save_job(job_dir, job):
+    os.makedirs(job_dir, exist_ok=True)
+    job['updated'] = time.time()
+    tmp_path = f"{_job_path(job_dir, job['id'])}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, _job_path(job_dir, job['id']))
+    return job
+
+def create_job(job_dir, job_type, params, total=None, created_by=None):
+    now = time.time()
+    job = {
+        'id': uuid.uuid4().hex,
+        'type': job_type,
+        'params': params,
+        'status': 'pending',
+        'created': now,
+        'created_by': created_by,
+        'started': None,
+        'finished': None,
+        'checkpoint': None,
+        'progress': {'total': total, 'done': 0, 'failed': 0, 'per_second': None},
+        'error': None
+    }
+    return save_job(job_dir, job)
+
+def load_job(job_dir, job_id):
+    if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+        return None  # Job ids are uuid hex, anything else is not a job file
+    try:
+        with open(_job_path(job_dir, job_id), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def list_jobs(job_dir, job_type=None, limit=20):
+    if not os.path.isdir(job_dir):
+        return []
+    jobs = []
+    for filename in os.listdir(job_dir):
+        if filename.endswith('.json'):
+            job = load_job(job_dir, filename[:-5])
+            if job and (job_type is None or job['type'] == job_type):
+                jobs.append(job)
+    jobs.sort(key=lambda job: job['created'], reverse=True)
+    return jobs[:limit]
+
+def update_job(job_dir, job, checkpoint=None, **progress):
+    if checkpoint is not None:
+        job['checkpoint'] = checkpoint
+    job['progress'].update(progress)
+    return save_job(job_dir, job)
+
+def start_job(job_dir, job):
+    job['status'] = 'running'
+    job['started'] = job['started'] or time.time()
+    job['error'] = None
+    return save_job(job_dir, job)
+
+def finish_job(job_dir, job, error=None):
+    job['status'] = 'failed' if error else 'completed'
+    job['error'] = error
+    job['finished'] = time.time()
+    return save_job(job_dir, job)
+
+def is_job_interrupted(job, stall_seconds=JOB_STALL_SECONDS):
+    if job['status'] == 'failed':
+        return True
+    return job['status'] == 'running' and time.time() - job['updated'] > stall_seconds
@@ -0,0 +1,257 @@
+import os
+import sys
+import time
+import select
+import gzip
+import bz2
+import lzma
+from datetime import datetime
+
+try:
+    from orjson import loads as _loads, JSONDecodeError
+except ImportError:
+    from json import loads as _loads, JSONDecodeError
+
+LOG_FILE_PREFIX = "app"
+LOG_FILE_EXT = "log"
+LOG_HEADER_PREFIX = "Timestamp\t"
+
+# Compressed archives of old log files are read transparently
+LOG_ARCHIVE_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open
+}
+
+def get_log_filename(date):
+    return f"{LOG_FILE_PREFIX}_{date.strftime('%Y-%m-%d')}.{LOG_FILE_EXT}"
+
+def get_log_file_date(filename):
+    # "app_2024-01-31.log" or "app_2024-01-31.log.gz" -> "2024-01-31"
+    if not filename.startswith(f"{LOG_FILE_PREFIX}_"):
+        return None
+    name, ext = os.path.splitext(filename)
+    if ext in LOG_ARCHIVE_OPENERS:
+        name, ext = os.path.splitext(name)
+    if ext != f".{LOG_FILE_EXT}":
+        return None
+    date_str = name[len(LOG_FILE_PREFIX) + 1:]
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return date_str
+
+def list_log_files(log_dir):
+    # All log files (plain and archived) as (date, filename), oldest first
+    log_files = []
+    for filename in os.listdir(log_dir):
+        date_str = get_log_file_date(filename)
+        if date_str:
+            log_files.append((date_str, filename))
+    log_files.sort()
+    return log_files
+
+def open_log_file(path):
+    opener = LOG_ARCHIVE_OPENERS.get(os.path.splitext(path)[1])
+    if opener:
+        return opener(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+LOG_ENTRY_FIELDS = ('timestamp', 'level', 'module', 'message', 'user_id', 'user_email',
+                    'remote_addr', 'url', 'function', 'line', 'filename')
+
+def parse_json_log_line(line):
+    try:
+        record = _loads(line)
+    except (JSONDecodeError, ValueError):
+        return None
+    if not isinstance(record, dict) or 'timestamp' not in record:
+        return None
+
+    # Present JSON records exactly like the tab separated ones (all values as text)
+    entry = {field: str(record.get(field)) for field in LOG_ENTRY_FIELDS}
+    if 'exc_info' in record:
+        entry['exc_info'] = record['exc_info']
+    return entry
+
+def parse_log_line(line):
+    # Reads both file formats: JSON Lines ("{...}") and the original tab separated columns
+    if line.startswith('{'):
+        return parse_json_log_line(line)
+    if line.startswith(LOG_HEADER_PREFIX):
+        return None
+
+    parts = line.strip().split('\t')
+    if len(parts) != 11:
+        return None
+    return {
+        'timestamp': parts[0],
+        'level': parts[1],
+        'module': parts[2],
+        'message': parts[3],
+        'user_id': parts[4],
+        'user_email': parts[5],
+        'remote_addr': parts[6],
+        'url': parts[7],
+        'function': parts[8],
+        'line': parts[9],
+        'filename': parts[10]
+    }
+
+#----------------------------------------------------------------------------#
+# File change watchers (inotify on Linux, polling everywhere else)
+#----------------------------------------------------------------------------#
+class PollingWatcher:
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        return True
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    IN_MODIFY = 0x00000002
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        mask = self.IN_MODIFY | self.IN_CREATE | self.IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+
+        # Drain all pending events, only the wake-up matters to the follower
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def create_watcher(directory, poll_interval=1.0):
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory, poll_interval)
+
+#----------------------------------------------------------------------------#
+# Follow the current day's log file across the midnight rollover
+#----------------------------------------------------------------------------#
+class LogFollower:
+    def __init__(self, log_dir, watcher=None, poll_interval=1.0, get_current_date=None):
+        self.log_dir = log_dir
+        self.watcher = watcher or create_watcher(log_dir, poll_interval)
+        self.get_current_date = get_current_date or (lambda: datetime.now().date())
+        self.path = None
+        self.position = 0
+        self._partial = b''
+
+    @property
+    def filename(self):
+        return os.path.basename(self.path) if self.path else None
+
+    def start(self, filename=None, position=None):
+        # Resume a previous stream when possible, otherwise start at the end of today's file
+        if filename and os.path.basename(filename) == filename and os.path.exists(os.path.join(self.log_dir, filename)):
+            self.path = os.path.join(self.log_dir, filename)
+            self.position = position or 0
+        else:
+            self.path = os.path.join(self.log_dir, get_log_filename(self.get_current_date()))
+            self.position = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self._partial = b''
+
+    def read_new_lines(self):
+        if not os.path.exists(self.path):
+            return []
+
+        size = os.path.getsize(self.path)
+        if size < self.position:
+            # File was truncated or replaced, start again from the top
+            self.position = 0
+            self._partial = b''
+        if size == self.position:
+            return []
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.position)
+            data = f.read(size - self.position)
+        self.position += len(data)
+
+        chunks = (self._partial + data).split(b'\n')
+        self._partial = chunks.pop()
+
+        lines = []
+        for chunk in chunks:
+            line = chunk.decode('utf-8', errors='replace')
+            if line.startswith(LOG_HEADER_PREFIX):
+                continue
+            lines.append(line)
+        return lines
+
+    def check_rollover(self):
+        today_path = os.path.join(self.log_dir, get_log_filename(self.get_current_date()))
+        if today_path == self.path or not os.path.exists(today_path):
+            return []
+
+        # Flush whatever the old file still holds before switching to the new day
+        lines = self.read_new_lines()
+        self.path = today_path
+        self.position = 0
+        self._partial = b''
+        return lines + self.read_new_lines()
+
+    def follow(self, heartbeat=15.0, max_duration=None):
+        if self.path is None:
+            self.start()
+
+        started = last_yield = time.monotonic()
+        try:
+            while max_duration is None or time.monotonic() - started < max_duration:
+                lines = self.read_new_lines() or self.check_rollover()
+                now = time.monotonic()
+                if lines:
+                    yield lines
+                    last_yield = now
+                    continue
+
+                # Nothing new, so yield an empty batch as a heartbeat (lets the caller detect disconnects)
+                if now - last_yield >= heartbeat:
+                    yield []
+                    last_yield = now
+
+                self.watcher.wait(max(heartbeat - (now - last_yield), 0.01))
+        finally:
+            self.close()
+
+    def close(self):
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
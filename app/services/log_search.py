@@ -0,0 +1,105 @@
+import os
+import heapq
+import itertools
+from collections import deque
+from app.services.process_pool import new_process_pool
+from app.services.log_reader import list_log_files, open_log_file, parse_log_line, LOG_HEADER_PREFIX
+
+DEFAULT_SEARCH_LIMIT = 500
+
+class LogSearchCriteria:
+    def __init__(self, query=None, levels=None, since=None, until=None):
+        self.query = query.lower() if query else None
+        self.levels = {level.upper() for level in levels} if levels else None
+        self.since = since or None
+        self.until = until or None
+
+    def matches_date(self, date_str):
+        # Skip whole files outside the requested range (since/until may carry a time part)
+        if self.since and date_str < self.since[:10]:
+            return False
+        if self.until and date_str > self.until[:10]:
+            return False
+        return True
+
+    def matches(self, line, entry):
+        if self.query and self.query not in line.lower():
+            return False
+        if self.levels and entry['level'] not in self.levels:
+            return False
+        if self.since and entry['timestamp'] < self.since:
+            return False
+        if self.until and entry['timestamp'][:len(self.until)] > self.until:
+            return False
+        return True
+
+def _timestamp_key(entry):
+    # "2024-01-31 12:34:56,789" -> 20240131123456789 (sortable and negatable)
+    digits = ''.join(ch for ch in entry['timestamp'] if ch.isdigit())
+    return int(digits) if digits else 0
+
+def search_log_file(path, criteria, limit, newest_first=False):
+    # Runs in a worker process: scan one file and return at most "limit" matches in timestamp order
+    matches = deque(maxlen=limit) if newest_first else []
+    filename = os.path.basename(path)
+
+    with open_log_file(path) as f:
+        for line in f:
+            if line.startswith(LOG_HEADER_PREFIX):
+                continue
+            # Cheap substring test before paying for the parse
+            if criteria.query and criteria.query not in line.lower():
+                continue
+            entry = parse_log_line(line)
+            if entry is None or not criteria.matches(line, entry):
+                continue
+            entry['file'] = filename
+            matches.append(entry)
+            if not newest_first and len(matches) >= limit:
+                break
+
+    matches = sorted(matches, key=_timestamp_key, reverse=newest_first)
+    return matches
+
+def merge_in_order(batches, newest_first=False):
+    # Files are partitioned by day, so a one-file lookahead is enough to emit entries in order
+    # (entries written just after midnight can still land in the previous day's file)
+    sign = -1 if newest_first else 1
+    counter = itertools.count()
+    pending = []
+
+    for batch in batches:
+        if batch:
+            boundary = sign * _timestamp_key(batch[0])
+            while pending and pending[0][0] <= boundary:
+                yield heapq.heappop(pending)[2]
+            for entry in batch:
+                heapq.heappush(pending, (sign * _timestamp_key(entry), next(counter), entry))
+
+    while pending:
+        yield heapq.heappop(pending)[2]
+
+def search_logs(log_dir, criteria, limit=DEFAULT_SEARCH_LIMIT, newest_first=True, workers=None):
+    log_files = [filename for date_str, filename in list_log_files(log_dir) if criteria.matches_date(date_str)]
+    if newest_first:
+        log_files.reverse()
+    paths = [os.path.join(log_dir, filename) for filename in log_files]
+
+    if not paths or limit <= 0:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) == 1:
+        # Not worth starting a process pool
+        batches = (search_log_file(path, criteria, limit, newest_first) for path in paths)
+        yield from itertools.islice(merge_in_order(batches, newest_first), limit)
+        return
+
+    executor = new_process_pool(min(workers, len(paths)))
+    try:
+        futures = [executor.submit(search_log_file, path, criteria, limit, newest_first) for path in paths]
+        batches = (future.result() for future in futures)
+        yield from itertools.islice(merge_in_order(batches, newest_first), limit)
+    finally:
+        # Early termination: drop the files that have not been scanned yet
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,77 +1,294 @@
 import logging
 from logging.handlers import TimedRotatingFileHandler
-from flask import request, has_request_context
+from flask import request, has_request_context, has_app_context, current_app
 from flask_login import current_user
 from email.message import EmailMessage
+from app.services.email_pool import get_smtp_pool
 from datetime import datetime
-import smtplib
+import threading
+import time
 import os
 
-class RequestFormatter(logging.Formatter):
-    def format(self, record):
-        if has_request_context():
-            record.url = request.url
-            record.remote_addr = request.remote_addr
-            if current_user.is_authenticated:
-                record.user_id = current_user.id
-                record.user_email = current_user.email
-            else:
-                record.user_id = 'N/A'
-                record.user_email = 'N/A'
+# orjson is optional, the JSON Lines formatter falls back to the standard library
+try:
+    import orjson
+
+    def _dumps(data):
+        return orjson.dumps(data, default=str).decode('utf-8')
+except ImportError:
+    import json
+
+    def _dumps(data):
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+
+TSV_LOG_FORMAT = (
+    '%(asctime)s\t%(levelname)s\t%(module)s\t%(message)s\t'
+    '%(user_id)s\t%(user_email)s\t%(remote_addr)s\t%(url)s\t'
+    '%(funcName)s\t%(lineno)d\t%(filename)s'
+)
+TSV_LOG_HEADER = "Timestamp\tLog Level\tModule\tMessage\tUser ID\tUser Email\tRemote Address\tURL\tFunction\tLine\tFilename\n"
+
+def add_request_details(record):
+    if has_request_context():
+        record.url = request.url
+        record.remote_addr = request.remote_addr
+        if current_user.is_authenticated:
+            record.user_id = current_user.id
+            record.user_email = current_user.email
         else:
-            record.url = None
-            record.remote_addr = None
             record.user_id = 'N/A'
             record.user_email = 'N/A'
+    else:
+        record.url = None
+        record.remote_addr = None
+        record.user_id = 'N/A'
+        record.user_email = 'N/A'
 
+class RequestFormatter(logging.Formatter):
+    def format(self, record):
+        add_request_details(record)
         return super().format(record)
 
+class JsonLinesFormatter(RequestFormatter):
+    # One JSON object per record, so tabs and newlines in messages cannot break the columns
+    def __init__(self):
+        super().__init__()
+        self._cached_second = None
+        self._cached_time = None
+
+    def formatTime(self, record, datefmt=None):
+        # Same layout as the default asctime, but strftime only runs once per second
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = time.strftime(self.default_time_format, self.converter(record.created))
+            self._cached_second = second
+        return f"{self._cached_time},{int(record.msecs):03d}"
+
+    def format(self, record):
+        add_request_details(record)
+        entry = {
+            'timestamp': self.formatTime(record),
+            'level': record.levelname,
+            'module': record.module,
+            'message': record.getMessage(),
+            'user_id': record.user_id,
+            'user_email': record.user_email,
+            'remote_addr': record.remote_addr,
+            'url': record.url,
+            'function': record.funcName,
+            'line': record.lineno,
+            'filename': record.filename
+        }
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return _dumps(entry)
+
+def create_log_formatter(log_format):
+    if log_format == 'jsonl':
+        return JsonLinesFormatter()
+    return RequestFormatter(TSV_LOG_FORMAT)
+
+class TokenBucket:
+    # "rate" tokens per minute, up to "burst" saved for short spikes
+    def __init__(self, rate, burst):
+        self.rate = float(rate) / 60.0
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
 class EmailHandler(logging.Handler):
+    # Records are queued by emit() and mailed by a background thread, so request threads never wait on SMTP.
+    # With LOG_EMAIL_DIGEST_INTERVAL set, repeats of the same log call are merged into one summary email.
     def __init__(self, config):
         super().__init__()
         self.config = config
         self.setLevel(getattr(logging, config.get('LOG_EMAIL_LEVEL', 'ERROR')))
 
+        self.digest_interval = float(config.get('LOG_EMAIL_DIGEST_INTERVAL', 0))
+        self.digest_max_records = int(config.get('LOG_EMAIL_DIGEST_MAX_RECORDS', 100))
+        self.max_pending = int(config.get('LOG_EMAIL_MAX_PENDING', 1000))
+        self.rate_limiter = TokenBucket(config.get('LOG_EMAIL_RATE_LIMIT', 10), config.get('LOG_EMAIL_RATE_BURST', 5))
+
+        self.condition = threading.Condition()
+        self.pending = {}  # (module, funcName, lineno, msg) -> digest entry
+        self.pending_records = 0
+        self.digest_started = None
+        self.flush_requested = False
+        self.sending = False
+        self.suppressed = 0
+        self.closed = False
+        self.worker = None
+        self.worker_pid = None
+        self.app = None
+
     def emit(self, record):
-        if not self.config.get('LOG_EMAIL_ENABLE', False):
+        if not self.config.get('LOG_EMAIL_ENABLE', False) or self.closed:
+            return
+
+        # Errors raised while sending are logged from the worker, don't mail those back to ourselves
+        if threading.current_thread() is self.worker:
             return
 
         try:
-            subject = "Error Log Notification"
-            body = f"Error log entry:\n{self.format(record)}"
-            self.send_email(subject, body)
-        except Exception as e:
-            # Temporarily disable email logging to avoid infinite loop
-            original_email_enable = self.config['LOG_EMAIL_ENABLE']
-            self.config['LOG_EMAIL_ENABLE'] = False
-            
+            if self.app is None and has_app_context():
+                self.app = current_app._get_current_object()
+            text = self.format(record)  # Formatted now, while the request context is still available
+
+            if self.digest_interval > 0:
+                key = (record.module, record.funcName, record.lineno, str(record.msg))
+            else:
+                key = object()  # Every record gets its own email
+
+            with self.condition:
+                entry = self.pending.get(key)
+                if entry is not None:
+                    entry['count'] += 1
+                    entry['last'] = record.created
+                elif len(self.pending) >= self.max_pending:
+                    self.suppressed += 1
+                    return
+                else:
+                    self.pending[key] = {'level': record.levelname, 'text': text, 'count': 1,
+                                         'first': record.created, 'last': record.created}
+                if self.digest_started is None:
+                    self.digest_started = time.monotonic()
+                self.pending_records += 1
+                self._start_worker()
+                self.condition.notify_all()
+        except Exception:
+            self.handleError(record)
+
+    def _start_worker(self):
+        # Also restarts the thread in a forked child process (the parent's thread does not survive a fork)
+        if self.worker is None or not self.worker.is_alive() or self.worker_pid != os.getpid():
+            self.worker = threading.Thread(target=self._run, name='EmailHandler', daemon=True)
+            self.worker_pid = os.getpid()
+            self.worker.start()
+
+    def _flush_due(self):
+        if not self.pending:
+            return False
+        if self.digest_interval <= 0 or self.flush_requested or self.closed:
+            return True
+        if self.pending_records >= self.digest_max_records:
+            return True
+        return time.monotonic() - self.digest_started >= self.digest_interval
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self._flush_due():
+                    if self.closed:
+                        return
+                    timeout = None
+                    if self.pending:
+                        timeout = max(self.digest_interval - (time.monotonic() - self.digest_started), 0.01)
+                    self.condition.wait(timeout)
+
+                entries = list(self.pending.values())
+                self.pending = {}
+                self.pending_records = 0
+                self.digest_started = None
+                self.flush_requested = False
+                self.sending = True
+
             try:
-                # Log the error using the application logger
-                from flask import current_app
-                current_app.logger.critical(f"Failed to send error email. Reason: {str(e)}")
-                current_app.logger.critical(f"Original error: {self.format(record)}")
+                if self.digest_interval > 0:
+                    self._deliver(self._format_digest(entries), sum(e['count'] for e in entries))
+                else:
+                    for entry in entries:
+                        self._deliver(("Error Log Notification", f"Error log entry:\n{entry['text']}"), 1)
             finally:
-                # Restore the original email logging setting
-                self.config['LOG_EMAIL_ENABLE'] = original_email_enable
+                with self.condition:
+                    self.sending = False
+                    self.condition.notify_all()
+
+    def _format_digest(self, entries):
+        total = sum(entry['count'] for entry in entries)
+        subject = f"Error Log Digest: {total} record(s), {len(entries)} unique"
+        lines = [f"{total} error log record(s) since the last notification:", ""]
+        for entry in sorted(entries, key=lambda e: e['count'], reverse=True):
+            first = datetime.fromtimestamp(entry['first']).strftime('%Y-%m-%d %H:%M:%S')
+            last = datetime.fromtimestamp(entry['last']).strftime('%Y-%m-%d %H:%M:%S')
+            lines.append(f"[{entry['level']}] x{entry['count']} (first {first}, last {last})")
+            lines.append(entry['text'])
+            lines.append("")
+        return subject, "\n".join(lines)
+
+    def _deliver(self, message, record_count):
+        subject, body = message
+        if not self.rate_limiter.consume():
+            with self.condition:
+                self.suppressed += record_count
+            return
+
+        with self.condition:
+            suppressed, self.suppressed = self.suppressed, 0
+        if suppressed:
+            body += f"\n\n{suppressed} error log record(s) were suppressed by the email rate limit since the last notification."
+
+        try:
+            self.send_email(subject, body)
+        except Exception as e:
+            # Log the failure with the application logger (records from this thread are not emailed)
+            if self.app is not None:
+                with self.app.app_context():
+                    self.app.logger.critical(f"Failed to send error email. Reason: {str(e)}")
+                    self.app.logger.critical(f"Original error: {body}")
+
+    def flush(self, timeout=30):
+        # Send everything that is queued (including a partial digest) and wait for the worker to finish
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            if not self.pending and not self.sending:
+                return
+            self.flush_requested = True
+            self.condition.notify_all()
+            while (self.pending or self.sending) and self.worker is not None and self.worker.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        super().close()
 
     def send_email(self, subject, body):
         msg = EmailMessage()
         msg.set_content(body)
         msg['Subject'] = subject
         msg['From'] = self.config['EMAIL_FROM_ADDRESS']
-        msg['To'] = self.config['ADMIN_USER_LIST']
+        msg['To'] = ", ".join(self.config['ADMIN_USER_LIST'])
 
-        with smtplib.SMTP(self.config['SMTP_SERVER'], self.config['SMTP_PORT']) as server:
-            server.starttls()
-            server.login(self.config['SMTP_USERNAME'], self.config['SMTP_PASSWORD'])
-            server.send_message(msg)
+        # Shares the process-wide connection pool with EmailService
+        get_smtp_pool(self.config).send_message(msg)
 
 class HeaderFileHandler(TimedRotatingFileHandler):
-    def __init__(self, filename, when='midnight', interval=1, backupCount=0, encoding=None, utc=False, atTime=None):
+    def __init__(self, filename, when='midnight', interval=1, backupCount=0, encoding=None, utc=False, atTime=None, header=TSV_LOG_HEADER):
         self.prefix = "app"
         self.ext = "log"
         self.backupCount = backupCount
-        self.header = "Timestamp\tLog Level\tModule\tMessage\tUser ID\tUser Email\tRemote Address\tURL\tFunction\tLine\tFilename\n"
+        self.header = header
         
         # Ensure the initial filename is in the correct format
         dir_name = os.path.dirname(filename)
@@ -89,14 +306,15 @@ class HeaderFileHandler(TimedRotatingFileHandler):
 
     def _open(self):
         if not os.path.exists(self.baseFilename):
-            # If the file doesn't exist, create it and write the header
+            # If the file doesn't exist, create it and write the header (JSON Lines files have none)
             with open(self.baseFilename, 'w', encoding=self.encoding) as f:
-                f.write(self.header)
+                if self.header:
+                    f.write(self.header)
 
             # New File/Date so check and delete old logs
             self.deleteOldLogs()
             
-        else:
+        elif self.header:
             # If the file exists, check its size
             if os.path.getsize(self.baseFilename) == 0:
                 # If the file is empty, write the header
@@ -156,15 +374,13 @@ class HeaderFileHandler(TimedRotatingFileHandler):
             self.handleError(record)
 
 def setup_logger(app):
-    # Remove all existing handlers
+    # Remove all existing handlers (closing them also stops the email sender thread)
     for handler in app.logger.handlers[:]:
         app.logger.removeHandler(handler)
+        handler.close()
 
-    formatter = RequestFormatter(
-        '%(asctime)s\t%(levelname)s\t%(module)s\t%(message)s\t'
-        '%(user_id)s\t%(user_email)s\t%(remote_addr)s\t%(url)s\t'
-        '%(funcName)s\t%(lineno)d\t%(filename)s'
-    )
+    log_format = app.config.get('LOG_FILE_FORMAT', 'tsv')
+    formatter = create_log_formatter(log_format)
 
     log_dir = app.config['LOG_FILE_DIRECTORY']
     os.makedirs(log_dir, exist_ok=True)
@@ -174,7 +390,8 @@ def setup_logger(app):
         filename=log_file_path,
         when='midnight',
         interval=1,
-        backupCount=app.config['LOG_RETENTION_DAYS']
+        backupCount=app.config['LOG_RETENTION_DAYS'],
+        header=None if log_format == 'jsonl' else TSV_LOG_HEADER
     )
     file_handler.setFormatter(formatter)
     file_handler.setLevel(getattr(logging, app.config.get('LOG_FILE_LEVEL', 'INFO')))
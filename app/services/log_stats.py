@@ -0,0 +1,210 @@
+import os
+import json
+import threading
+from collections import Counter
+from app.services.log_reader import list_log_files, open_log_file, parse_log_line, LOG_ARCHIVE_OPENERS
+
+STATS_CACHE_DIRNAME = '.stats'
+STATS_CACHE_VERSION = 1
+ERROR_LEVELS = ('ERROR', 'CRITICAL')
+
+#----------------------------------------------------------------------------#
+# Per-day rollups (one per log file)
+#----------------------------------------------------------------------------#
+def new_day_stats(date_str):
+    return {
+        'date': date_str,
+        'total': 0,
+        'levels': {},
+        'hours': {},
+        'modules': {},
+        'functions': {},
+        'urls': {},
+        'error_urls': {},
+        'users': {}
+    }
+
+def _bump(counts, key, amount=1):
+    counts[key] = counts.get(key, 0) + amount
+
+def add_entry(stats, entry):
+    level = entry['level']
+    stats['total'] += 1
+    _bump(stats['levels'], level)
+    _bump(stats['hours'].setdefault(entry['timestamp'][11:13], {}), level)
+    _bump(stats['modules'], entry['module'])
+    _bump(stats['functions'], f"{entry['filename']}:{entry['function']}:{entry['line']}")
+
+    if entry['url'] not in ('None', ''):
+        url = entry['url'].split('?', 1)[0]
+        _bump(stats['urls'], url)
+        if level in ERROR_LEVELS:
+            _bump(stats['error_urls'], url)
+
+    if entry['user_email'] not in ('N/A', 'None', ''):
+        _bump(stats['users'], entry['user_email'])
+
+def scan_log_file(path, stats, offset=0):
+    # Parse from "offset" and return the position after the last complete line
+    if os.path.splitext(path)[1] in LOG_ARCHIVE_OPENERS:
+        with open_log_file(path) as f:
+            for line in f:
+                entry = parse_log_line(line)
+                if entry:
+                    add_entry(stats, entry)
+        return os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw_line in f:
+            if not raw_line.endswith(b'\n'):
+                break  # Partial line still being written, pick it up next time
+            offset += len(raw_line)
+            entry = parse_log_line(raw_line.decode('utf-8', errors='replace'))
+            if entry:
+                add_entry(stats, entry)
+    return offset
+
+#----------------------------------------------------------------------------#
+# Rollup cache keyed by file mtime/size (in memory and on disk for other workers)
+#----------------------------------------------------------------------------#
+class LogStatsCache:
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        self.cache_dir = os.path.join(log_dir, STATS_CACHE_DIRNAME)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def _cache_path(self, filename):
+        return os.path.join(self.cache_dir, f"{filename}.json")
+
+    def _load_cached(self, filename):
+        cached = self.entries.get(filename)
+        if cached is None:
+            try:
+                with open(self._cache_path(filename), 'r') as f:
+                    cached = json.load(f)
+                if cached.get('version') != STATS_CACHE_VERSION:
+                    cached = None
+            except (OSError, ValueError):
+                cached = None
+        return cached
+
+    def _save_cached(self, filename, cached):
+        self.entries[filename] = cached
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._cache_path(filename)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(cached, f)
+            os.replace(tmp_path, self._cache_path(filename))
+        except OSError:
+            pass  # The in-memory copy is still good
+
+    def get_day_stats(self, date_str, filename):
+        path = os.path.join(self.log_dir, filename)
+        st = os.stat(path)
+        is_archive = os.path.splitext(filename)[1] in LOG_ARCHIVE_OPENERS
+
+        with self.lock:
+            cached = self._load_cached(filename)
+            if cached and cached['mtime_ns'] == st.st_mtime_ns and cached['size'] == st.st_size:
+                self.entries[filename] = cached
+                return cached['stats']
+
+            if cached and not is_archive and cached['offset'] <= st.st_size:
+                # Log files are append-only, so only the new records need to be read
+                stats = cached['stats']
+                offset = scan_log_file(path, stats, cached['offset'])
+            else:
+                stats = new_day_stats(date_str)
+                offset = scan_log_file(path, stats)
+
+            self._save_cached(filename, {
+                'version': STATS_CACHE_VERSION,
+                'mtime_ns': st.st_mtime_ns,
+                'size': st.st_size,
+                'offset': offset,
+                'stats': stats
+            })
+            return stats
+
+    def prune(self, filenames):
+        # Forget rollups of log files removed by the retention policy
+        with self.lock:
+            for filename in list(self.entries):
+                if filename not in filenames:
+                    del self.entries[filename]
+            if os.path.isdir(self.cache_dir):
+                for cache_file in os.listdir(self.cache_dir):
+                    if cache_file.endswith('.json') and cache_file[:-5] not in filenames:
+                        try:
+                            os.remove(os.path.join(self.cache_dir, cache_file))
+                        except OSError:
+                            pass
+
+    def get_stats(self, days=30, top=10):
+        log_files = list_log_files(self.log_dir)
+        self.prune({filename for _, filename in log_files})
+
+        # Archives and plain files can exist for the same day, prefer the plain file
+        by_date = {}
+        for date_str, filename in log_files:
+            if date_str not in by_date or filename.endswith('.log'):
+                by_date[date_str] = filename
+        selected = sorted(by_date.items())[-days:] if days else sorted(by_date.items())
+
+        day_stats = [self.get_day_stats(date_str, filename) for date_str, filename in selected]
+        return summarize(day_stats, top)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_stats_cache(log_dir):
+    with _caches_lock:
+        if log_dir not in _caches:
+            _caches[log_dir] = LogStatsCache(log_dir)
+        return _caches[log_dir]
+
+#----------------------------------------------------------------------------#
+# Combine the per-day rollups for the dashboard
+#----------------------------------------------------------------------------#
+def _top(counter, top):
+    return [{'name': name, 'count': count} for name, count in counter.most_common(top)]
+
+def summarize(day_stats, top=10):
+    levels = Counter()
+    hours = {}
+    modules = Counter()
+    functions = Counter()
+    urls = Counter()
+    error_urls = Counter()
+    users = Counter()
+
+    for stats in day_stats:
+        levels.update(stats['levels'])
+        for hour, hour_levels in stats['hours'].items():
+            hours.setdefault(hour, Counter()).update(hour_levels)
+        modules.update(stats['modules'])
+        functions.update(stats['functions'])
+        urls.update(stats['urls'])
+        error_urls.update(stats['error_urls'])
+        users.update(stats['users'])
+
+    return {
+        'days': [
+            {'date': stats['date'], 'total': stats['total'], 'levels': stats['levels'], 'hours': stats['hours']}
+            for stats in day_stats
+        ],
+        'totals': {
+            'total': sum(levels.values()),
+            'levels': dict(levels),
+            'hours': {hour: dict(hours[hour]) for hour in sorted(hours)},
+            'errors_by_hour': {hour: sum(hours[hour].get(level, 0) for level in ERROR_LEVELS) for hour in sorted(hours)},
+            'top_modules': _top(modules, top),
+            'top_functions': _top(functions, top),
+            'top_urls': _top(urls, top),
+            'top_error_urls': _top(error_urls, top),
+            'top_users': _top(users, top)
+        }
+    }
@@ -1,10 +1,33 @@
-from flask import Blueprint, render_template, jsonify, request, current_app, redirect, url_for
+from flask import Blueprint, render_template, jsonify, request, current_app, redirect, url_for, Response, stream_with_context
 from flask_login import login_required
 from app.services.auth_service_db import admin_required
+from app.services.log_reader import LogFollower, parse_log_line
+from app.services.log_search import LogSearchCriteria, search_logs, DEFAULT_SEARCH_LIMIT
+from app.services.log_stats import get_stats_cache
 import os
+import json
+import click
+import threading
 
 blueprint = Blueprint('log', __name__, template_folder='log_templates')
 
+# Limit the number of live tail streams (each one holds a worker thread while open)
+_tail_lock = threading.Lock()
+_tail_subscribers = 0
+
+def _acquire_tail_slot(max_subscribers):
+    global _tail_subscribers
+    with _tail_lock:
+        if _tail_subscribers >= max_subscribers:
+            return False
+        _tail_subscribers += 1
+        return True
+
+def _release_tail_slot():
+    global _tail_subscribers
+    with _tail_lock:
+        _tail_subscribers = max(_tail_subscribers - 1, 0)
+
 @blueprint.route('/log_viewer')
 @login_required
 @admin_required
@@ -14,9 +37,29 @@ def log_viewer():
 
     # Sort log files based on modification time (most recent first)
     log_files.sort(key=lambda x: os.path.getmtime(os.path.join(log_dir, x)), reverse=True)
-    
+
     return render_template('pages/log_viewer.html', log_files=log_files)
 
+@blueprint.route('/log_dashboard')
+@login_required
+@admin_required
+def log_dashboard():
+    return render_template('pages/log_dashboard.html')
+
+@blueprint.route('/log_stats')
+@login_required
+@admin_required
+def log_stats():
+    try:
+        # At least one day (a negative slice would drop the newest days instead)
+        days = max(int(request.args.get('days', current_app.config.get('LOG_RETENTION_DAYS', 30))), 1)
+        top = int(request.args.get('top', 10))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid days or top value'}), 400
+
+    stats = get_stats_cache(current_app.config['LOG_FILE_DIRECTORY']).get_stats(days=days, top=top)
+    return jsonify(stats)
+
 @blueprint.route('/log_content')
 @login_required
 @admin_required
@@ -28,28 +71,106 @@ def get_log_content():
     except:
         current_app.logger.warning(f"Missing/blank log file.")
         return redirect(url_for('log.log_viewer'))
-    
+
     if not os.path.exists(file_path):
         current_app.logger.warning(f"Missing log file: {file_path}")
         return redirect(url_for('log.log_viewer'))
 
-    with open(file_path, 'r') as f:
-        lines = f.readlines()[1:]  # Skip the header line
-    
+    # Header lines are skipped by the parser (JSON Lines files have none)
     log_entries = []
-    for line in lines:
-        parts = line.strip().split('\t')
-        if len(parts) == 11:
-            log_entries.append({
-                'timestamp': parts[0],
-                'level': parts[1],
-                'message': parts[3],
-                'user_email': parts[5],
-                'remote_addr': parts[6],
-                'url': parts[7],
-                'function': parts[8],
-                'line': parts[9],
-                'filename': parts[10]
-            })
-    
-    return jsonify(log_entries)
\ No newline at end of file
+    with open(file_path, 'r') as f:
+        for line in f:
+            entry = parse_log_line(line)
+            if entry:
+                log_entries.append(entry)
+
+    return jsonify(log_entries)
+
+@blueprint.route('/log_tail')
+@login_required
+@admin_required
+def log_tail():
+    config = current_app.config
+    if not _acquire_tail_slot(config.get('LOG_TAIL_MAX_SUBSCRIBERS', 4)):
+        current_app.logger.warning("Live log tail rejected, too many subscribers")
+        return jsonify({'status': 'error', 'message': 'Too many live log viewers, try again later'}), 503
+
+    follower = LogFollower(config['LOG_FILE_DIRECTORY'], poll_interval=config.get('LOG_TAIL_POLL_INTERVAL', 1.0))
+
+    # Resume from the last event the browser received ("<filename>:<offset>")
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id', '')
+    filename, _, offset = last_event_id.rpartition(':')
+    follower.start(filename or None, int(offset) if offset.isdigit() else None)
+
+    def generate():
+        yield "retry: 3000\n\n"
+        for lines in follower.follow(heartbeat=config.get('LOG_TAIL_HEARTBEAT', 15.0),
+                                     max_duration=config.get('LOG_TAIL_MAX_SECONDS', 300)):
+            if not lines:
+                yield ": keepalive\n\n"
+                continue
+            event_id = f"{follower.filename}:{follower.position}"
+            entries = [entry for entry in (parse_log_line(line) for line in lines) if entry]
+            if entries:
+                yield f"id: {event_id}\nevent: entries\ndata: {json.dumps({'file': follower.filename, 'entries': entries})}\n\n"
+
+    released = []
+    def cleanup():
+        follower.close()
+        if not released:
+            released.append(True)
+            _release_tail_slot()
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(cleanup)
+    return response
+
+@blueprint.route('/log_search')
+@login_required
+@admin_required
+def log_search():
+    config = current_app.config
+    max_results = config.get('LOG_SEARCH_MAX_RESULTS', 5000)
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), max_results)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid result limit'}), 400
+
+    criteria = LogSearchCriteria(
+        query=request.args.get('q'),
+        levels=request.args.getlist('level'),
+        since=request.args.get('since'),
+        until=request.args.get('until')
+    )
+    newest_first = request.args.get('order', 'desc') != 'asc'
+    log_dir = config['LOG_FILE_DIRECTORY']
+    workers = config.get('LOG_SEARCH_WORKERS') or None
+
+    def generate():
+        for entry in search_logs(log_dir, criteria, limit=limit, newest_first=newest_first, workers=workers):
+            yield json.dumps(entry) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@blueprint.cli.command('search')
+@click.argument('query', required=False)
+@click.option('--level', 'levels', multiple=True, help='Log level to include (repeatable).')
+@click.option('--since', help='Earliest timestamp, e.g. "2024-01-31" or "2024-01-31 12:00".')
+@click.option('--until', help='Latest timestamp, e.g. "2024-02-01".')
+@click.option('--limit', default=DEFAULT_SEARCH_LIMIT, show_default=True, help='Stop after this many results.')
+@click.option('--oldest-first', is_flag=True, help='Return results in ascending timestamp order.')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: CPU count).')
+@click.option('--log-dir', default=None, help='Log directory (default: LOG_FILE_DIRECTORY).')
+@click.option('--json', 'as_json', is_flag=True, help='Print JSON Lines instead of tab separated columns.')
+def search_command(query, levels, since, until, limit, oldest_first, workers, log_dir, as_json):
+    """Search all retained log files, including compressed archives."""
+    log_dir = log_dir or current_app.config['LOG_FILE_DIRECTORY']
+    criteria = LogSearchCriteria(query=query, levels=levels, since=since, until=until)
+
+    for entry in search_logs(log_dir, criteria, limit=limit, newest_first=not oldest_first, workers=workers):
+        if as_json:
+            click.echo(json.dumps(entry))
+        else:
+            click.echo("\t".join([entry['timestamp'], entry['level'], entry['message'], entry['user_email'], entry['url'], entry['file']]))
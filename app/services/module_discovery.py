@@ -0,0 +1,147 @@
+from flask import current_app
+import os
+import ast
+import threading
+from app.services.process_pool import new_process_pool
+
+#----------------------------------------------------------------------------#
+# Module discovery for the Module Setup page
+#
+# Each module .py file is parsed for its "blueprint = Blueprint(...)" line and
+# its @...route() functions. The result is cached per file, keyed by
+# (path, mtime, size), so a file is only parsed again after it was changed.
+# Parsing is CPU-bound, so with many changed files (a first scan of a large
+# module tree) the files are parsed in a process pool.
+#----------------------------------------------------------------------------#
+PARALLEL_MIN_FILES = 64
+
+_file_cache = {}
+_cache_lock = threading.Lock()
+
+def file_signature(file_path):
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def parse_module_file(file_path):
+    # Returns {'blueprint': name or None, 'routes': ((route, function name), ...)} in source order
+    with open(file_path, 'r') as file:
+        tree = ast.parse(file.read())
+
+    blueprint_name = None
+    routes = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name) and node.targets[0].id == 'blueprint':
+            if isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name) and node.value.func.id == 'Blueprint':
+                blueprint_name = node.value.args[0].s
+        elif isinstance(node, ast.FunctionDef):
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute) and decorator.func.attr == 'route':
+                    route = decorator.args[0].s if decorator.args else ''
+                    routes.append((route, node.name))
+    return {'blueprint': blueprint_name, 'routes': tuple(routes)}
+
+def _parse_file_safely(file_path):
+    # Runs in a worker process; errors come back as text and are logged by the caller
+    try:
+        return parse_module_file(file_path), None
+    except Exception as e:
+        return None, str(e)
+
+def parse_module_files(file_paths, workers=1):
+    # Returns {path: (file_info, error)}; only files not in the cache are parsed,
+    # in a process pool when there are enough of them
+    results = {}
+    pending = []
+    for file_path in file_paths:
+        try:
+            signature = file_signature(file_path)
+        except OSError as e:
+            results[file_path] = (None, str(e))
+            continue
+        with _cache_lock:
+            cached = _file_cache.get(file_path)
+        if cached and cached[0] == signature:
+            results[file_path] = (cached[1], None)
+        else:
+            pending.append((file_path, signature))
+
+    paths = [file_path for file_path, _ in pending]
+    parsed = None
+    if workers > 1 and len(paths) >= PARALLEL_MIN_FILES:
+        try:
+            with new_process_pool(min(workers, len(paths))) as executor:
+                parsed = list(executor.map(_parse_file_safely, paths, chunksize=max(len(paths) // (workers * 4), 1)))
+        except Exception as e:
+            current_app.logger.warning(f"Parallel module discovery failed, parsing in this process. Reason: {str(e)}")
+    if parsed is None:
+        parsed = [_parse_file_safely(file_path) for file_path in paths]
+
+    with _cache_lock:
+        for (file_path, signature), (file_info, error) in zip(pending, parsed):
+            if file_info is not None:
+                _file_cache[file_path] = (signature, file_info)
+            results[file_path] = (file_info, error)
+    return results
+
+def clear_discovery_cache():
+    with _cache_lock:
+        _file_cache.clear()
+
+def _module_files(module_path):
+    return [(file_name, os.path.join(module_path, file_name)) for file_name in sorted(os.listdir(module_path)) if file_name.endswith('.py')]
+
+def _merge_module_info(module_name, files, results):
+    module_info = {
+        'name': module_name,
+        'blueprint': None,
+        'primary_route': None,
+        'routes': {},
+        'module_file': None
+    }
+
+    for file_name, file_path in files:
+        file_info, error = results[file_path]
+        if error is not None:
+            current_app.logger.error(f"Error parsing file {file_path}: {error}")
+            continue
+
+        if file_info['blueprint']:
+            module_info['blueprint'] = file_info['blueprint']
+            module_info['module_file'] = file_name[:-3]  # Remove .py extension
+        for route, function_name in file_info['routes']:
+            module_info['routes'][route] = function_name
+            if module_info['primary_route'] is None or len(route) < len(module_info['primary_route']):
+                module_info['primary_route'] = route
+
+    return module_info if module_info['routes'] and module_info['module_file'] else None
+
+def extract_module_info(module_path, module_name):
+    files = _module_files(module_path)
+    return _merge_module_info(module_name, files, parse_module_files([file_path for _, file_path in files]))
+
+def discover_modules(modules_dir, workers=1):
+    # Returns [(folder name, module info or None)] in folder name order; the
+    # files of all modules are parsed together so one pool serves the whole tree
+    module_files = {}
+    for module_folder in sorted(os.listdir(modules_dir)):
+        module_path = os.path.join(modules_dir, module_folder)
+        if os.path.isdir(module_path):
+            try:
+                module_files[module_folder] = _module_files(module_path)
+            except Exception as e:
+                current_app.logger.error(f"Error processing module {module_folder}: {str(e)}")
+
+    results = parse_module_files([file_path for files in module_files.values() for _, file_path in files], workers)
+
+    modules = []
+    for module_folder, files in module_files.items():
+        try:
+            modules.append((module_folder, _merge_module_info(module_folder, files, results)))
+        except Exception as e:
+            current_app.logger.error(f"Error processing module {module_folder}: {str(e)}")
+    return modules
+
+def get_discovery_workers(config):
+    # MODULE_DISCOVERY_WORKERS: 0 = one per CPU, 1 = no process pool
+    workers = int(config.get('MODULE_DISCOVERY_WORKERS', 0))
+    return workers if workers > 0 else (os.cpu_count() or 1)
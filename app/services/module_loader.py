@@ -0,0 +1,96 @@
+from flask import current_app
+import sys
+import time
+import threading
+import importlib
+
+#----------------------------------------------------------------------------#
+# Module loading for the services and the proxied modules in app/modules
+#
+# MODULE_LOADING = 'lazy' (default) imports a module on its first request;
+# an import lock per module makes concurrent first requests wait for one
+# import instead of racing it. 'eager' imports every enabled module in a
+# warm-up pass at startup, so no user pays for the import.
+# Every import is timed; the Module Setup page shows the times and marks
+# modules over MODULE_IMPORT_BUDGET_MS. A module that another module already
+# imported is recorded as "preloaded" (its time is part of that import).
+#----------------------------------------------------------------------------#
+LOADING_STRATEGIES = ('lazy', 'eager')
+
+_import_times = {}  # dotted name -> {'seconds', 'loaded_at', 'error'}
+_import_locks = {}
+_locks_guard = threading.Lock()
+
+def _import_lock(module_name):
+    with _locks_guard:
+        return _import_locks.setdefault(module_name, threading.Lock())
+
+def _record_preloaded(module_name):
+    # Imported by another module before its own timed import: its time is part of that import
+    _import_times.setdefault(module_name, {'seconds': 0.0, 'loaded_at': time.time(), 'error': None, 'preloaded': True})
+
+def import_timed(module_name, budget_ms=None, logger=None):
+    module = sys.modules.get(module_name)
+    if module is not None:
+        _record_preloaded(module_name)
+        return module
+
+    with _import_lock(module_name):
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module  # Imported by a concurrent request while this one waited
+
+        started = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            _import_times[module_name] = {'seconds': time.perf_counter() - started, 'loaded_at': time.time(), 'error': str(e), 'preloaded': False}
+            raise
+        seconds = time.perf_counter() - started
+        _import_times[module_name] = {'seconds': seconds, 'loaded_at': time.time(), 'error': None, 'preloaded': False}
+
+    if budget_ms and logger and seconds * 1000 > budget_ms:
+        logger.warning(f"Import of {module_name} took {seconds * 1000:.0f} ms (budget {budget_ms} ms)")
+    return module
+
+def module_import_name(module):
+    return f"app.modules.{module['name']}.{module['module_file']}"
+
+def load_module(module):
+    # The module file of a MODULE_LIST entry, imported on first use
+    return import_timed(module_import_name(module), current_app.config.get('MODULE_IMPORT_BUDGET_MS'), current_app.logger)
+
+def get_loading_strategy(config):
+    strategy = str(config.get('MODULE_LOADING', 'lazy')).lower()
+    return strategy if strategy in LOADING_STRATEGIES else 'lazy'
+
+def warm_up_modules(app):
+    # Import every enabled module before serving (MODULE_LOADING = 'eager')
+    started = time.perf_counter()
+    count = 0
+    with app.app_context():
+        for module in app.config['MODULE_LIST']:
+            if not module['enabled'] or not module['module_file']:
+                continue
+            try:
+                load_module(module)
+                count += 1
+            except Exception as e:
+                app.logger.error(f"Failed to import Module: {module['name']} in File: {module['module_file']}.py - {str(e)}")
+    app.logger.info(f"Imported {count} module(s) in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def get_import_time(module_name):
+    return _import_times.get(module_name)
+
+def get_all_import_times():
+    return dict(_import_times)
+
+def get_service_import_times():
+    # [(service name, seconds)] slowest first; services imported as a dependency of another are left out
+    times = [(name[len('app.services.'):], record['seconds']) for name, record in _import_times.items()
+             if name.startswith('app.services.') and not record['preloaded']]
+    return sorted(times, key=lambda item: item[1], reverse=True)
+
+def get_module_import_times(modules):
+    # Module name -> import record (None if not imported yet) for the Module Setup page
+    return {module['name']: _import_times.get(module_import_name(module)) for module in modules if module['module_file']}
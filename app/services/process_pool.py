@@ -0,0 +1,17 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+#----------------------------------------------------------------------------#
+# Process pools for CPU-bound work (log search, module discovery)
+#
+# Workers are started from a clean process (forkserver, or spawn where there
+# is none), not forked from the server: a fork copies locks held by its
+# threads (logging, email queue, database pool) and can deadlock. A clean
+# worker imports the main script again under the name "__mp_main__", so a
+# script that creates the app (run_local.py) must not do so under that name.
+# Workers then only import the module of the function they run.
+#----------------------------------------------------------------------------#
+POOL_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+def new_process_pool(max_workers):
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=POOL_CONTEXT)
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import platform
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+#----------------------------------------------------------------------------#
+# Startup profiler (STARTUP_PROFILE=True)
+#
+# Times the phases of app.py at import: the imports (including app_config),
+# each step of create_app, the module loader and register_blueprints. When the
+# app is ready, finish() logs the breakdown and writes a JSON report to
+# STARTUP_PROFILE_REPORT, e.g. for a CI job to compare against a budget.
+# Reads os.environ directly because it starts before the config is loaded.
+#----------------------------------------------------------------------------#
+def _env_flag(name):
+    return os.environ.get(name, 'False').lower() in ('true', '1', 'yes')
+
+class StartupProfiler:
+    def __init__(self, enabled=None):
+        self.enabled = _env_flag('STARTUP_PROFILE') if enabled is None else enabled
+        self.started = time.perf_counter()
+        self.last_mark = self.started
+        self.phases = []  # {'name', 'parent', 'ms'} in start order
+        self.stack = []
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        entry = {'name': name, 'parent': self.stack[-1]['name'] if self.stack else None, 'ms': None}
+        self.phases.append(entry)
+        self.stack.append(entry)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            self.last_mark = time.perf_counter()
+            entry['ms'] = round((self.last_mark - started) * 1000, 2)
+
+    def mark(self, name):
+        # Record the time since the previous phase (or since the profiler was created) as a phase
+        now = time.perf_counter()
+        if self.enabled:
+            self.phases.append({'name': name, 'parent': None, 'ms': round((now - self.last_mark) * 1000, 2)})
+        self.last_mark = now
+
+    def build_report(self, import_times=None):
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pid': os.getpid(),
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'phases': self.phases,
+            'imports': sorted(({'module': name, 'ms': round(record['seconds'] * 1000, 2), 'preloaded': record.get('preloaded', False)}
+                               for name, record in (import_times or {}).items()),
+                              key=lambda item: item['ms'], reverse=True),
+        }
+
+    def finish(self, app, import_times=None):
+        if not self.enabled:
+            return None
+        report = self.build_report(import_times)
+
+        # One log line: the top level phases and the slowest steps within them (the report has everything)
+        top_level = ', '.join(f"{entry['name']} {entry['ms']:.0f} ms" for entry in report['phases'] if not entry['parent'])
+        slowest = sorted((entry for entry in report['phases'] if entry['parent']), key=lambda entry: entry['ms'], reverse=True)[:3]
+        app.logger.info(f"Startup profile: {report['total_ms']:.0f} ms total ({top_level}); slowest steps: "
+                        + ', '.join(f"{entry['parent']}/{entry['name']} {entry['ms']:.0f} ms" for entry in slowest))
+
+        report_path = os.environ.get('STARTUP_PROFILE_REPORT') or './app_data/startup_profile.json'
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            app.logger.warning(f"Failed to write the startup profile to {report_path}. Reason: {str(e)}")
+        return report
+
+# Created when app.py starts importing, so the report covers the whole startup
+startup_profiler = StartupProfiler()
@@ -19,8 +19,9 @@ import pytest
 from flask import Flask, redirect, url_for, request
 from flask_login import LoginManager, current_user
 from werkzeug.security import check_password_hash
+from app.services import auth_service_db
 from app.services.auth_service import blueprint as auth_blueprint
-from app.services.auth_service_db import add_user, get_user_by_email, update_user_activation, setup_database, init_db, get_base, generate_token, get_user, get_token
+from app.services.auth_service_db import add_user, get_user_by_email, update_user_activation, setup_database, init_db, get_base, generate_token, get_user, get_token, get_public_endpoints, register_public_endpoints
 from unittest.mock import patch
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -148,7 +149,7 @@ def test_require_login_for_site_access(client, app):
             response = client.get('/', base_url='http://localhost')
             assert response.status_code == 200  # Should now be able to access the page
 
-@patch('app.services.auth_service.EmailService.send_email')
+@patch('app.services.email_service.EmailService.send_email')
 def test_add_user_setup(mock_send_email, client, app, db):
     with app.app_context():
         # Create admin user
@@ -214,7 +215,7 @@ def test_create_password(client, app, db):
         })
         assert response.status_code == 404
 
-@patch('app.services.auth_service.EmailService.send_email')
+@patch('app.services.email_service.EmailService.send_email')
 def test_register(mock_send_email, client, app, db):
     with app.app_context():
         response = client.post('/register', data={
@@ -258,7 +259,7 @@ def test_logout(client, app, db):
             with client.session_transaction() as session:
                 assert '_user_id' not in session
 
-@patch('app.services.auth_service.EmailService.send_email')
+@patch('app.services.email_service.EmailService.send_email')
 def test_forgot_password(mock_send_email, mock_smtp, client, app, db):
     with app.app_context():
         add_user('test_id', 'testuser', 'test@example.com', 'testpassword', is_active=True)
@@ -294,7 +295,7 @@ def test_delete_account(client, app, db):
             deleted_user = get_user_by_email('test@example.com')
             assert deleted_user is None
 
-@patch('app.services.auth_service.EmailService.send_email')
+@patch('app.services.email_service.EmailService.send_email')
 def test_register_with_default_role(mock_send_email, client, app, db):
     with app.app_context():
         app.config['ROLE_LIST'] = [{'name': 'default_role', 'modules': []}]
@@ -426,7 +427,7 @@ def test_admin_first_time_login(client, app, db):
         })
         assert response.status_code == 400  # Bad request for invalid credentials
 
-@patch('app.services.auth_service.EmailService.send_email')
+@patch('app.services.email_service.EmailService.send_email')
 def test_reset_password_activates_inactive_account(mock_send_email, client, app, db):
     with app.app_context():
         # Create an inactive user
@@ -538,4 +539,18 @@ def test_password_reset_clears_counter(client, app, db):
         
         # Verify successful login with new password
         response = client.post('/login', data={'email': 'test@example.com', 'password': 'newpassword'})
-        assert response.status_code == 302  # Redirect after successful login
\ No newline at end of file
+        assert response.status_code == 302  # Redirect after successful login
+
+def test_public_endpoints_registry(monkeypatch):
+    # The registry is process-global, restore it after the test
+    monkeypatch.setattr(auth_service_db, '_public_endpoints', auth_service_db._public_endpoints)
+
+    # The auth pages are registered when auth_service is imported
+    before = get_public_endpoints()
+    assert {'static', 'auth.login', 'auth.forgot', 'auth.reset_password', 'auth.create_password'} <= before
+    assert 'auth.logout' not in before
+
+    register_public_endpoints('status.health')
+    assert 'status.health' in get_public_endpoints()
+    assert 'status.health' not in before  # Replaced, never changed in place
+    assert isinstance(get_public_endpoints(), frozenset)
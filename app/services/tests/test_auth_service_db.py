@@ -16,15 +16,22 @@ sys.path.insert(0, project_path)
 # Begin Test Code
 #----------------------------------------------------------------------------
 import pytest
+import time
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
 from datetime import datetime, timedelta
+from app.services import auth_service_db
 from app.services.auth_service_db import (
     setup_database, init_db, add_user, get_user, get_user_by_email,
     update_user, delete_user, generate_token, get_token, delete_token,
     update_user_role, update_user_activation, update_user_password,
-    update_user_admin_status, get_all_users, get_role_user_counts,
-    get_default_role, update_default_role
+    update_user_admin_status, get_role_user_counts,
+    get_default_role, update_default_role, query_users, count_user_list,
+    bulk_update_user_role, bulk_update_user_activation, bulk_delete_users, authenticate_user
 )
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from freezegun import freeze_time
 
@@ -104,13 +111,6 @@ def test_update_user_admin_status(db):
     user = get_user('admin_id')
     assert user.is_admin == True
 
-def test_get_all_users(db):
-    add_user('user1_id', 'user1', 'user1@example.com', 'password')
-    add_user('user2_id', 'user2', 'user2@example.com', 'password')
-    users = get_all_users()
-    assert len(users) == 2
-    assert set(user.username for user in users) == {'user1', 'user2'}
-
 def test_get_role_user_counts(db):
     add_user('user1_id', 'user1', 'user1@example.com', 'password', user_role='role1')
     add_user('user2_id', 'user2', 'user2@example.com', 'password', user_role='role1')
@@ -118,6 +118,30 @@ def test_get_role_user_counts(db):
     counts = get_role_user_counts()
     assert counts == {'role1': 2, 'role2': 1}
 
+def test_role_user_counts_cache(db):
+    add_user('user1_id', 'user1', 'user1@example.com', 'password', user_role='role1')
+    add_user('user2_id', 'user2', 'user2@example.com', 'password', user_role='role1')
+    assert get_role_user_counts() == {'role1': 2}
+
+    # Changes through this module adjust the cached counts without a new query
+    with patch.object(auth_service_db, 'get_db', wraps=auth_service_db.get_db) as get_db:
+        add_user('user3_id', 'user3', 'user3@example.com', 'password', user_role='role2')
+        update_user_role('user1_id', 'role2')
+        delete_user('user2_id')
+        calls = get_db.call_count
+        assert get_role_user_counts() == {'role2': 2}
+        assert get_db.call_count == calls
+
+    # Writes it cannot follow are seen once the cache expires
+    with auth_service_db.engine.begin() as connection:
+        connection.execute(auth_service_db.text("UPDATE users SET user_role = 'role3'"))
+    assert get_role_user_counts() == {'role2': 2}
+    with patch.object(auth_service_db, 'role_count_cache_seconds', 0):
+        assert get_role_user_counts() == {'role3': 2}
+
+    list(bulk_delete_users(filters={'role': 'role3'}))
+    assert get_role_user_counts() == {}
+
 def test_token_expiration(db):
     # Set the initial time
     initial_time = datetime(2023, 1, 1, 12, 0, 0)
@@ -146,4 +170,201 @@ def test_update_default_role(db):
     update_default_role('role2')
     assert get_default_role() == 'role2'
     update_default_role(None)
-    assert get_default_role() is None
\ No newline at end of file
+    assert get_default_role() is None
+@pytest.fixture
+def db_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'users', 'users.db')
+        setup_database({'USER_DATABASE_PATH': path})
+        yield path
+        auth_service_db.engine.dispose()
+
+def table_names_and_indexes(path):
+    with sqlite3.connect(path) as connection:
+        return {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+def test_new_database_is_stamped_with_the_schema_version(db_path):
+    assert init_db() == auth_service_db.SCHEMA_VERSION
+    names = table_names_and_indexes(db_path)
+    assert {'users', 'tokens', 'default_role', 'schema_version', 'ix_users_email_lower', 'ix_tokens_token'} <= names
+
+def test_warm_start_skips_migrations(db_path):
+    init_db()
+    with patch.object(auth_service_db, '_run_migrations') as run_migrations, patch.object(auth_service_db, 'inspect') as inspect:
+        assert init_db() == auth_service_db.SCHEMA_VERSION
+    run_migrations.assert_not_called()
+    inspect.assert_not_called()
+
+def test_database_without_version_is_migrated(db_path):
+    # A database created before the version stamp, with an older users table
+    with sqlite3.connect(db_path) as connection:
+        connection.execute('CREATE TABLE users (id VARCHAR PRIMARY KEY, username VARCHAR NOT NULL, email VARCHAR NOT NULL, password VARCHAR NOT NULL)')
+        connection.execute("INSERT INTO users VALUES ('old_id', 'olduser', 'old@example.com', 'hash')")
+
+    assert init_db() == auth_service_db.SCHEMA_VERSION
+    with sqlite3.connect(db_path) as connection:
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(users)')}
+    assert {'login_attempts', 'lockout_until', 'user_role'} <= columns
+    assert get_user('old_id').login_attempts == 0
+    assert 'ix_users_user_role' in table_names_and_indexes(db_path)
+
+def test_last_login_column_is_added(db_path):
+    # A database at schema version 4, before last_login
+    with patch.object(auth_service_db, 'MIGRATIONS', auth_service_db.MIGRATIONS[:4]), patch.object(auth_service_db, 'SCHEMA_VERSION', 4):
+        init_db()
+    with sqlite3.connect(db_path) as connection:
+        connection.execute('ALTER TABLE users DROP COLUMN last_login')
+
+    assert init_db() == auth_service_db.SCHEMA_VERSION
+    with sqlite3.connect(db_path) as connection:
+        assert 'last_login' in {row[1] for row in connection.execute('PRAGMA table_info(users)')}
+
+def test_email_sort_index_is_added(db_path):
+    # A database at schema version 5, before the email sort index
+    with patch.object(auth_service_db, 'MIGRATIONS', auth_service_db.MIGRATIONS[:5]), patch.object(auth_service_db, 'SCHEMA_VERSION', 5):
+        init_db()
+    assert 'ix_users_email_id' not in table_names_and_indexes(db_path)
+
+    assert init_db() == auth_service_db.SCHEMA_VERSION
+    assert 'ix_users_email_id' in table_names_and_indexes(db_path)
+    with sqlite3.connect(db_path) as connection:
+        plan = ' '.join(row[-1] for row in connection.execute('EXPLAIN QUERY PLAN SELECT id FROM users ORDER BY email, id LIMIT 50'))
+    assert 'ix_users_email_id' in plan and 'TEMP B-TREE' not in plan
+
+def test_concurrent_workers_migrate_once(db_path):
+    calls = []
+    first_migration = auth_service_db.MIGRATIONS[0]
+
+    def counted(connection):
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        first_migration(connection)
+
+    barrier = threading.Barrier(6)
+    def worker():
+        barrier.wait()
+        init_db()
+
+    with patch.object(auth_service_db, 'MIGRATIONS', [counted] + auth_service_db.MIGRATIONS[1:]):
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(calls) == 1
+
+@pytest.fixture
+def user_list(db):
+    for i in range(12):
+        add_user(f'id{i:02d}', f'user{i:02d}', f'{"admin" if i < 3 else "user"}{i:02d}@example.com', 'password')
+        update_user_role(f'id{i:02d}', 'Admin' if i < 3 else 'User')
+        if i % 2:
+            update_user_activation(f'id{i:02d}')
+    # Several users share a creation time, the id breaks the tie
+    with auth_service_db.engine.begin() as connection:
+        connection.execute(auth_service_db.text("UPDATE users SET created_at = '2024-01-0' || (CAST(substr(id, 3) AS INTEGER) / 4 + 1) || ' 10:00:00'"))
+
+def test_query_users_keyset_pages(user_list):
+    seen = []
+    cursor = None
+    while True:
+        page = query_users(limit=5, cursor=cursor)
+        seen += [user['id'] for user in page['users']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert seen == [f'id{i:02d}' for i in reversed(range(12))]  # Newest first, then by id
+    assert set(page['users'][0]) == {'id', 'username', 'email', 'is_active', 'is_admin', 'eula_acknowledged', 'user_role', 'created_at'}
+    assert page['users'][-1]['created_at'] == '2024-01-01 10:00:00'
+
+    # Reading by offset gives the same page
+    assert query_users(limit=5, offset=5)['users'] == query_users(limit=5, cursor=query_users(limit=5)['next_cursor'])['users']
+
+def test_query_users_sort_and_filters(user_list):
+    by_name = query_users(sort='username', descending=False, limit=3)
+    assert [user['username'] for user in by_name['users']] == ['user00', 'user01', 'user02']
+    assert [user['username'] for user in query_users(sort='username', descending=False, cursor=by_name['next_cursor'], limit=3)['users']] == ['user03', 'user04', 'user05']
+
+    assert {user['id'] for user in query_users(role='Admin')['users']} == {'id00', 'id01', 'id02'}
+    assert all(user['is_active'] for user in query_users(active=True)['users'])
+    assert [user['id'] for user in query_users(email_prefix='ADMIN0', sort='email', descending=False)['users']] == ['id00', 'id01', 'id02']
+    assert count_user_list() == 12
+    assert count_user_list(role='User', active=False) == 4  # id04, id06, id08, id10
+    assert count_user_list(email_prefix='user1') == 2
+
+def test_query_users_rejects_bad_input(user_list):
+    with pytest.raises(ValueError):
+        query_users(sort='password')
+    with pytest.raises(ValueError):
+        query_users(cursor='not-a-cursor')
+
+def test_bulk_update_role_by_filter_in_chunks(user_list):
+    chunks = list(bulk_update_user_role('Staff', filters={'role': 'User', 'active': True}, chunk_size=2))
+    assert [changed for _, changed in chunks] == [2, 2, 1]  # id03, id05, id07, id09, id11
+    assert chunks[-1][0] == 'id11'
+    assert count_user_list(role='Staff') == 5 and count_user_list(role='User') == 4
+
+    # Resuming after a checkpoint skips the users already changed
+    assert sum(changed for _, changed in bulk_update_user_role(None, filters={'role': 'Staff'}, after_id='id07')) == 2
+    assert get_user('id05').user_role == 'Staff' and get_user('id09').user_role is None
+
+def test_bulk_update_activation(user_list):
+    changed = sum(changed for _, changed in bulk_update_user_activation(False, filters={'role': 'Admin'}, exclude_ids=['id01']))
+    assert changed == 0  # id01 is the only active admin
+    assert sum(changed for _, changed in bulk_update_user_activation(True, chunk_size=5)) == 6
+    assert count_user_list(active=True) == 12
+
+def test_bulk_delete_removes_tokens(user_list):
+    token = generate_token('id04', 'reset')
+    chunks = list(bulk_delete_users(filters={'email_prefix': 'user'}, chunk_size=4, exclude_ids=['id11']))
+    assert sum(changed for _, changed in chunks) == 8
+    assert count_user_list() == 4 and get_user('id11') is not None
+    assert get_token(token, 'reset') is None
+
+def count_writes():
+    writes = []
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('UPDATE', 'INSERT', 'DELETE')):
+            writes.append(statement)
+    event.listen(auth_service_db.engine, 'before_cursor_execute', before_execute)
+    return writes
+
+def test_authenticate_user(db):
+    add_user('login_id', 'loginuser', 'login@example.com', 'password', is_active=True)
+    writes = count_writes()
+
+    result = authenticate_user('login@example.com', 'password', is_admin=True)
+    assert result.success and not result.locked
+    assert result.user.username == 'loginuser' and result.user.is_admin  # Usable after the session is closed
+    assert len(writes) == 1
+    assert get_user('login_id').last_login is not None
+
+    # Nothing changed since the last login, so nothing is written
+    assert authenticate_user('login@example.com', 'password', is_admin=True).success
+    assert len(writes) == 1
+
+    assert not authenticate_user('nobody@example.com', 'password', is_admin=False).success
+    assert len(writes) == 1
+
+def test_authenticate_user_failures_and_lockout(db):
+    add_user('login_id', 'loginuser', 'login@example.com', 'password', is_active=True)
+    add_user('inactive_id', 'inactive', 'inactive@example.com', 'password')
+    assert not authenticate_user('inactive@example.com', 'password', is_admin=False).success
+
+    with freeze_time('2024-01-01 12:00:00'):
+        for _ in range(4):
+            result = authenticate_user('login@example.com', 'wrong', is_admin=False)
+            assert not result.success and not result.locked
+        assert get_user('login_id').login_attempts == 4
+        assert authenticate_user('login@example.com', 'wrong', is_admin=False).lockout_minutes == 30
+        result = authenticate_user('login@example.com', 'password', is_admin=False)
+        assert result.locked and not result.success
+
+    # After the lockout a wrong password starts counting again from one
+    with freeze_time('2024-01-01 12:31:00'):
+        assert not authenticate_user('login@example.com', 'wrong', is_admin=False).locked
+        assert get_user('login_id').login_attempts == 1
+        assert authenticate_user('login@example.com', 'password', is_admin=False).success
+        user = get_user('login_id')
+        assert user.login_attempts == 0 and user.lockout_until is None and user.last_login == datetime(2024, 1, 1, 12, 31)
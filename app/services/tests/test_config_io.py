@@ -0,0 +1,88 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import json
+import tempfile
+import threading
+from unittest.mock import patch
+from app.config_io import read_config, write_config, get_config_version, config_lock, ConfigConflictError
+
+@pytest.fixture
+def config_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield os.path.join(temp_dir, 'role_config.cnf')
+
+def test_write_and_read_with_versions(config_path):
+    assert read_config(config_path, default=[]) == ([], 0)
+    assert write_config(config_path, [{'name': 'User'}]) == 1
+    assert write_config(config_path, [{'name': 'User'}, {'name': 'Admin'}]) == 2
+
+    data, version = read_config(config_path)
+    assert data == [{'name': 'User'}, {'name': 'Admin'}]
+    assert version == get_config_version(config_path) == 2
+    assert sorted(os.listdir(os.path.dirname(config_path))) == ['role_config.cnf', 'role_config.cnf.lock']
+
+def test_reading_does_not_create_the_lock_file(config_path):
+    with open(config_path, 'w') as f:
+        json.dump({'PROJECT_NAME': 'First'}, f)
+
+    assert read_config(config_path) == ({'PROJECT_NAME': 'First'}, 0)
+    assert get_config_version(config_path) == 0
+    assert os.listdir(os.path.dirname(config_path)) == ['role_config.cnf']
+
+def test_stale_version_is_rejected(config_path):
+    write_config(config_path, {'PROJECT_NAME': 'First'})
+    _, version = read_config(config_path)
+
+    write_config(config_path, {'PROJECT_NAME': 'Other admin'}, expected_version=version)
+    with pytest.raises(ConfigConflictError) as conflict:
+        write_config(config_path, {'PROJECT_NAME': 'Mine'}, expected_version=version)
+    assert conflict.value.current_version == version + 1
+    assert read_config(config_path)[0] == {'PROJECT_NAME': 'Other admin'}
+
+def test_failed_write_keeps_old_file(config_path):
+    write_config(config_path, {'PROJECT_NAME': 'First'})
+    with patch('app.config_io.json.dump', side_effect=OSError('Disk full')):
+        with pytest.raises(OSError):
+            write_config(config_path, {'PROJECT_NAME': 'Second'})
+
+    assert read_config(config_path) == ({'PROJECT_NAME': 'First'}, 1)
+    assert not [name for name in os.listdir(os.path.dirname(config_path)) if name.endswith('.tmp')]
+
+def test_writers_wait_for_the_lock(config_path):
+    write_config(config_path, {'count': 0})
+    writes = 20
+
+    def writer():
+        for _ in range(writes):
+            with config_lock(config_path):
+                pass  # Contend for the lock between saves
+            write_config(config_path, {'count': 1})
+
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every save was counted once and the file is always complete JSON
+    data, version = read_config(config_path)
+    assert data == {'count': 1}
+    assert version == 1 + 4 * writes
+    with open(config_path, 'r') as f:
+        json.load(f)
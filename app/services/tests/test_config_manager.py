@@ -0,0 +1,120 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import json
+import tempfile
+from flask import Flask, current_app
+from app.mod_config_manager import ConfigManager
+from app.config_io import write_config as save_config
+
+def write_config(path, data, bump=0):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    if bump:
+        # Make the change visible even on file systems with coarse mtimes
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 1000000000))
+
+@pytest.fixture
+def app():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app = Flask(__name__)
+        app.config.update({
+            'MOD_CONFIG_PATH': os.path.join(temp_dir, 'mod_config.cnf'),
+            'GUI_CONFIG_PATH': os.path.join(temp_dir, 'gui_config.cnf'),
+            'ROLE_CONFIG_PATH': os.path.join(temp_dir, 'role_config.cnf'),
+            'USER_CONFIG_PATH': os.path.join(temp_dir, 'user_config.cnf'),
+            'CONFIG_RELOAD_INTERVAL': 0.01
+        })
+        write_config(app.config['MOD_CONFIG_PATH'], [{'name': 'module1', 'enabled': True, 'order': 0}])
+        write_config(app.config['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'First'})
+        write_config(app.config['ROLE_CONFIG_PATH'], [{'name': 'User', 'modules': ['module1']}])
+        write_config(app.config['USER_CONFIG_PATH'], {'REQUIRE_LOGIN_FOR_SITE_ACCESS': False})
+
+        @app.route('/project')
+        def project():
+            return current_app.config['PROJECT_NAME']
+
+        ConfigManager().init_app(app)
+        yield app
+
+def test_initial_load(app):
+    assert app.config['PROJECT_NAME'] == 'First'
+    assert app.config['MODULE_LIST'] == [{'name': 'module1', 'blueprint': None, 'primary_route': None, 'routes': {},
+                                          'module_file': None, 'menu_name': None, 'enabled': True, 'order': 0}]
+    assert app.config['ROLE_LIST'][0]['name'] == 'User'
+    assert ConfigManager().get_module_config() == app.config['MODULE_LIST']
+
+def test_change_from_another_worker_is_picked_up(app):
+    client = app.test_client()
+    assert client.get('/project').data == b'First'
+    version = ConfigManager().version
+
+    # Another worker saves the GUI and role settings
+    write_config(app.config['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'Second'}, bump=1)
+    write_config(app.config['ROLE_CONFIG_PATH'], [{'name': 'Admin', 'modules': []}], bump=1)
+    ConfigManager().next_check = 0
+
+    assert client.get('/project').data == b'Second'
+    assert app.config['ROLE_LIST'] == [{'name': 'Admin', 'description': '', 'modules': []}]
+    assert ConfigManager().version == version + 1  # Both files land in one snapshot
+
+def test_snapshot_is_read_only(app):
+    snapshot = ConfigManager().snapshot
+    with pytest.raises(TypeError):
+        snapshot['PROJECT_NAME'] = 'Changed'
+    with pytest.raises(TypeError):
+        snapshot['MODULE_LIST'][0]['enabled'] = False
+
+    # app.config gets its own copy, editing it in place does not touch the snapshot
+    app.config['MODULE_LIST'][0]['enabled'] = False
+    assert snapshot['MODULE_LIST'][0]['enabled'] is True
+
+def test_invalid_file_keeps_current_settings(app):
+    manager = ConfigManager()
+    with open(app.config['GUI_CONFIG_PATH'], 'w') as f:
+        f.write('{"PROJECT_NAME": "Trunc')
+    os.utime(app.config['GUI_CONFIG_PATH'], (1, 1))
+
+    assert not manager.load_config()
+    assert app.config['PROJECT_NAME'] == 'First'
+
+    write_config(app.config['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'Fixed'})
+    assert manager.load_config()
+    assert app.config['PROJECT_NAME'] == 'Fixed'
+
+def test_unchanged_files_are_not_reloaded(app):
+    manager = ConfigManager()
+    version = manager.version
+    assert not manager.load_config()
+    assert manager.version == version
+    assert manager.reload_config()  # Forced reload reads every file again
+    assert manager.version == version + 1
+
+def test_snapshot_carries_the_version_of_the_settings(app):
+    manager = ConfigManager()
+    assert manager.get_config_version('GUI_CONFIG_PATH') == 0
+
+    # Another worker saves the GUI settings; the data and its version are read together
+    version = save_config(app.config['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'Second'})
+    stat = os.stat(app.config['GUI_CONFIG_PATH'])
+    os.utime(app.config['GUI_CONFIG_PATH'], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert manager.load_config()
+    assert app.config['PROJECT_NAME'] == 'Second'
+    assert manager.get_config_version('GUI_CONFIG_PATH') == version == 1
+    assert manager.get_config_version('ROLE_CONFIG_PATH') == 0
@@ -0,0 +1,128 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import json
+import tempfile
+from app.config_store import load_config_store, get_config_store, ConfigValidationError, RoleConfig
+
+@pytest.fixture
+def paths():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield {key: os.path.join(temp_dir, name) for key, name in [
+            ('MOD_CONFIG_PATH', 'mod_config.cnf'),
+            ('GUI_CONFIG_PATH', 'gui_config.cnf'),
+            ('ROLE_CONFIG_PATH', 'role_config.cnf'),
+            ('USER_CONFIG_PATH', 'user_config.cnf'),
+        ]}
+
+def write_config(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+def test_typed_load(paths):
+    write_config(paths['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'Test Project', 'BODY_COLOR': '#eeeeee'})
+    write_config(paths['ROLE_CONFIG_PATH'], [{'name': 'User', 'description': 'Users', 'modules': ['module1']}])
+    write_config(paths['USER_CONFIG_PATH'], {'DISABLE_SELF_REGISTRATION': True})
+    write_config(paths['MOD_CONFIG_PATH'], [{'name': 'module1', 'blueprint': 'mod1', 'routes': {'/': 'index'}, 'enabled': True}])
+
+    store = load_config_store(paths)
+    assert store.gui.PROJECT_NAME == 'Test Project'
+    assert store.gui.PROJECT_NAME_COLOR == '#000000'  # Default for a key missing from the file
+    assert store.access.DISABLE_SELF_REGISTRATION is True
+    assert store.roles[0].modules == ('module1',)
+    assert store.modules[0].routes['/'] == 'index'
+    assert store['PROJECT_NAME'] == 'Test Project'
+    assert store['ROLE_LIST'][0]['name'] == 'User'
+    assert set(store.signatures) == set(paths)
+
+def test_missing_files_use_defaults(paths):
+    write_config(paths['MOD_CONFIG_PATH'], {'module1': True})  # Old format is ignored
+    store = load_config_store(paths)
+    assert store.gui.PROJECT_NAME == 'Flask Modular Template'
+    assert store.access.REQUIRE_LOGIN_FOR_SITE_ACCESS is False
+    assert store.roles == () and store.modules == ()
+    assert list(store.signatures) == ['MOD_CONFIG_PATH']
+
+@pytest.mark.parametrize('path_key, data, message', [
+    ('ROLE_CONFIG_PATH', [{'modules': []}], "'name' is required"),
+    ('ROLE_CONFIG_PATH', [{'name': 42}], "'name' must be str"),
+    ('ROLE_CONFIG_PATH', [{'name': 'User'}, {'name': 'User'}], "role names must be unique"),
+    ('GUI_CONFIG_PATH', ['PROJECT_NAME'], "expected an object"),
+])
+def test_invalid_files_are_rejected(paths, path_key, data, message):
+    write_config(paths[path_key], data)
+    with pytest.raises(ConfigValidationError) as error:
+        load_config_store(paths)
+    assert message in str(error.value)
+    assert os.path.basename(paths[path_key]) in str(error.value)
+
+@pytest.mark.parametrize('path_key, data, key, message', [
+    ('GUI_CONFIG_PATH', {'PROJECT_NAME': 42}, 'PROJECT_NAME', "'PROJECT_NAME' must be str"),
+    ('USER_CONFIG_PATH', {'ENABLE_EULA': 'yes'}, 'ENABLE_EULA', "'ENABLE_EULA' must be bool"),
+    ('MOD_CONFIG_PATH', [{'name': 'module1', 'order': True}], 'MODULE_LIST', "'order' must be int"),
+])
+def test_wrong_types_use_the_default(paths, caplog, path_key, data, key, message):
+    write_config(paths[path_key], data)
+    defaults = load_config_store({}).as_config()
+    defaults['MODULE_LIST'] = [{'name': 'module1', 'blueprint': None, 'primary_route': None, 'routes': {},
+                                'module_file': None, 'menu_name': None, 'enabled': False, 'order': 0}]
+
+    assert load_config_store(paths).as_config()[key] == defaults[key]
+    assert message in caplog.text
+    assert os.path.basename(paths[path_key]) in caplog.text
+
+def test_unknown_keys_are_kept(paths):
+    write_config(paths['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'Test Project', 'FOOTER_TEXT': 'Hello'})
+    write_config(paths['ROLE_CONFIG_PATH'], [{'name': 'User', 'modules': [], 'color': ['red']}])
+    store = load_config_store(paths)
+
+    assert store['FOOTER_TEXT'] == 'Hello'
+    assert store.roles[0]['color'] == ('red',)
+    config = store.as_config()
+    assert config['FOOTER_TEXT'] == 'Hello'
+    assert config['ROLE_LIST'] == [{'name': 'User', 'description': '', 'modules': [], 'color': ['red']}]
+
+def test_store_is_read_only(paths):
+    write_config(paths['ROLE_CONFIG_PATH'], [{'name': 'User', 'modules': ['module1']}])
+    store = load_config_store(paths)
+    role = store.roles[0]
+    with pytest.raises(AttributeError):
+        role.name = 'Admin'
+    with pytest.raises(AttributeError):
+        store.roles = ()
+    with pytest.raises(TypeError):
+        store['ROLE_LIST'][0]['modules'] = []
+    assert role == RoleConfig(name='User', description='', modules=('module1',))
+
+def test_as_config_gives_plain_copies(paths):
+    write_config(paths['MOD_CONFIG_PATH'], [{'name': 'module1', 'routes': {'/': 'index'}, 'enabled': True}])
+    store = load_config_store(paths)
+
+    config = store.as_config()
+    config['MODULE_LIST'][0]['enabled'] = False
+    config['MODULE_LIST'][0]['routes']['/other'] = 'other'
+    assert store.modules[0].enabled is True
+    assert dict(store.modules[0].routes) == {'/': 'index'}
+    assert store.as_config(['gui']) == {key: store.gui[key] for key in store.gui.keys()}
+
+def test_files_are_read_once_per_process(paths):
+    write_config(paths['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'First'})
+    store = get_config_store(paths)
+    write_config(paths['GUI_CONFIG_PATH'], {'PROJECT_NAME': 'Second'})
+    assert get_config_store(paths) is store
+    assert store.replace(gui=load_config_store(paths).gui).gui.PROJECT_NAME == 'Second'
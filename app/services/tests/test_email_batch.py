@@ -0,0 +1,159 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import time
+import smtplib
+import tempfile
+from flask import Flask
+from unittest.mock import patch, MagicMock
+from app.services.auth_service_db import setup_database, init_db, add_user, count_users, iter_user_chunks
+from app.services.email_service import EmailService
+from app.services.email_pool import close_all_pools, get_smtp_pool
+from app.services.email_batch import create_announcement, run_announcement
+from app.services.job_service import create_job, load_job, update_job, start_job, list_jobs, is_job_interrupted
+
+@pytest.fixture(autouse=True)
+def reset_smtp_pools():
+    close_all_pools()
+    yield
+    close_all_pools()
+
+@pytest.fixture
+def config():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield {
+            'EMAIL_FROM_ADDRESS': 'test@example.com',
+            'SMTP_SERVER': 'smtp.example.com',
+            'SMTP_PORT': 587,
+            'SMTP_USERNAME': 'test_user',
+            'SMTP_PASSWORD': 'test_password',
+            'EMAIL_FAIL_DIRECTORY': os.path.join(temp_dir, 'email'),
+            'JOB_DIRECTORY': os.path.join(temp_dir, 'jobs'),
+            'EMAIL_BATCH_RATE': 0,
+            'EMAIL_BATCH_CHUNK_SIZE': 3
+        }
+
+@pytest.fixture
+def mock_smtp():
+    with patch('smtplib.SMTP') as mock_smtp:
+        mock_smtp.return_value = MagicMock()
+        yield mock_smtp
+
+@pytest.fixture
+def users():
+    setup_database({'USER_DATABASE_PATH': ':memory:'})
+    init_db()
+    for i in range(8):
+        add_user(f"user{i:02d}", f"user{i}", f"user{i}@example.com", 'password', is_active=True, user_role='User')
+    add_user('inactive', 'inactive', 'inactive@example.com', 'password')
+    add_user('admin', 'admin', 'admin@example.com', 'password', is_active=True, user_role='Admin')
+
+def recipients(count):
+    return [(i, f"user{i}@example.com") for i in range(count)]
+
+def test_send_batch_reuses_one_connection(config, mock_smtp):
+    progress = []
+    result = EmailService(config).send_batch(recipients(5), 'News', 'Body', on_progress=lambda r: progress.append(r.last_key), progress_every=2)
+
+    assert result.sent == 5 and result.failed == 0
+    assert result.last_key == 4
+    assert mock_smtp.call_count == 1  # One connection for the whole batch
+    assert mock_smtp.return_value.login.call_count == 1
+    assert [call[0][1] for call in mock_smtp.return_value.sendmail.call_args_list] == [[f"user{i}@example.com"] for i in range(5)]
+    assert progress == [1, 3, 4]
+
+def test_send_batch_is_rate_limited(config, mock_smtp):
+    started = time.monotonic()
+    result = EmailService(config).send_batch(recipients(4), 'News', 'Body', rate=20)
+    assert result.sent == 4
+    assert time.monotonic() - started >= 0.14  # Three gaps of 1/20 second
+
+def test_send_batch_reconnects_and_saves_temporary_failures(config, mock_smtp):
+    mock_smtp.return_value.sendmail.side_effect = [
+        {},
+        smtplib.SMTPServerDisconnected('Connection lost'),
+        {},
+        smtplib.SMTPRecipientsRefused({'user2@example.com': (550, b'No such user')}),
+        smtplib.SMTPResponseException(451, b'Try again later'),
+    ]
+    result = EmailService(config).send_batch(recipients(4), 'News', 'Body')
+
+    assert result.sent == 2 and result.failed == 2
+    assert mock_smtp.call_count == 2  # Reconnected once
+    saved = [f for f in os.listdir(config['EMAIL_FAIL_DIRECTORY']) if f.endswith('.eml')]
+    assert len(saved) == 1  # Only the temporary rejection is kept for the resender
+
+def test_send_batch_discards_connection_after_unexpected_error(config, mock_smtp):
+    mock_smtp.return_value.sendmail.side_effect = [{}, UnicodeEncodeError('ascii', 'ü', 0, 1, 'not ascii')]
+    with pytest.raises(UnicodeEncodeError):
+        EmailService(config).send_batch(recipients(3), 'News', 'Body')
+
+    # The connection was mid-command, so it is closed instead of going back to the pool
+    assert get_smtp_pool(config).stats()['idle'] == 0
+    mock_smtp.return_value.quit.assert_called()
+
+    mock_smtp.return_value.sendmail.side_effect = None
+    EmailService(config).send_batch(recipients(1), 'News', 'Body')
+    assert get_smtp_pool(config).stats()['idle'] == 1
+
+def test_iter_user_chunks_pages_by_id(users):
+    chunks = list(iter_user_chunks(chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3]
+    ids = [row.id for chunk in chunks for row in chunk]
+    assert ids == sorted(ids) and 'inactive' not in ids
+
+    assert [row.id for chunk in iter_user_chunks(after_id='user05', chunk_size=3) for row in chunk] == ['user06', 'user07']
+    assert [row.id for chunk in iter_user_chunks(role='Admin') for row in chunk] == ['admin']
+    assert count_users() == 9
+    assert count_users(role='User') == 8
+
+def test_job_progress_and_interruption(config):
+    job_dir = config['JOB_DIRECTORY']
+    job = create_job(job_dir, 'test', {'value': 1}, total=10)
+    start_job(job_dir, job)
+    update_job(job_dir, job, checkpoint='user03', done=4)
+
+    loaded = load_job(job_dir, job['id'])
+    assert loaded['checkpoint'] == 'user03' and loaded['progress']['done'] == 4
+    assert not is_job_interrupted(loaded)
+    loaded['updated'] -= 600  # No progress reported for ten minutes
+    assert is_job_interrupted(loaded)
+
+    assert [j['id'] for j in list_jobs(job_dir, 'test')] == [job['id']]
+    assert load_job(job_dir, '../etc/passwd') is None
+
+def test_announcement_resumes_after_checkpoint(config, mock_smtp, users):
+    app = Flask(__name__)
+    app.config.update(config)
+    with app.app_context():
+        job = create_announcement(app.config, 'News', 'Body', role='User')
+    assert job['progress']['total'] == 8
+
+    # The first run stopped (server restart) after five users
+    job_dir = config['JOB_DIRECTORY']
+    start_job(job_dir, job)
+    update_job(job_dir, job, checkpoint='user04', done=5)
+
+    run_announcement(app, job['id'])
+
+    sent_to = [call[0][1][0] for call in mock_smtp.return_value.sendmail.call_args_list]
+    assert sent_to == ['user5@example.com', 'user6@example.com', 'user7@example.com']
+    job = load_job(job_dir, job['id'])
+    assert job['status'] == 'completed'
+    assert job['checkpoint'] == 'user07'
+    assert job['progress']['done'] == 8
@@ -0,0 +1,130 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import time
+import smtplib
+import tempfile
+from unittest.mock import patch, MagicMock
+from app.services import email_queue as email_queue_module
+from app.services.email_queue import EmailQueue, queue_email
+from app.services.email_pool import close_all_pools
+
+@pytest.fixture(autouse=True)
+def reset_smtp_pools():
+    close_all_pools()
+    yield
+    close_all_pools()
+
+@pytest.fixture
+def config():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield {
+            'EMAIL_FROM_ADDRESS': 'test@example.com',
+            'SMTP_SERVER': 'smtp.example.com',
+            'SMTP_PORT': 587,
+            'SMTP_USERNAME': 'test_user',
+            'SMTP_PASSWORD': 'test_password',
+            'EMAIL_FAIL_DIRECTORY': temp_dir,
+            'EMAIL_QUEUE_MAX_ATTEMPTS': 3,
+            'EMAIL_QUEUE_RETRY_BASE': 10
+        }
+
+@pytest.fixture
+def mock_smtp():
+    with patch('smtplib.SMTP') as mock_smtp:
+        mock_smtp.return_value = MagicMock()
+        yield mock_smtp.return_value
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_enqueue_is_sent_by_background_worker(config, mock_smtp):
+    email_queue = EmailQueue(config)
+    email_queue.start()
+    try:
+        result = email_queue.enqueue(['recipient@example.com'], 'Queued Subject', 'Body', cc=['cc@example.com'])
+        assert result.success
+
+        assert wait_for(lambda: email_queue.get_stats()['sent'] == 1)
+        from_addr, recipients, message = mock_smtp.sendmail.call_args[0]
+        assert from_addr == 'test@example.com'
+        assert recipients == ['recipient@example.com', 'cc@example.com']
+        assert 'Subject: Queued Subject' in message
+
+        stats = email_queue.get_stats()
+        assert stats['pending'] == 0 and stats['processing'] == 0
+        assert os.listdir(email_queue.messages_dir) == []
+    finally:
+        email_queue.stop()
+
+def test_transient_failure_retries_with_backoff(config, mock_smtp):
+    mock_smtp.sendmail.side_effect = [smtplib.SMTPResponseException(451, b'Try again later'), {}]
+    email_queue = EmailQueue(config)  # Not started, the test drives the queue by hand
+    email_queue.enqueue(['recipient@example.com'], 'Retry', 'Body')
+
+    now = time.time()
+    assert email_queue.process_one(now)
+    stats = email_queue.get_stats()
+    assert stats['retried'] == 1 and stats['pending'] == 1
+    assert 8 <= stats['next_due'] - now <= 12  # First retry after ~EMAIL_QUEUE_RETRY_BASE seconds
+
+    assert not email_queue.process_one(now + 1)  # Not due yet
+    assert email_queue.process_one(now + 60)
+    assert email_queue.get_stats()['sent'] == 1
+
+def test_permanent_failure_moves_to_dead_letters(config, mock_smtp):
+    mock_smtp.sendmail.side_effect = smtplib.SMTPRecipientsRefused({'bad@example.com': (550, b'No such user')})
+    email_queue = EmailQueue(config)
+    email_queue.enqueue(['bad@example.com'], 'Bounce', 'Body')
+
+    assert email_queue.process_one(time.time())
+    dead = [f for f in os.listdir(os.path.join(config['EMAIL_FAIL_DIRECTORY'], 'dead')) if f.endswith('.eml')]
+    assert len(dead) == 1 and dead[0].startswith('failed_')
+    assert email_queue.get_stats()['failed'] == 1
+    assert email_queue.get_stats()['pending'] == 0
+
+def test_exhausted_retries_move_to_resend_spool(config, mock_smtp):
+    mock_smtp.sendmail.side_effect = smtplib.SMTPResponseException(451, b'Try again later')
+    email_queue = EmailQueue(config)
+    email_queue.enqueue(['recipient@example.com'], 'Exhausted', 'Body')
+
+    now = time.time()
+    for attempt in range(3):
+        assert email_queue.process_one(now + attempt * 1000)
+    failed = [f for f in os.listdir(config['EMAIL_FAIL_DIRECTORY']) if f.endswith('.eml')]
+    assert len(failed) == 1 and failed[0].startswith('failed_')
+
+def test_message_is_claimed_once_across_queues(config, mock_smtp):
+    first = EmailQueue(config)
+    second = EmailQueue(config)  # e.g. another worker process sharing the spool
+    first.enqueue(['recipient@example.com'], 'Once', 'Body')
+
+    meta = first.claim_next()
+    assert meta['subject'] == 'Once'
+    assert second.claim_next() is None
+
+def test_queue_email_sends_synchronously_without_queue(config):
+    with patch.object(email_queue_module, '_email_queue', None):
+        with patch('app.services.email_queue.EmailService.send_email') as mock_send_email:
+            queue_email(config, ['recipient@example.com'], 'Direct', 'Body', html=True)
+            mock_send_email.assert_called_once()
@@ -16,10 +16,28 @@ sys.path.insert(0, project_path)
 # Begin Test Code
 #----------------------------------------------------------------------------
 import pytest
+import smtplib
+import socket
+import threading
+import time
+import email
 from app.services.email_service import EmailService
+from app.services.email_pool import SMTPConnectionPool, SMTPPoolTimeout, get_smtp_pool, new_smtp_pool, get_pool_stats, close_all_pools
+from app.services.email_resender import FailedEmailResender, blueprint as email_blueprint
+from app.services.email_stream import StreamingMessage, sendmail_stream
+from email.mime.text import MIMEText
+from flask import Flask
+import json
 from unittest.mock import patch, MagicMock
 import tempfile
 
+@pytest.fixture(autouse=True)
+def reset_smtp_pools():
+    # Pooled connections outlive a test, so every test starts with an empty pool
+    close_all_pools()
+    yield
+    close_all_pools()
+
 @pytest.fixture(scope="function")
 def email_service():
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -82,6 +100,9 @@ def test_check_and_resend_failed_emails(mock_smtp, email_service):
     # Reset the mock before calling check_and_resend_failed_emails
     mock_smtp_instance.sendmail.reset_mock()
 
+    # One resend worker, so the messages are sent in file order
+    email_service.config['EMAIL_RESEND_WORKERS'] = 1
+
     email_service.check_and_resend_failed_emails()
 
     assert mock_smtp_instance.sendmail.call_count == 2
@@ -162,4 +183,274 @@ def test_send_html_email(mock_smtp, email_service):
     mock_smtp_instance.sendmail.assert_called_once()
     call_args = mock_smtp_instance.sendmail.call_args[0]
     assert 'Content-Type: text/html' in call_args[2]
-    assert html_content in call_args[2]
\ No newline at end of file
+    assert html_content in call_args[2]
+
+# Connection Pool Tests
+
+@patch('smtplib.SMTP')
+def test_pool_reuses_connection_across_services(mock_smtp, email_service):
+    mock_smtp_instance = MagicMock()
+    mock_smtp.return_value = mock_smtp_instance
+
+    email_service.send_email(to=['one@example.com'], subject='First', body='Body')
+    EmailService(email_service.config).send_email(to=['two@example.com'], subject='Second', body='Body')
+
+    mock_smtp.assert_called_once_with('smtp.example.com', 587, timeout=30)
+    mock_smtp_instance.starttls.assert_called_once()
+    mock_smtp_instance.login.assert_called_once_with('test_user', 'test_password')
+    assert mock_smtp_instance.sendmail.call_count == 2
+    assert get_smtp_pool(email_service.config).stats()['idle'] == 1
+
+@patch('smtplib.SMTP')
+def test_own_pool_is_not_registered(mock_smtp, email_service):
+    # As the Admin Setup test email: trial settings on a pool closed after the send
+    mock_smtp_instance = MagicMock()
+    mock_smtp.return_value = mock_smtp_instance
+
+    pool = new_smtp_pool(email_service.config, max_size=1)
+    try:
+        assert EmailService(email_service.config, pool=pool).send_email(to=['one@example.com'], subject='Test', body='Body').success
+    finally:
+        pool.close()
+
+    assert get_pool_stats() == []
+    mock_smtp_instance.quit.assert_called_once()
+
+@patch('smtplib.SMTP')
+def test_pool_reconnects_after_server_disconnect(mock_smtp, email_service):
+    stale, fresh = MagicMock(), MagicMock()
+    stale.sendmail.side_effect = smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+    mock_smtp.side_effect = [stale, fresh]
+
+    result = email_service.send_email(to=['recipient@example.com'], subject='Test', body='Body')
+
+    assert result.success
+    fresh.sendmail.assert_called_once()
+    stale.quit.assert_called_once()  # Dropped from the pool
+
+@patch('smtplib.SMTP')
+def test_pool_health_check_and_idle_close(mock_smtp):
+    first, second = MagicMock(), MagicMock()
+    first.noop.return_value = (421, b'Timeout')
+    mock_smtp.side_effect = [first, second]
+    pool = SMTPConnectionPool('smtp.example.com', 587, check_interval=0, idle_timeout=60)
+
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is second  # Failed NOOP, so a new connection was opened
+    first.quit.assert_called_once()
+
+    pool.release(second)
+    pool.idle_timeout = 0
+    pool.close_idle()
+    assert pool.stats()['idle'] == 0
+    second.quit.assert_called_once()
+
+@patch('smtplib.SMTP')
+def test_pool_limits_open_connections(mock_smtp):
+    mock_smtp.side_effect = lambda *args, **kwargs: MagicMock()
+    pool = SMTPConnectionPool('smtp.example.com', 25, use_tls=False, max_size=1)
+
+    conn = pool.acquire()
+    with pytest.raises(SMTPPoolTimeout):
+        pool.acquire(timeout=0.05)
+
+    threading.Timer(0.05, pool.release, args=(conn,)).start()
+    assert pool.acquire(timeout=5) is conn
+    assert mock_smtp.call_count == 1
+    conn.starttls.assert_not_called()
+    conn.login.assert_not_called()
+
+def test_pool_with_local_smtp_server(email_service):
+    aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+    from aiosmtpd.handlers import Sink
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    controller = aiosmtpd_controller.Controller(Sink(), hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        config = dict(email_service.config, SMTP_SERVER='127.0.0.1', SMTP_PORT=port, SMTP_USERNAME='', SMTP_USE_TLS=False)
+        service = EmailService(config)
+        for i in range(3):
+            assert service.send_email(to=['recipient@example.com'], subject=f'Test {i}', body='Body').success
+        assert get_smtp_pool(config).stats() == {'server': '127.0.0.1', 'port': port, 'idle': 1, 'in_use': 0, 'max_size': 4}
+    finally:
+        close_all_pools()
+        controller.stop()
+
+# Streaming Attachment Tests
+
+class RecordingSMTP(smtplib.SMTP):
+    # No socket: records what would be written and answers every command with success
+    def __init__(self):
+        super().__init__()
+        self.ehlo_resp = b'test'
+        self.esmtp_features = {}
+        self.written = b''
+        self.last_command = b''
+
+    def send(self, s):
+        data = s.encode('ascii') if isinstance(s, str) else s
+        self.written += data
+        self.last_command = data[:4].lower()
+
+    def getreply(self):
+        return (354, b'Go ahead') if self.last_command == b'data' else (250, b'OK')
+
+    def starttls(self):
+        return (220, b'Ready')
+
+    def login(self, user, password):
+        return (235, b'Accepted')
+
+def make_attachment(directory, size):
+    path = os.path.join(directory, 'large.bin')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return path
+
+def test_streamed_message_matches_attachment(email_service):
+    attachment = make_attachment(email_service.config['EMAIL_FAIL_DIRECTORY'], 200000)
+    msg = StreamingMessage(email_service.build_message(['recipient@example.com'], 'Large', 'Body\n.hidden line'), [attachment])
+
+    conn = RecordingSMTP()
+    sendmail_stream(conn, 'test@example.com', ['recipient@example.com'], msg.iter_bytes())
+    data = conn.written.split(b'data\r\n', 1)[1]
+    assert data.endswith(b'\r\n.\r\n')
+    assert b'\r\n..hidden line' in data  # Leading period escaped for SMTP
+
+    received = email.message_from_bytes(data[:-3].replace(b'\r\n..', b'\r\n.'))
+    body, part = received.get_payload()
+    assert body.get_payload().replace('\r\n', '\n') == 'Body\n.hidden line'
+    assert part.get_filename() == 'large.bin'
+    with open(attachment, 'rb') as f:
+        assert part.get_payload(decode=True) == f.read()
+
+@patch('smtplib.SMTP')
+def test_send_email_streams_large_attachments(mock_smtp, email_service):
+    conn = RecordingSMTP()
+    mock_smtp.return_value = conn
+    email_service.config['EMAIL_STREAMING_THRESHOLD'] = 1000
+    attachment = make_attachment(email_service.config['EMAIL_FAIL_DIRECTORY'], 5000)
+
+    with patch.object(conn, 'sendmail') as mock_sendmail:
+        assert email_service.send_email(to=['recipient@example.com'], subject='Large', body='Body', attachments=[attachment]).success
+        mock_sendmail.assert_not_called()
+    assert b'Content-Disposition: attachment; filename="large.bin"' in conn.written
+
+@patch('smtplib.SMTP')
+def test_streamed_failure_is_spooled_from_disk(mock_smtp, email_service):
+    mock_smtp.return_value = RecordingSMTP()
+    mock_smtp.return_value.rcpt = MagicMock(return_value=(451, b'Try again later'))
+    email_service.config['EMAIL_STREAMING_THRESHOLD'] = 1000
+    attachment = make_attachment(email_service.config['EMAIL_FAIL_DIRECTORY'], 5000)
+
+    with Flask(__name__).app_context():
+        assert not email_service.send_email(to=['recipient@example.com'], subject='Large', body='Body', attachments=[attachment]).success
+
+    fail_dir = email_service.config['EMAIL_FAIL_DIRECTORY']
+    failed = [f for f in os.listdir(fail_dir) if f.endswith('.eml')]
+    assert len(failed) == 1
+    with open(os.path.join(fail_dir, failed[0]), 'rb') as f:
+        part = email.message_from_bytes(f.read()).get_payload()[1]
+    with open(attachment, 'rb') as f:
+        assert part.get_payload(decode=True) == f.read()
+
+@pytest.mark.parametrize('error', [
+    smtplib.SMTPRecipientsRefused({'recipient@example.com': (550, b'No such user')}),
+    smtplib.SMTPResponseException(452, b'Too many recipients'),
+    smtplib.SMTPNotSupportedError('SMTPUTF8 not supported'),
+])
+@patch('smtplib.SMTP')
+def test_rejected_message_is_saved(mock_smtp, email_service, error):
+    # SMTP errors are OSErrors too, but a rejected message must not be reported as a connection failure
+    mock_smtp.return_value = MagicMock()
+    mock_smtp.return_value.sendmail.side_effect = error
+
+    with Flask(__name__).app_context():
+        result = email_service.send_email(to=['recipient@example.com'], subject='Rejected', body='Body')
+    assert result.message == 'Failed to send email due to SMTP error'
+    assert len(os.listdir(email_service.config['EMAIL_FAIL_DIRECTORY'])) == 1
+
+@pytest.mark.parametrize('error', [ConnectionRefusedError('refused'), socket.timeout('timed out'), smtplib.SMTPServerDisconnected('closed')])
+@patch('smtplib.SMTP')
+def test_connection_error_is_reported(mock_smtp, email_service, error):
+    mock_smtp.side_effect = error
+
+    with Flask(__name__).app_context():
+        result = email_service.send_email(to=['recipient@example.com'], subject='Offline', body='Body')
+    assert result.message == 'Failed to connect to SMTP server'
+
+# Failed Email Resender Tests
+
+def write_failed_email(fail_dir, name, to):
+    with open(os.path.join(fail_dir, name), 'w') as f:
+        f.write(f'To: {to}\nBcc: hidden@example.com\nSubject: Resend\n\nBody')
+
+def test_save_failed_email_names_are_unique(email_service):
+    with patch('app.services.email_service.datetime'):  # Same timestamp for the whole burst
+        for _ in range(3):
+            email_service.save_failed_email(MIMEText('Body'))
+    failed_emails = [f for f in os.listdir(email_service.config['EMAIL_FAIL_DIRECTORY']) if f.endswith('.eml')]
+    assert len(set(failed_emails)) == 3
+
+@patch('smtplib.SMTP')
+def test_resend_failure_schedules_backoff_then_dead_letter(mock_smtp, email_service):
+    mock_smtp.return_value.sendmail.side_effect = smtplib.SMTPResponseException(451, b'Try again later')
+    fail_dir = email_service.config['EMAIL_FAIL_DIRECTORY']
+    write_failed_email(fail_dir, 'failed_legacy.eml', 'recipient@example.com')
+    resender = FailedEmailResender(dict(email_service.config, EMAIL_RESEND_MAX_ATTEMPTS=2, EMAIL_RESEND_RETRY_BASE=60))
+
+    assert resender.run_once()['retried'] == 1
+    with open(os.path.join(fail_dir, 'meta', 'failed_legacy.eml.json')) as f:
+        meta = json.load(f)
+    assert meta['attempts'] == 1 and meta['next_attempt'] > time.time() + 40
+    assert resender.run_once()['due'] == 0  # Waiting for the retry time
+
+    assert resender.run_once(ignore_schedule=True)['dead'] == 1
+    assert sorted(os.listdir(os.path.join(fail_dir, 'dead'))) == ['failed_legacy.eml', 'failed_legacy.eml.json']
+    assert resender.get_stats() == {'waiting': 0, 'dead': 1}
+
+    assert resender.requeue_dead() == 1
+    assert resender.get_stats() == {'waiting': 1, 'dead': 0}
+
+@patch('smtplib.SMTP')
+def test_concurrent_resenders_send_each_email_once(mock_smtp, email_service):
+    mock_smtp.side_effect = lambda *args, **kwargs: MagicMock()
+    fail_dir = email_service.config['EMAIL_FAIL_DIRECTORY']
+    for i in range(20):
+        write_failed_email(fail_dir, f'failed_{i:02d}.eml', f'user{i}@example.com')
+
+    config = dict(email_service.config, EMAIL_RESEND_RATE=0)
+    sent = []
+    real_sendmail = SMTPConnectionPool.sendmail
+    def record_sendmail(pool, from_addr, to_addrs, msg):
+        assert 'Bcc' not in msg
+        sent.extend(a for a in to_addrs if a != 'hidden@example.com')
+        return real_sendmail(pool, from_addr, to_addrs, msg)
+
+    with patch.object(SMTPConnectionPool, 'sendmail', record_sendmail):
+        runs = [threading.Thread(target=FailedEmailResender(config).run_once) for _ in range(3)]
+        for run in runs:
+            run.start()
+        for run in runs:
+            run.join()
+
+    assert sorted(sent) == sorted(f'user{i}@example.com' for i in range(20))
+    assert FailedEmailResender(config).get_stats()['waiting'] == 0
+
+@patch('smtplib.SMTP')
+def test_resend_cli_command(mock_smtp, email_service):
+    mock_smtp.return_value = MagicMock()
+    write_failed_email(email_service.config['EMAIL_FAIL_DIRECTORY'], 'failed_cli.eml', 'recipient@example.com')
+
+    app = Flask(__name__)
+    app.config.update(email_service.config)
+    app.register_blueprint(email_blueprint)
+    result = app.test_cli_runner().invoke(args=['email', 'resend', '--rate', '0'])
+
+    assert result.exit_code == 0
+    assert 'Sent: 1' in result.output
+    assert 'Waiting: 0' in result.output
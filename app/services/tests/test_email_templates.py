@@ -0,0 +1,81 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+from flask import Flask, render_template
+from jinja2 import DictLoader
+from app.services.email_service import EmailService
+from app.services.email_templates import render_email, get_email_template, init_email_templates, html_to_text
+
+TEMPLATE_FOLDER = os.path.join(project_path, 'app', 'services', 'auth_templates')
+
+@pytest.fixture
+def app():
+    app = Flask(__name__, template_folder=TEMPLATE_FOLDER)
+    app.config['PROJECT_NAME'] = 'Test Project'
+    return app
+
+@pytest.fixture
+def ctx(app):
+    with app.test_request_context():
+        yield app
+
+def test_precompiled_body_matches_jinja_render(ctx):
+    fields = {'username': 'Jane <Doe>', 'activation_link': 'https://example.com/activate/abc?x=1&y=2'}
+    for name in ['email/activation_email.html', 'email/forgot_password_email.html', 'email/new_user_activation_email.html']:
+        body, text = render_email(name, **fields)
+        assert body == render_template(name, **fields)
+        assert get_email_template(name).precompiled
+
+    assert 'Jane &lt;Doe&gt;' in body
+    assert 'Hello Jane <Doe>,' in text
+    assert '(https://example.com/activate/abc?x=1&y=2)' in text
+    assert '<' not in text.replace('<Doe>', '')
+
+def test_templates_are_compiled_once(ctx):
+    init_email_templates(ctx)
+    assert len(ctx.extensions['email_templates']) == 3
+
+    template = get_email_template('email/activation_email.html')
+    assert get_email_template('email/activation_email.html') is template
+
+    ctx.config['PROJECT_NAME'] = 'Renamed'
+    renamed = get_email_template('email/activation_email.html')
+    assert renamed is not template
+    assert 'Thanks for registering for Renamed' in render_email('email/activation_email.html', username='a', activation_link='b')[0]
+
+def test_filtered_fields_fall_back_to_jinja():
+    app = Flask(__name__)
+    app.config['PROJECT_NAME'] = 'Test Project'
+    app.jinja_loader = DictLoader({'email/shout.html': '<p>Hello {{ username|upper }}{% if link %} <a href="{{ link }}">go</a>{% endif %}</p>'})
+    with app.app_context():
+        template = get_email_template('email/shout.html')
+        assert not template.precompiled
+        body, text = render_email('email/shout.html', username='jane', link='https://example.com')
+    assert body == '<p>Hello JANE <a href="https://example.com">go</a></p>'
+    assert text == 'Hello JANE go (https://example.com)\n'
+
+def test_html_to_text():
+    body = '<html><head><title>Skip</title></head><body><p>One &amp; two</p><p>Line<br>break</p></body></html>'
+    assert html_to_text(body) == 'One & two\n\nLine\nbreak\n'
+
+def test_build_message_adds_plain_text_alternative():
+    msg = EmailService({'EMAIL_FROM_ADDRESS': 'test@example.com'}).build_message(
+        ['recipient@example.com'], 'Subject', '<p>Hello</p>', html=True, text='Hello\n')
+    alternative = msg.get_payload()[0]
+    assert alternative.get_content_type() == 'multipart/alternative'
+    assert [part.get_content_type() for part in alternative.get_payload()] == ['text/plain', 'text/html']
@@ -20,11 +20,14 @@ import pytest
 import logging
 import tempfile
 import shutil
+import threading
+import time
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 from freezegun import freeze_time
 from flask import Flask
-from app.services.log_service import init_logger, setup_logger, HeaderFileHandler, EmailHandler, RequestFormatter
+from app.services.log_service import init_logger, setup_logger, HeaderFileHandler, EmailHandler, RequestFormatter, JsonLinesFormatter
+from app.services.log_reader import parse_log_line
 
 def patch_get_current_date(frozen_datetime):
     return lambda self: frozen_datetime.date()
@@ -54,8 +57,7 @@ def app():
     # Cleanup
     for handler in app.logger.handlers[:]:
         app.logger.removeHandler(handler)
-        if isinstance(handler, logging.FileHandler):
-            handler.close()
+        handler.close()
     shutil.rmtree(temp_dir, ignore_errors=True)
 
 # Setup and Initialization Tests
@@ -105,6 +107,38 @@ def test_request_formatter_with_context(mock_get_user, app):
             formatted = formatter.format(record)
             assert 'http://localhost/test - 127.0.0.1 - 123 - test@example.com - Test message' in formatted
 
+def test_json_lines_formatter_keeps_tabs_and_newlines(app):
+    with app.app_context():
+        formatter = JsonLinesFormatter()
+        record = logging.LogRecord(
+            name='test', level=logging.ERROR, pathname='test.py', lineno=42,
+            msg='Line one\tcolumn\nline two', args=(), exc_info=None, func='test_func'
+        )
+        formatted = formatter.format(record)
+        assert '\n' not in formatted
+
+        entry = parse_log_line(formatted)
+        assert entry['message'] == 'Line one\tcolumn\nline two'
+        assert entry['level'] == 'ERROR'
+        assert entry['line'] == '42'
+        assert entry['function'] == 'test_func'
+        assert entry['user_email'] == 'N/A'
+
+def test_json_lines_log_file(app):
+    app.config['LOG_FILE_FORMAT'] = 'jsonl'
+    with app.app_context():
+        setup_logger(app)
+        file_handler = next(h for h in app.logger.handlers if isinstance(h, HeaderFileHandler))
+        app.logger.info("First\tentry")
+        app.logger.warning("Second entry")
+
+        with open(file_handler.baseFilename, 'r') as f:
+            lines = f.readlines()
+        assert len(lines) == 2  # No header line in JSON Lines mode
+        entries = [parse_log_line(line) for line in lines]
+        assert [e['message'] for e in entries] == ["First\tentry", "Second entry"]
+        assert [e['level'] for e in entries] == ['INFO', 'WARNING']
+
 # File Handling Tests
 
 def test_log_file_creation(app):
@@ -160,6 +194,9 @@ def test_log_levels(app):
 
 # Email Handler Tests
 
+def get_email_handler(app):
+    return next(h for h in app.logger.handlers if isinstance(h, EmailHandler))
+
 @patch('smtplib.SMTP')
 def test_email_handler_creation(mock_smtp, app):
     app.config['LOG_EMAIL_ENABLE'] = True
@@ -182,6 +219,7 @@ def test_email_error_log(mock_smtp, app):
         setup_logger(app)
         with patch.object(EmailHandler, 'send_email') as mock_send_email:
             app.logger.error("Test error message")
+            get_email_handler(app).flush()
             mock_send_email.assert_called_once()
 
 @patch('smtplib.SMTP')
@@ -194,12 +232,73 @@ def test_email_handler_log_levels(mock_smtp, app):
             app.logger.warning("This shouldn't trigger an email")
             app.logger.error("This should trigger an email")
             app.logger.critical("This should also trigger an email")
-            
+            get_email_handler(app).flush()
+
             assert mock_send_email.call_count == 2
             call_args = mock_send_email.call_args_list
             assert "This should trigger an email" in str(call_args[0])
             assert "This should also trigger an email" in str(call_args[1])
             
+def test_email_handler_sends_off_request_thread(app):
+    app.config['LOG_EMAIL_ENABLE'] = True
+    release = threading.Event()
+    with app.app_context():
+        setup_logger(app)
+        with patch.object(EmailHandler, 'send_email', side_effect=lambda subject, body: release.wait(5)) as mock_send_email:
+            started = time.monotonic()
+            app.logger.error("Slow relay")
+            assert time.monotonic() - started < 1  # emit() does not wait for SMTP
+            release.set()
+            get_email_handler(app).flush()
+            assert mock_send_email.call_args[0][1].startswith("Error log entry:")
+
+def test_email_handler_digest_deduplicates(app):
+    app.config.update({'LOG_EMAIL_ENABLE': True, 'LOG_EMAIL_DIGEST_INTERVAL': 60})
+    with app.app_context():
+        setup_logger(app)
+        with patch.object(EmailHandler, 'send_email') as mock_send_email:
+            for i in range(50):
+                app.logger.error("Database timeout for order %s", i)
+            app.logger.critical("Disk full")
+            mock_send_email.assert_not_called()  # Waiting for the digest interval
+
+            get_email_handler(app).flush()
+            mock_send_email.assert_called_once()
+            subject, body = mock_send_email.call_args[0]
+            assert subject == "Error Log Digest: 51 record(s), 2 unique"
+            assert "[ERROR] x50" in body
+            assert "[CRITICAL] x1" in body
+
+def test_email_handler_digest_max_records(app):
+    app.config.update({'LOG_EMAIL_ENABLE': True, 'LOG_EMAIL_DIGEST_INTERVAL': 60, 'LOG_EMAIL_DIGEST_MAX_RECORDS': 3})
+    with app.app_context():
+        setup_logger(app)
+        sent = threading.Event()
+        with patch.object(EmailHandler, 'send_email', side_effect=lambda subject, body: sent.set()) as mock_send_email:
+            for _ in range(3):
+                app.logger.error("Repeated failure")
+            assert sent.wait(5)  # Sent without waiting for the interval
+            assert "3 record(s)" in mock_send_email.call_args[0][0]
+
+def test_email_handler_rate_limit(app):
+    app.config.update({'LOG_EMAIL_ENABLE': True, 'LOG_EMAIL_RATE_LIMIT': 0, 'LOG_EMAIL_RATE_BURST': 2})
+    with app.app_context():
+        setup_logger(app)
+        handler = get_email_handler(app)
+        with patch.object(EmailHandler, 'send_email') as mock_send_email:
+            for i in range(5):
+                app.logger.error(f"Failure {i}")
+            handler.flush()
+            assert mock_send_email.call_count == 2
+            assert handler.suppressed == 3
+
+            # The next email that gets through reports the suppressed records
+            handler.rate_limiter.tokens = 1
+            app.logger.error("After the burst")
+            handler.flush()
+            assert "3 error log record(s) were suppressed" in mock_send_email.call_args[0][1]
+            assert handler.suppressed == 0
+
 # Comprehensive Test
 
 def test_comprehensive_log_handling(app):
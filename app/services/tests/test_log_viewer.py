@@ -0,0 +1,249 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import tempfile
+import shutil
+import gzip
+import subprocess
+from datetime import date
+from unittest.mock import patch
+from flask import Flask
+from app.services.log_reader import LogFollower, PollingWatcher, parse_log_line, get_log_filename, list_log_files
+from app.services.log_search import LogSearchCriteria, search_logs
+from app.services.log_stats import LogStatsCache
+from app.services import log_viewer, log_stats, log_search, process_pool
+
+HEADER = "Timestamp\tLog Level\tModule\tMessage\tUser ID\tUser Email\tRemote Address\tURL\tFunction\tLine\tFilename\n"
+
+def make_line(message, level='INFO', timestamp="2023-01-01 12:00:00,000"):
+    return f"{timestamp}\t{level}\tmodule\t{message}\tN/A\tN/A\tNone\tNone\tfunc\t10\tfile.py\n"
+
+@pytest.fixture
+def log_dir():
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+def write_log(log_dir, day, *lines, header=True):
+    path = os.path.join(log_dir, get_log_filename(day))
+    with open(path, 'a') as f:
+        if header and os.path.getsize(path) == 0:
+            f.write(HEADER)
+        for line in lines:
+            f.write(line)
+    return path
+
+# Parsing Tests
+
+def test_parse_log_line():
+    entry = parse_log_line(make_line("Hello", level='ERROR'))
+    assert entry['level'] == 'ERROR'
+    assert entry['message'] == 'Hello'
+    assert entry['line'] == '10'
+    assert parse_log_line("not\ta\tlog\tline") is None
+
+# Follower Tests
+
+def test_follower_only_reads_new_lines(log_dir):
+    today = date(2023, 1, 1)
+    write_log(log_dir, today, make_line("old entry"))
+
+    follower = LogFollower(log_dir, watcher=PollingWatcher(log_dir, 0.01), get_current_date=lambda: today)
+    follower.start()
+    assert follower.read_new_lines() == []
+
+    write_log(log_dir, today, make_line("new entry"))
+    lines = follower.read_new_lines()
+    assert len(lines) == 1
+    assert parse_log_line(lines[0])['message'] == 'new entry'
+
+def test_follower_holds_partial_lines(log_dir):
+    today = date(2023, 1, 1)
+    path = write_log(log_dir, today)
+
+    follower = LogFollower(log_dir, watcher=PollingWatcher(log_dir, 0.01), get_current_date=lambda: today)
+    follower.start()
+
+    line = make_line("split entry")
+    with open(path, 'a') as f:
+        f.write(line[:20])
+    assert follower.read_new_lines() == []
+
+    with open(path, 'a') as f:
+        f.write(line[20:])
+    assert parse_log_line(follower.read_new_lines()[0])['message'] == 'split entry'
+
+def test_follower_midnight_rollover(log_dir):
+    current = {'date': date(2023, 1, 1)}
+    write_log(log_dir, current['date'], make_line("day 1"))
+
+    follower = LogFollower(log_dir, watcher=PollingWatcher(log_dir, 0.01), get_current_date=lambda: current['date'])
+    follower.start()
+    write_log(log_dir, current['date'], make_line("day 1 late"))
+
+    # New day, but the handler has not created the new file yet
+    current['date'] = date(2023, 1, 2)
+    assert [parse_log_line(l)['message'] for l in follower.read_new_lines()] == ['day 1 late']
+    assert follower.check_rollover() == []
+
+    write_log(log_dir, current['date'], make_line("day 2"))
+    lines = follower.check_rollover()
+    assert [parse_log_line(l)['message'] for l in lines] == ['day 2']
+    assert follower.filename == get_log_filename(date(2023, 1, 2))
+
+def test_follow_generator_yields_batches_and_heartbeats(log_dir):
+    today = date(2023, 1, 1)
+    write_log(log_dir, today)
+
+    follower = LogFollower(log_dir, watcher=PollingWatcher(log_dir, 0.01), get_current_date=lambda: today)
+    stream = follower.follow(heartbeat=0.05)
+    write_log(log_dir, today, make_line("streamed"))
+
+    batch = next(stream)
+    assert batch == [] or parse_log_line(batch[0])['message'] == 'streamed'
+    assert next(stream) == []
+    stream.close()
+    assert follower.watcher is None
+
+def test_follower_resumes_from_position(log_dir):
+    today = date(2023, 1, 1)
+    path = write_log(log_dir, today, make_line("first"))
+    position = os.path.getsize(path)
+    write_log(log_dir, today, make_line("second"))
+
+    follower = LogFollower(log_dir, watcher=PollingWatcher(log_dir, 0.01), get_current_date=lambda: today)
+    follower.start(get_log_filename(today), position)
+    assert [parse_log_line(l)['message'] for l in follower.read_new_lines()] == ['second']
+
+# Search Tests
+
+@pytest.fixture
+def search_dir(log_dir):
+    for day in range(1, 5):
+        day_date = date(2023, 1, day)
+        write_log(log_dir, day_date,
+                  make_line(f"day {day} info", timestamp=f"2023-01-0{day} 08:00:00,000"),
+                  make_line(f"day {day} failure", level='ERROR', timestamp=f"2023-01-0{day} 09:00:00,000"))
+
+    # Archive the oldest day
+    oldest = os.path.join(log_dir, get_log_filename(date(2023, 1, 1)))
+    with open(oldest, 'rb') as src, gzip.open(oldest + '.gz', 'wb') as dst:
+        dst.write(src.read())
+    os.remove(oldest)
+    return log_dir
+
+def test_list_log_files_includes_archives(search_dir):
+    files = list_log_files(search_dir)
+    assert files[0] == ('2023-01-01', 'app_2023-01-01.log.gz')
+    assert len(files) == 4
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_search_logs_newest_first(search_dir, workers):
+    results = list(search_logs(search_dir, LogSearchCriteria(levels=['ERROR']), workers=workers))
+    assert [r['message'] for r in results] == ['day 4 failure', 'day 3 failure', 'day 2 failure', 'day 1 failure']
+    assert results[-1]['file'] == 'app_2023-01-01.log.gz'
+
+def test_search_logs_oldest_first_with_limit(search_dir):
+    results = list(search_logs(search_dir, LogSearchCriteria(query='DAY'), limit=3, newest_first=False, workers=2))
+    assert [r['message'] for r in results] == ['day 1 info', 'day 1 failure', 'day 2 info']
+
+def test_search_pool_does_not_fork_the_server(search_dir):
+    with patch.object(process_pool, 'ProcessPoolExecutor', wraps=process_pool.ProcessPoolExecutor) as pool:
+        list(search_logs(search_dir, LogSearchCriteria(levels=['ERROR']), workers=2))
+    assert pool.call_args[1]['mp_context'].get_start_method() != 'fork'
+
+def test_search_workers_do_not_create_the_app(search_dir):
+    # As with "python run_local.py": the workers import run_local.py again as __mp_main__
+    script = (f"import sys; sys.path.insert(0, {project_path!r}); sys.modules['__main__'].__file__ = {os.path.join(project_path, 'run_local.py')!r}\n"
+              f"from app.services.log_search import search_logs, LogSearchCriteria\n"
+              f"print(len(list(search_logs({search_dir!r}, LogSearchCriteria(levels=['ERROR']), workers=2))))")
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ, LOG_FILE_DIRECTORY=os.path.join(work_dir, 'logs'), USER_DATABASE_DIRECTORY=os.path.join(work_dir, 'users'),
+                   EMAIL_FAIL_DIRECTORY=os.path.join(work_dir, 'email'), JOB_DIRECTORY=os.path.join(work_dir, 'jobs'))
+        result = subprocess.run([sys.executable, '-c', script], cwd=work_dir, env=env, capture_output=True, text=True, timeout=120)
+        assert result.stdout.strip() == '4', result.stderr
+        assert not os.path.exists(os.path.join(work_dir, 'logs'))  # create_app never ran in a worker
+
+def test_search_logs_date_range(search_dir):
+    criteria = LogSearchCriteria(since='2023-01-02 08:30', until='2023-01-03')
+    results = list(search_logs(search_dir, criteria, newest_first=False, workers=1))
+    assert [r['message'] for r in results] == ['day 2 failure', 'day 3 info', 'day 3 failure']
+
+# Stats Tests
+
+def test_log_stats_rollups(search_dir):
+    stats = LogStatsCache(search_dir).get_stats(days=30)
+    totals = stats['totals']
+    assert [day['date'] for day in stats['days']] == ['2023-01-01', '2023-01-02', '2023-01-03', '2023-01-04']
+    assert totals['levels'] == {'INFO': 4, 'ERROR': 4}
+    assert totals['errors_by_hour'] == {'08': 0, '09': 4}
+    assert totals['top_functions'] == [{'name': 'file.py:func:10', 'count': 8}]
+
+    stats = LogStatsCache(search_dir).get_stats(days=2)
+    assert stats['totals']['total'] == 4
+
+@pytest.mark.parametrize('days', ['0', '-1'])
+def test_log_stats_days_is_at_least_one(search_dir, days):
+    app = Flask(__name__)
+    app.config.update({'LOG_FILE_DIRECTORY': search_dir})
+
+    with app.test_request_context(f'/log_stats?days={days}'):
+        with patch('flask_login.utils._get_user') as mock_get_user:
+            mock_get_user.return_value.is_authenticated = True
+            mock_get_user.return_value.is_admin = True
+
+            stats = log_viewer.log_stats().get_json()
+            assert [day['date'] for day in stats['days']] == ['2023-01-04']
+
+def test_log_stats_incremental_update(log_dir):
+    today = date(2023, 1, 1)
+    write_log(log_dir, today, make_line("first", level='ERROR'))
+    cache = LogStatsCache(log_dir)
+    assert cache.get_stats()['totals']['levels'] == {'ERROR': 1}
+
+    write_log(log_dir, today, make_line("second", level='WARNING'))
+    with patch('app.services.log_stats.scan_log_file', wraps=log_stats.scan_log_file) as scan:
+        assert cache.get_stats()['totals']['levels'] == {'ERROR': 1, 'WARNING': 1}
+        assert scan.call_args[0][2] > 0  # Resumed from the cached offset
+
+    # A fresh cache (another worker) reuses the rollup stored on disk
+    with patch('app.services.log_stats.scan_log_file') as scan:
+        assert LogStatsCache(log_dir).get_stats()['totals']['levels'] == {'ERROR': 1, 'WARNING': 1}
+        scan.assert_not_called()
+
+# Endpoint Tests
+
+def test_log_tail_subscriber_limit(log_dir):
+    app = Flask(__name__)
+    app.config.update({'LOG_FILE_DIRECTORY': log_dir, 'LOG_TAIL_MAX_SUBSCRIBERS': 1})
+
+    with app.test_request_context('/log_tail'):
+        with patch('flask_login.utils._get_user') as mock_get_user:
+            mock_get_user.return_value.is_authenticated = True
+            mock_get_user.return_value.is_admin = True
+
+            first = log_viewer.log_tail()
+            assert first.status_code == 200
+
+            response, status = log_viewer.log_tail()
+            assert status == 503
+
+            first.close()
+            second = log_viewer.log_tail()
+            assert second.status_code == 200
+            second.close()
@@ -0,0 +1,113 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import tempfile
+from unittest.mock import patch
+from flask import Flask
+from app.services import module_discovery, process_pool
+from app.services.module_discovery import extract_module_info, clear_discovery_cache
+
+MODULE_SOURCE = '''from flask import Blueprint
+blueprint = Blueprint('sample', __name__)
+
+@blueprint.route('/sample/list')
+def sample_list():
+    pass
+
+@blueprint.route('/sample')
+def sample():
+    pass
+'''
+
+@pytest.fixture
+def module_path():
+    clear_discovery_cache()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'sample')
+        os.makedirs(path)
+        with open(os.path.join(path, 'sample.py'), 'w') as f:
+            f.write(MODULE_SOURCE)
+        with open(os.path.join(path, 'helpers.py'), 'w') as f:
+            f.write('def helper():\n    pass\n')
+        with Flask(__name__).app_context():
+            yield path
+
+def test_extract_module_info(module_path):
+    assert extract_module_info(module_path, 'sample') == {
+        'name': 'sample',
+        'blueprint': 'sample',
+        'primary_route': '/sample',
+        'routes': {'/sample/list': 'sample_list', '/sample': 'sample'},
+        'module_file': 'sample'
+    }
+
+def test_unchanged_files_are_not_parsed_again(module_path):
+    with patch.object(module_discovery.ast, 'parse', wraps=module_discovery.ast.parse) as parse:
+        first = extract_module_info(module_path, 'sample')
+        assert parse.call_count == 2
+        assert extract_module_info(module_path, 'sample') == first
+        assert parse.call_count == 2
+
+        # A changed file (new mtime and size) is parsed again, the other file is not
+        file_path = os.path.join(module_path, 'sample.py')
+        with open(file_path, 'a') as f:
+            f.write("\n@blueprint.route('/s')\ndef short():\n    pass\n")
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+        assert extract_module_info(module_path, 'sample')['primary_route'] == '/s'
+        assert parse.call_count == 3
+
+def test_broken_file_is_logged_and_retried(module_path):
+    with open(os.path.join(module_path, 'broken.py'), 'w') as f:
+        f.write('def broken(:\n')
+
+    with patch.object(module_discovery.ast, 'parse', wraps=module_discovery.ast.parse) as parse:
+        assert extract_module_info(module_path, 'sample')['blueprint'] == 'sample'
+        assert extract_module_info(module_path, 'sample')['blueprint'] == 'sample'
+        assert parse.call_count == 4  # Two good files parsed once, the broken one every time
+
+def make_module_tree(root, count):
+    for i in range(count):
+        path = os.path.join(root, f'module{i:03d}')
+        os.makedirs(path)
+        with open(os.path.join(path, f'module{i:03d}.py'), 'w') as f:
+            f.write(MODULE_SOURCE.replace('sample', f'module{i:03d}'))
+    with open(os.path.join(root, 'module001', 'broken.py'), 'w') as f:
+        f.write('def broken(:\n')
+
+def test_parallel_discovery_matches_serial(module_path):
+    root = os.path.join(os.path.dirname(module_path), 'modules')
+    make_module_tree(root, 6)
+
+    serial = module_discovery.discover_modules(root, workers=1)
+    clear_discovery_cache()
+    with patch.object(module_discovery, 'PARALLEL_MIN_FILES', 1), \
+         patch.object(process_pool, 'ProcessPoolExecutor', wraps=process_pool.ProcessPoolExecutor) as pool, \
+         patch('flask.current_app.logger.error') as log_error:
+        parallel = module_discovery.discover_modules(root, workers=2)
+
+    assert pool.called
+    assert pool.call_args[1]['mp_context'].get_start_method() != 'fork'
+    assert parallel == serial
+    assert [name for name, _ in parallel] == [f'module{i:03d}' for i in range(6)]
+    assert parallel[1][1]['primary_route'] == '/module001'
+
+    # The broken file is still reported on its own
+    assert log_error.call_count == 1
+    assert 'broken.py' in log_error.call_args[0][0]
@@ -0,0 +1,113 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import uuid
+import tempfile
+import threading
+from unittest.mock import MagicMock, patch
+from flask import Flask
+from app.services import module_loader
+from app.services.module_loader import import_timed, get_import_time, warm_up_modules, get_module_import_times, get_loading_strategy
+
+@pytest.fixture
+def source_dir():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sys.path.insert(0, temp_dir)
+        yield temp_dir
+        sys.path.remove(temp_dir)
+
+def make_module(source_dir, body='', fail=False):
+    # A uniquely named module that appends a line to "<name>.log" each time it is executed
+    name = f"loader_test_{uuid.uuid4().hex[:8]}"
+    log_path = os.path.join(source_dir, f"{name}.log")
+    with open(os.path.join(source_dir, f"{name}.py"), 'w') as f:
+        f.write(f"with open({log_path!r}, 'a') as log:\n    log.write('imported\\n')\n{body}\n")
+        if fail:
+            f.write("raise RuntimeError('broken module')\n")
+    return name, log_path
+
+def test_import_is_timed_once(source_dir):
+    name, log_path = make_module(source_dir)
+    module = import_timed(name)
+    record = get_import_time(name)
+    assert record['seconds'] >= 0 and record['error'] is None
+
+    assert import_timed(name) is module
+    assert get_import_time(name) is record
+
+def test_concurrent_first_imports_run_the_module_once(source_dir):
+    name, log_path = make_module(source_dir, body='import time\ntime.sleep(0.2)')
+    barrier = threading.Barrier(8)
+    modules = []
+
+    def first_request():
+        barrier.wait()
+        modules.append(import_timed(name))
+
+    threads = [threading.Thread(target=first_request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(modules) == 8 and all(module is modules[0] for module in modules)
+    with open(log_path) as f:
+        assert f.read() == 'imported\n'
+    assert get_import_time(name)['seconds'] >= 0.2
+
+def test_module_imported_by_another_is_recorded_as_preloaded(source_dir):
+    dependency, _ = make_module(source_dir)
+    importer, _ = make_module(source_dir, body=f'import {dependency}')
+    import_timed(importer)
+
+    assert import_timed(dependency) is sys.modules[dependency]
+    assert get_import_time(importer)['preloaded'] is False
+    assert get_import_time(dependency) == {'seconds': 0.0, 'loaded_at': get_import_time(dependency)['loaded_at'], 'error': None, 'preloaded': True}
+
+def test_slow_import_is_logged(source_dir):
+    name, _ = make_module(source_dir, body='import time\ntime.sleep(0.05)')
+    logger = MagicMock()
+    import_timed(name, budget_ms=10, logger=logger)
+    assert 'budget 10 ms' in logger.warning.call_args[0][0]
+
+def test_eager_warm_up_imports_enabled_modules(source_dir):
+    enabled, enabled_log = make_module(source_dir)
+    disabled, disabled_log = make_module(source_dir)
+    broken, _ = make_module(source_dir, fail=True)
+
+    app = Flask(__name__)
+    app.config['MODULE_LIST'] = [
+        {'name': enabled, 'module_file': 'main', 'enabled': True},
+        {'name': disabled, 'module_file': 'main', 'enabled': False},
+        {'name': broken, 'module_file': 'main', 'enabled': True},
+    ]
+    with patch.object(module_loader, 'module_import_name', lambda module: module['name']), \
+         patch.object(app.logger, 'error') as log_error:
+        warm_up_modules(app)
+        times = get_module_import_times(app.config['MODULE_LIST'])
+
+    assert os.path.exists(enabled_log) and not os.path.exists(disabled_log)
+    assert times[enabled]['error'] is None
+    assert times[disabled] is None
+    assert times[broken]['error'] == 'broken module'
+    assert broken in log_error.call_args[0][0]
+
+def test_loading_strategy_setting():
+    assert get_loading_strategy({}) == 'lazy'
+    assert get_loading_strategy({'MODULE_LOADING': 'EAGER'}) == 'eager'
+    assert get_loading_strategy({'MODULE_LOADING': 'sometimes'}) == 'lazy'
@@ -0,0 +1,76 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import json
+import time
+import tempfile
+from unittest.mock import patch
+from flask import Flask
+from app.services.startup_profiler import StartupProfiler
+
+def test_phases_are_nested_in_start_order():
+    profiler = StartupProfiler(enabled=True)
+    profiler.mark('imports')
+    with profiler.phase('create_app'):
+        with profiler.phase('init_db'):
+            time.sleep(0.01)
+        with profiler.phase('init_logger'):
+            pass
+    with profiler.phase('register_blueprints'):
+        pass
+
+    assert [(entry['name'], entry['parent']) for entry in profiler.phases] == [
+        ('imports', None), ('create_app', None), ('init_db', 'create_app'), ('init_logger', 'create_app'), ('register_blueprints', None)]
+    assert profiler.phases[1]['ms'] >= profiler.phases[2]['ms'] >= 10
+
+def test_failed_phase_is_still_timed():
+    profiler = StartupProfiler(enabled=True)
+    with pytest.raises(RuntimeError):
+        with profiler.phase('init_db'):
+            raise RuntimeError('Database locked')
+    assert profiler.phases[0]['ms'] is not None and not profiler.stack
+
+def test_disabled_profiler_records_nothing():
+    profiler = StartupProfiler(enabled=False)
+    profiler.mark('imports')
+    with profiler.phase('create_app'):
+        pass
+    assert profiler.phases == []
+    assert profiler.finish(Flask(__name__)) is None
+
+def test_finish_logs_and_writes_report():
+    profiler = StartupProfiler(enabled=True)
+    with profiler.phase('register_blueprints'):
+        with profiler.phase('admin_setup'):
+            pass
+
+    app = Flask(__name__)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_path = os.path.join(temp_dir, 'profile', 'startup.json')
+        with patch.dict(os.environ, {'STARTUP_PROFILE_REPORT': report_path}), patch.object(app.logger, 'info') as log_info:
+            profiler.finish(app, {'app.services.admin_setup': {'seconds': 0.1}, 'app.services.auth_service': {'seconds': 0.2}})
+
+        with open(report_path) as f:
+            report = json.load(f)
+    assert report['total_ms'] >= report['phases'][0]['ms']
+    assert [entry['module'] for entry in report['imports']] == ['app.services.auth_service', 'app.services.admin_setup']
+    assert report['imports'][0]['ms'] == 200.0
+
+    message = log_info.call_args[0][0]
+    assert message.startswith('Startup profile:') and 'register_blueprints/admin_setup' in message
+    assert '\n' not in message
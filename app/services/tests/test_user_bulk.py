@@ -0,0 +1,80 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import pytest
+import tempfile
+from flask import Flask
+from unittest.mock import patch
+from app.services import user_bulk
+from app.services.auth_service_db import setup_database, init_db, add_user, get_user, count_user_list
+from app.services.job_service import load_job, update_job, start_job, get_job_dir
+from app.services.user_bulk import create_bulk_job, run_bulk_job, describe_bulk_job, list_bulk_jobs
+
+@pytest.fixture
+def app():
+    setup_database({'USER_DATABASE_PATH': ':memory:'})
+    init_db()
+    for i in range(10):
+        add_user(f"user{i:02d}", f"user{i}", f"user{i}@example.com", 'password', is_active=i % 2 == 0, user_role='User')
+    add_user('admin', 'admin', 'admin@example.com', 'password', is_active=True, user_role='Admin')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app = Flask(__name__)
+        app.config.update({'JOB_DIRECTORY': os.path.join(temp_dir, 'jobs'), 'USER_BULK_CHUNK_SIZE': 3})
+        yield app
+
+def test_bulk_job_sets_role_with_progress(app):
+    job = create_bulk_job(app.config, 'set_role', {'role': 'User', 'active': None, 'email_prefix': None}, role='Staff', created_by='admin@example.com')
+    assert job['progress']['total'] == 10
+
+    run_bulk_job(app, job['id'])
+    job = load_job(get_job_dir(app.config), job['id'])
+    assert job['status'] == 'completed' and job['progress']['done'] == 10
+    assert job['checkpoint'] == 'user09'
+    assert count_user_list(role='Staff') == 10 and get_user('admin').user_role == 'Admin'
+    assert list_bulk_jobs(app.config)[0]['id'] == job['id']
+
+def test_bulk_job_resumes_from_checkpoint(app):
+    job = create_bulk_job(app.config, 'delete', {'role': None, 'active': False, 'email_prefix': None})
+    # An earlier run deleted the first chunk (user01, user03, user05), then stopped
+    job_dir = get_job_dir(app.config)
+    start_job(job_dir, job)
+    update_job(job_dir, job, checkpoint='user05', done=3)
+
+    run_bulk_job(app, job['id'])
+    job = load_job(job_dir, job['id'])
+    assert job['status'] == 'completed' and job['progress']['done'] == 5
+    assert get_user('user03') is not None  # Before the checkpoint, not touched by the resumed run
+    assert get_user('user07') is None and get_user('user09') is None
+
+def test_bulk_job_excludes_ids_and_records_errors(app):
+    job = create_bulk_job(app.config, 'deactivate', {'role': None, 'active': True, 'email_prefix': None}, exclude_ids=['admin'])
+    assert job['progress']['total'] == 5
+    run_bulk_job(app, job['id'])
+    assert get_user('admin').is_active and count_user_list(active=True) == 1
+
+    job = create_bulk_job(app.config, 'activate', {'role': None, 'active': None, 'email_prefix': None})
+    with patch.object(user_bulk, 'bulk_update_user_activation', side_effect=RuntimeError('database is locked')):
+        run_bulk_job(app, job['id'])
+    job = load_job(get_job_dir(app.config), job['id'])
+    assert job['status'] == 'failed' and job['error'] == 'database is locked'
+
+def test_bulk_job_validation_and_description():
+    with pytest.raises(ValueError):
+        create_bulk_job({}, 'promote', {})
+    assert describe_bulk_job({'action': 'set_role', 'role': None, 'filters': {'role': 'User', 'active': None}}) == "Set role to 'No Role' (role=User)"
+    assert describe_bulk_job({'action': 'delete', 'role': None, 'filters': {}}) == 'Delete (all users)'
@@ -0,0 +1,110 @@
+#----------------------------------------------------------------------------
+# Define "Project" Search Path
+#----------------------------------------------------------------------------
+import os
+import sys
+
+# Determine the path for this project (based on the project name)
+vs_project_name = os.environ.get('VS_PROJECT_FOLDER_NAME').lower()
+abs_path = os.path.abspath(__file__).lower()
+project_path = abs_path.split(vs_project_name)[0] + vs_project_name
+
+# Add the project path to sys.path
+sys.path.insert(0, project_path)
+
+#----------------------------------------------------------------------------
+# Begin Test Code
+#----------------------------------------------------------------------------
+import io
+import csv
+import pytest
+from unittest.mock import MagicMock, patch
+from flask import Flask, Blueprint
+from app.services import user_csv
+from app.services.user_csv import import_users_csv, iter_users_csv, iter_roles_csv, CsvImportError
+from app.services.auth_service_db import setup_database, init_db, add_user, get_user_by_email, get_token, query_users
+
+ROLE_NAMES = {'staff', 'viewer'}
+
+@pytest.fixture
+def app():
+    setup_database({'USER_DATABASE_PATH': ':memory:'})
+    init_db()
+
+    app = Flask(__name__)
+    app.config['PROJECT_NAME'] = 'Test Project'
+    auth = Blueprint('auth', __name__)
+    auth.add_url_rule('/create_password/<token>', 'create_password', lambda token: token)
+    app.register_blueprint(auth)
+    with app.test_request_context():
+        yield app
+
+@pytest.fixture
+def sent():
+    queue = MagicMock(return_value=MagicMock(success=True))
+    render = MagicMock(return_value=('<p>body</p>', 'body'))
+    with patch.object(user_csv, 'render_email', render), patch.object(user_csv, 'queue_email', queue):
+        queue.render = render
+        yield queue
+
+def csv_file(*lines):
+    return io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8'))
+
+def test_import_adds_inactive_users_with_activation(app, sent):
+    result = import_users_csv(csv_file('﻿Username,Email,Role', 'ann,Ann@Example.com,staff', 'bob,bob@example.com,'), ROLE_NAMES)
+
+    assert result['added'] == 2 and result['invalid'] == 0
+    user = get_user_by_email('ann@example.com')
+    assert user.username == 'ann' and user.user_role == 'staff' and not user.is_active
+    assert get_user_by_email('bob@example.com').user_role is None
+
+    assert sent.call_count == 2
+    assert sent.call_args_list[0][0][1] == ['ann@example.com']
+    token = sent.render.call_args_list[0][1]['activation_link'].rsplit('/', 1)[1]
+    assert get_token(token, 'activation').user_id == user.id
+
+def test_import_skips_invalid_duplicate_and_existing_rows(app, sent):
+    add_user('existing_id', 'existing', 'existing@example.com', 'password')
+    result = import_users_csv(csv_file(
+        'username,email,role',
+        'ann,ann@example.com,staff',
+        'ann again,ANN@example.com,staff',
+        'existing,existing@example.com,',
+        'nobody,not-an-email,',
+        'carl,carl@example.com,admin',
+        ',missing@example.com,'
+    ), ROLE_NAMES, batch_size=2)
+
+    assert (result['added'], result['duplicates'], result['existing'], result['invalid']) == (1, 1, 1, 3)
+    assert result['errors'][0] == 'Line 5: Invalid email format: not-an-email'
+    assert 'Unknown role: admin' in result['errors'][1]
+    assert sent.call_count == 1
+
+def test_import_without_activation_emails(app, sent):
+    result = import_users_csv(csv_file('username,email', 'ann,ann@example.com'), ROLE_NAMES, send_activation=False)
+    assert result['added'] == 1
+    sent.assert_not_called()
+
+def test_import_requires_the_columns(app, sent):
+    with pytest.raises(CsvImportError, match='email'):
+        import_users_csv(csv_file('username,mail', 'ann,ann@example.com'), ROLE_NAMES)
+    with pytest.raises(CsvImportError, match='empty'):
+        import_users_csv(io.BytesIO(b''), ROLE_NAMES)
+
+def test_export_streams_every_user(app):
+    for i in range(5):
+        add_user(f"id_{i}", f"user{i}", f"user{i}@example.com", 'password', user_role='staff')
+    add_user('formula_id', '=HYPERLINK("x")', 'formula@example.com', 'password')
+
+    chunks = list(iter_users_csv(page_size=2))
+    rows = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert rows[0] == list(user_csv.EXPORT_COLUMNS)
+    assert len(rows) == 7
+    assert {row[1] for row in rows[1:]} == {user['email'] for user in query_users(limit=10)['users']}
+    assert "'=HYPERLINK(\"x\")" in [row[0] for row in rows]
+
+def test_export_roles_with_user_counts(app):
+    add_user('staff_id', 'staffer', 'staff@example.com', 'password', user_role='staff')
+    roles = [{'name': 'staff', 'description': 'Staff', 'modules': ['reports', 'files']}, {'name': 'viewer', 'modules': []}]
+    rows = list(csv.reader(io.StringIO(''.join(iter_roles_csv(roles)))))
+    assert rows == [['role', 'description', 'modules', 'users'], ['staff', 'Staff', 'reports files', '1'], ['viewer', '', '', '0']]
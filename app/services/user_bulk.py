@@ -0,0 +1,77 @@
+import time
+import threading
+from app.services.auth_service_db import count_user_list, bulk_update_user_role, bulk_update_user_activation, bulk_delete_users
+from app.services.job_service import get_job_dir, create_job, load_job, list_jobs, update_job, start_job, finish_job, is_job_interrupted
+
+BULK_USER_JOB = 'bulk_users'
+BULK_USER_ACTIONS = ('set_role', 'activate', 'deactivate', 'delete')
+
+_running_jobs = set()
+_running_lock = threading.Lock()
+
+#----------------------------------------------------------------------------#
+# Bulk user changes (User Setup page): set the role of, activate, deactivate
+# or delete every user matching the table filters, as a resumable job
+#----------------------------------------------------------------------------#
+def create_bulk_job(config, action, filters, role=None, exclude_ids=(), created_by=None):
+    if action not in BULK_USER_ACTIONS:
+        raise ValueError(f"Unknown bulk action: {action}")
+    params = {'action': action, 'filters': filters, 'role': role or None, 'exclude_ids': list(exclude_ids)}
+    return create_job(get_job_dir(config), BULK_USER_JOB, params, total=count_user_list(exclude_ids=exclude_ids, **filters), created_by=created_by)
+
+def list_bulk_jobs(config, limit=10):
+    return list_jobs(get_job_dir(config), BULK_USER_JOB, limit)
+
+def iter_bulk_changes(params, after_id, chunk_size):
+    options = {'filters': params['filters'], 'after_id': after_id, 'chunk_size': chunk_size, 'exclude_ids': params['exclude_ids']}
+    if params['action'] == 'set_role':
+        return bulk_update_user_role(params['role'], **options)
+    if params['action'] == 'delete':
+        return bulk_delete_users(**options)
+    return bulk_update_user_activation(params['action'] == 'activate', **options)
+
+def describe_bulk_job(params):
+    action = f"Set role to '{params['role'] or 'No Role'}'" if params['action'] == 'set_role' else params['action'].capitalize()
+    filters = ', '.join(f"{name}={value}" for name, value in params['filters'].items() if value is not None)
+    return f"{action} ({filters or 'all users'})"
+
+def run_bulk_job(app, job_id):
+    job_dir = get_job_dir(app.config)
+    job = load_job(job_dir, job_id)
+    params = job['params']
+    start_job(job_dir, job)
+
+    # Counters continue from the checkpoint when an interrupted job is resumed
+    done_before = done = job['progress']['done']
+    started = time.perf_counter()
+
+    try:
+        with app.app_context():
+            for last_id, changed in iter_bulk_changes(params, job['checkpoint'], int(app.config.get('USER_BULK_CHUNK_SIZE', 500))):
+                done += changed
+                update_job(job_dir, job, checkpoint=last_id, done=done,
+                           per_second=round((done - done_before) / max(time.perf_counter() - started, 0.001)))
+        finish_job(job_dir, job)
+        app.logger.info(f"Bulk user change {describe_bulk_job(params)} finished: {done} users changed")
+    except Exception as e:
+        finish_job(job_dir, job, error=str(e))
+        app.logger.error(f"Bulk user change {describe_bulk_job(params)} stopped after {done} users. Reason: {str(e)}")
+    finally:
+        with _running_lock:
+            _running_jobs.discard(job_id)
+
+def start_bulk_job(app, job_id):
+    # Runs in a background thread; returns False if the job is already running (here or in another process)
+    job = load_job(get_job_dir(app.config), job_id)
+    if job is None or job['type'] != BULK_USER_JOB or job['status'] == 'completed':
+        return False
+    if job['status'] == 'running' and not is_job_interrupted(job):
+        return False
+
+    with _running_lock:
+        if job_id in _running_jobs:
+            return False
+        _running_jobs.add(job_id)
+
+    threading.Thread(target=run_bulk_job, args=(app, job_id), name=f"BulkUsers-{job_id[:8]}", daemon=True).start()
+    return True
@@ -0,0 +1,159 @@
+from flask import current_app, url_for
+from werkzeug.security import generate_password_hash
+from sqlalchemy.exc import IntegrityError
+from app.services.auth_service_db import find_existing_emails, add_users_bulk, query_users, get_role_user_counts
+from app.services.email_queue import queue_email
+from app.services.email_templates import render_email
+from datetime import datetime
+import io
+import re
+import csv
+import uuid
+import secrets
+
+#----------------------------------------------------------------------------#
+# Bulk user import and export (User Setup page)
+#
+# The upload is read row by row and handled in batches: one query finds the
+# emails of a batch that are already registered, the new users and their
+# activation tokens are inserted in one transaction, then the activation
+# emails are queued. Imported accounts start inactive with a random password
+# (one hash per import) until the user sets one through the activation link.
+#----------------------------------------------------------------------------#
+IMPORT_COLUMNS = ('username', 'email', 'role')
+EXPORT_COLUMNS = ('username', 'email', 'role', 'active', 'admin', 'eula_acknowledged', 'created_at')
+MAX_REPORTED_ERRORS = 100
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+class CsvImportError(ValueError):
+    pass
+
+def _open_csv(stream):
+    # Uploaded file (bytes) -> DictReader with lowercase header names; "utf-8-sig" drops an Excel BOM
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if reader.fieldnames is None:
+        raise CsvImportError('The file is empty')
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [name for name in ('username', 'email') if name not in reader.fieldnames]
+    if missing:
+        raise CsvImportError(f"Missing column(s): {', '.join(missing)} (expected {', '.join(IMPORT_COLUMNS)})")
+    return reader
+
+def validate_row(row, role_names):
+    # Returns (user dict, None) or (None, error message)
+    username = (row.get('username') or '').strip()
+    email = (row.get('email') or '').strip().lower()
+    role = (row.get('role') or '').strip() or None
+
+    if not username or not email:
+        return None, 'Username and email are required'
+    if len(username) > 50 or len(email) > 100:
+        return None, 'Username or email is too long'
+    if not EMAIL_PATTERN.match(email):
+        return None, f"Invalid email format: {email}"
+    if role and role not in role_names:
+        return None, f"Unknown role: {role}"
+    return {'username': username, 'email': email, 'role': role}, None
+
+def _insert_batch(batch, password_hash):
+    # Returns the rows that were added (rows whose email was taken meanwhile are dropped)
+    for _ in range(2):
+        existing = find_existing_emails(row['email'] for row in batch)
+        batch = [row for row in batch if row['email'] not in existing]
+        if not batch:
+            return []
+
+        users, tokens = [], []
+        for row in batch:
+            row['id'] = str(uuid.uuid4())
+            row['token'] = str(uuid.uuid4())
+            users.append({'id': row['id'], 'username': row['username'], 'email': row['email'], 'password': password_hash,
+                          'is_active': False, 'is_admin': False, 'user_role': row['role'], 'eula_acknowledged': False,
+                          'login_attempts': 0})
+            tokens.append({'id': str(uuid.uuid4()), 'user_id': row['id'], 'token': row['token'],
+                           'token_type': 'activation', 'expires_at': datetime.max})
+        try:
+            add_users_bulk(users, tokens)
+            return batch
+        except IntegrityError:
+            continue  # Another admin added one of these emails after the check, check again
+    raise CsvImportError('Could not add users, the email addresses keep changing')
+
+def _queue_activation_emails(rows):
+    failed = 0
+    subject = f"Activate your {current_app.config['PROJECT_NAME']} Account"
+    for row in rows:
+        activation_link = url_for('auth.create_password', token=row['token'], _external=True)
+        body, text = render_email('email/new_user_activation_email.html', username=row['username'], activation_link=activation_link)
+        if not queue_email(current_app.config, [row['email']], subject, body, html=True, text=text).success:
+            failed += 1
+    return failed
+
+def import_users_csv(stream, role_names, send_activation=True, batch_size=500):
+    # Needs a request context (activation links); returns counts and the first row errors
+    reader = _open_csv(stream)
+    password_hash = generate_password_hash(secrets.token_urlsafe(32), method='scrypt')
+    result = {'added': 0, 'existing': 0, 'duplicates': 0, 'invalid': 0, 'email_failed': 0, 'errors': []}
+    seen = set()
+    batch = []
+
+    def flush():
+        added = _insert_batch(batch, password_hash)
+        result['added'] += len(added)
+        result['existing'] += len(batch) - len(added)
+        if send_activation:
+            result['email_failed'] += _queue_activation_emails(added)
+        batch.clear()
+
+    for row in reader:
+        user, error = validate_row(row, role_names)
+        if error:
+            result['invalid'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append(f"Line {reader.line_num}: {error}")
+            continue
+        if user['email'] in seen:
+            result['duplicates'] += 1
+            continue
+        seen.add(user['email'])
+        batch.append(user)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    current_app.logger.info(f"Bulk user import: {result['added']} added, {result['existing']} already registered, "
+                            f"{result['duplicates']} duplicate and {result['invalid']} invalid rows")
+    return result
+
+#----------------------------------------------------------------------------#
+# Export (streamed one page of users at a time)
+#----------------------------------------------------------------------------#
+def _safe_cell(value):
+    # Keep spreadsheet programs from running cell content as a formula
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([_safe_cell(value) for value in values])
+    return buffer.getvalue()
+
+def iter_users_csv(page_size=1000):
+    yield _csv_line(EXPORT_COLUMNS)
+    cursor = None
+    while True:
+        page = query_users(sort='created_at', descending=False, cursor=cursor, limit=page_size)
+        for user in page['users']:
+            yield _csv_line([user['username'], user['email'], user['user_role'] or '', 'yes' if user['is_active'] else 'no',
+                             'yes' if user['is_admin'] else 'no', 'yes' if user['eula_acknowledged'] else 'no', user['created_at']])
+        cursor = page['next_cursor']
+        if not cursor:
+            return
+
+def iter_roles_csv(roles):
+    user_counts = get_role_user_counts()
+    yield _csv_line(('role', 'description', 'modules', 'users'))
+    for role in roles:
+        yield _csv_line([role['name'], role.get('description') or '', ' '.join(role.get('modules', [])), user_counts.get(role['name'], 0)])
@@ -0,0 +1,84 @@
+#----------------------------------------------------------------------------
+# Peak memory of sending one email with a large attachment: the message built
+# in memory (MIMEApplication + as_string + smtplib.sendmail) vs streamed from disk
+#
+#   python benchmarks/bench_email_attachments.py [--size-mb 20]
+#----------------------------------------------------------------------------
+import os
+import sys
+import time
+import smtplib
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.email_service import EmailService
+from app.services.email_stream import StreamingMessage, sendmail_stream
+
+class NullSMTP(smtplib.SMTP):
+    # Speaks just enough SMTP to accept a message and drop it
+    def __init__(self):
+        super().__init__()
+        self.ehlo_resp = b'null'
+        self.esmtp_features = {}
+        self.last_command = b''
+        self.received = 0
+
+    def send(self, s):
+        data = s.encode('ascii') if isinstance(s, str) else s
+        self.received += len(data)
+        self.last_command = data[:4].lower()
+
+    def getreply(self):
+        return (354, b'Go ahead') if self.last_command == b'data' else (250, b'OK')
+
+def measure(send):
+    tracemalloc.start()
+    started = time.perf_counter()
+    sent = send()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, seconds, sent
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        attachment = os.path.join(temp_dir, 'report.bin')
+        with open(attachment, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        service = EmailService({'EMAIL_FROM_ADDRESS': 'bench@example.com', 'EMAIL_STREAMING_THRESHOLD': -1})
+        to = ['recipient@example.com']
+
+        def in_memory():
+            conn = NullSMTP()
+            msg = service.build_message(to, 'Report', 'See attached.', attachments=[attachment])
+            conn.sendmail('bench@example.com', to, msg.as_string())
+            return conn.received
+
+        def streamed():
+            conn = NullSMTP()
+            msg = StreamingMessage(service.build_message(to, 'Report', 'See attached.'), [attachment])
+            sendmail_stream(conn, 'bench@example.com', to, msg.iter_bytes())
+            return conn.received
+
+        def spooled():
+            msg = StreamingMessage(service.build_message(to, 'Report', 'See attached.'), [attachment])
+            with open(os.path.join(temp_dir, 'failed.eml'), 'wb') as f:
+                msg.write_to(f)
+            return os.path.getsize(os.path.join(temp_dir, 'failed.eml'))
+
+        print(f"One email with a {args.size_mb} MB attachment")
+        for name, send in [('in memory (sendmail)', in_memory), ('streamed (sendmail_stream)', streamed), ('streamed to spool file', spooled)]:
+            peak, seconds, sent = measure(send)
+            print(f"  {name:<28} peak {peak / 1048576:>8.1f} MB  {seconds * 1000:>8.0f} ms  ({sent / 1048576:.1f} MB written)")
+
+if __name__ == '__main__':
+    main()
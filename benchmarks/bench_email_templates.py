@@ -0,0 +1,47 @@
+#----------------------------------------------------------------------------
+# Activation email bodies: render_template per message vs precompiled template
+#
+#   python benchmarks/bench_email_templates.py [--messages 10000]
+#----------------------------------------------------------------------------
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, render_template
+from app.services.email_templates import render_email, html_to_text
+
+TEMPLATE_NAME = 'email/activation_email.html'
+
+def run(render, count):
+    started = time.perf_counter()
+    for i in range(count):
+        render(username=f'user{i}', activation_link=f'https://example.com/activate/{i:032x}')
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=10000)
+    args = parser.parse_args()
+
+    template_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'services', 'auth_templates')
+    app = Flask(__name__, template_folder=template_folder)
+    app.config['PROJECT_NAME'] = 'Benchmark'
+
+    def jinja_render(**fields):
+        body = render_template(TEMPLATE_NAME, **fields)
+        return body, html_to_text(body)
+
+    print(f"{args.messages:,} activation emails (HTML + plain text)")
+    with app.test_request_context('/register'):
+        render_email(TEMPLATE_NAME, username='warm', activation_link='up')
+        for name, render in [('render_template + html_to_text', jinja_render),
+                             ('render_template (HTML only)', lambda **fields: render_template(TEMPLATE_NAME, **fields)),
+                             ('render_email (precompiled)', lambda **fields: render_email(TEMPLATE_NAME, **fields))]:
+            seconds = run(render, args.messages)
+            print(f"  {name:<35} {seconds * 1000:>10,.1f} ms  {args.messages / seconds:>12,.0f} messages/sec")
+
+if __name__ == '__main__':
+    main()
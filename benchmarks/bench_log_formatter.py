@@ -0,0 +1,67 @@
+#----------------------------------------------------------------------------
+# Log formatter throughput: tab separated RequestFormatter vs JsonLinesFormatter
+#
+#   python benchmarks/bench_log_formatter.py [--records 200000]
+#----------------------------------------------------------------------------
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_login import LoginManager
+from app.services import log_service
+from app.services.log_service import RequestFormatter, JsonLinesFormatter, TSV_LOG_FORMAT
+
+def make_records(count):
+    records = []
+    for i in range(count):
+        records.append(logging.LogRecord(
+            name='app', level=logging.ERROR if i % 10 == 0 else logging.INFO,
+            pathname='/srv/app/services/auth_service.py', lineno=120 + i % 50,
+            msg='Successful login: %s (Email: %s)', args=(f'user{i}', f'user{i}@example.com'),
+            exc_info=None, func='login'
+        ))
+    return records
+
+def run(formatter, records):
+    started = time.perf_counter()
+    for record in records:
+        formatter.format(record)
+    return len(records) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: None)
+
+    formatters = [
+        ('tsv (RequestFormatter)', lambda: RequestFormatter(TSV_LOG_FORMAT)),
+        ('jsonl (JsonLinesFormatter, %s)' % ('orjson' if 'orjson' in sys.modules else 'json'), JsonLinesFormatter),
+    ]
+
+    for context_name, make_context in [('no request context', app.app_context),
+                                       ('request context', lambda: app.test_request_context('/login'))]:
+        print(f"\n{context_name}: {args.records:,} records")
+        with make_context():
+            for name, factory in formatters:
+                rate = run(factory(), make_records(args.records))
+                print(f"  {name:<45} {rate:>12,.0f} records/sec")
+
+    # Standard library fallback for installs without orjson
+    if 'orjson' in sys.modules:
+        import json
+        log_service._dumps = lambda data: json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+        with app.app_context():
+            rate = run(JsonLinesFormatter(), make_records(args.records))
+        print(f"\n  {'jsonl (JsonLinesFormatter, json fallback)':<45} {rate:>12,.0f} records/sec")
+
+if __name__ == '__main__':
+    main()
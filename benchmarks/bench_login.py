@@ -0,0 +1,74 @@
+#----------------------------------------------------------------------------
+# Logins per second against a file database: the previous login flow (lookup,
+# update_user, reset_login_attempts) vs authenticate_user
+#
+#   python benchmarks/bench_login.py [--users 1000] [--logins 2000] [--hash scrypt]
+#
+# The password hash dominates a login; use --hash pbkdf2:sha256:1 to see the
+# database work alone.
+#----------------------------------------------------------------------------
+import os
+import sys
+import time
+import uuid
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+from app.services import auth_service_db
+from app.services.auth_service_db import (setup_database, init_db, add_users_bulk, get_user_by_email, update_user,
+                                          reset_login_attempts, increment_login_attempts, authenticate_user)
+
+def previous_login(email, password, is_admin):
+    user = get_user_by_email(email)
+    if user is None or user.is_locked_out():
+        return False
+    if not user.check_password(password) or not user.is_active:
+        increment_login_attempts(user.id)
+        get_user_by_email(email)
+        return False
+    user.is_admin = is_admin
+    update_user(user)
+    reset_login_attempts(user.id)
+    return True
+
+def current_login(email, password, is_admin):
+    return authenticate_user(email, password, is_admin).success
+
+def rate(login, emails, password):
+    started = time.perf_counter()
+    for email in emails:
+        login(email, password, False)
+    return len(emails) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--logins', type=int, default=2000)
+    parser.add_argument('--hash', default='scrypt')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        setup_database({'USER_DATABASE_PATH': os.path.join(temp_dir, 'users.db')})
+        init_db()
+        password_hash = generate_password_hash('password', method=args.hash)
+        add_users_bulk([{'id': str(uuid.uuid4()), 'username': f"user{i}", 'email': f"user{i}@example.com", 'password': password_hash,
+                         'is_active': True, 'is_admin': False, 'login_attempts': 0} for i in range(args.users)])
+
+        emails = [f"user{i % args.users}@example.com" for i in range(args.logins)]
+        # Four failed logins per user at most, so no account is locked
+        failed_emails = [f"user{i % args.users}@example.com" for i in range(min(args.logins, args.users * 4))]
+
+        print(f"{args.users} users, {args.logins} logins, hash {args.hash}")
+        for name, login in (('previous flow', previous_login), ('authenticate_user', current_login)):
+            success = rate(login, emails, 'password')
+            failed = rate(login, failed_emails, 'wrong')
+            with auth_service_db.engine.begin() as connection:
+                connection.execute(auth_service_db.text('UPDATE users SET login_attempts = 0, last_attempt_time = NULL, lockout_until = NULL'))
+            print(f"  {name:<20} {success:>8.0f} logins/s  {failed:>8.0f} failed logins/s")
+        auth_service_db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
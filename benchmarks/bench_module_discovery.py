@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------
+# Module Setup discovery over a generated module tree: serial vs process pool
+#
+#   python benchmarks/bench_module_discovery.py [--modules 500] [--routes 40] [--workers 0]
+#----------------------------------------------------------------------------
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from app.services.module_discovery import discover_modules, clear_discovery_cache, get_discovery_workers
+
+def make_module(root, name, routes):
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    lines = ["from flask import Blueprint, render_template, request", f"blueprint = Blueprint('{name}', __name__)", ""]
+    for i in range(routes):
+        lines += [f"@blueprint.route('/{name}/page{i}', methods=['GET', 'POST'])",
+                  f"def page{i}():",
+                  f"    items = [{{'id': n, 'label': f'item {{n}}'}} for n in range(request.args.get('count', {i}, type=int))]",
+                  f"    return render_template('{name}/page{i}.html', items=items)",
+                  ""]
+    with open(os.path.join(path, f'{name}.py'), 'w') as f:
+        f.write('\n'.join(lines))
+    with open(os.path.join(path, 'helpers.py'), 'w') as f:
+        f.write('\n'.join(f"def helper{i}(value):\n    return {{'value': value, 'index': {i}}}\n" for i in range(routes)))
+
+def run(modules_dir, workers):
+    started = time.perf_counter()
+    modules = discover_modules(modules_dir, workers)
+    return time.perf_counter() - started, modules
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules', type=int, default=500)
+    parser.add_argument('--routes', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=0, help='0 = one per CPU')
+    args = parser.parse_args()
+    workers = get_discovery_workers({'MODULE_DISCOVERY_WORKERS': args.workers})
+
+    with tempfile.TemporaryDirectory() as modules_dir, Flask(__name__).app_context():
+        for i in range(args.modules):
+            make_module(modules_dir, f'module{i:03d}', args.routes)
+
+        print(f"{args.modules} modules, {args.modules * 2} files, {args.routes} routes each, {workers} worker(s)")
+        run(modules_dir, 1)  # Warm up the OS file cache
+        clear_discovery_cache()
+        serial_seconds, serial = run(modules_dir, 1)
+        clear_discovery_cache()
+        parallel_seconds, parallel = run(modules_dir, workers)
+        cached_seconds, _ = run(modules_dir, workers)
+        assert parallel == serial
+
+        for name, seconds in [('serial (cold cache)', serial_seconds),
+                              ('process pool (cold cache)', parallel_seconds),
+                              ('unchanged files (warm cache)', cached_seconds)]:
+            print(f"  {name:<30} {seconds * 1000:>10,.1f} ms")
+        print(f"  speedup (process pool)         {serial_seconds / parallel_seconds:>10.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------------
+# Requests per second through the require_login hook of app.py, with
+# REQUIRE_LOGIN_FOR_SITE_ACCESS off and on, for a static file, the login page
+# and a page of a logged-in user. "previous hook" is the hook before public
+# endpoints were checked ahead of current_user.
+#
+#   python benchmarks/bench_require_login.py [--requests 2000]
+#----------------------------------------------------------------------------
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_PATH)
+
+def previous_hook(app):
+    from flask import request, redirect, url_for
+    from flask_login import current_user
+
+    def require_login():
+        public_endpoints = ['static', 'auth.login', 'auth.forgot', 'auth.reset_password', 'auth.create_password']
+        if app.config['REQUIRE_LOGIN_FOR_SITE_ACCESS']:
+            if not current_user.is_authenticated and request.endpoint not in public_endpoints:
+                return redirect(url_for('auth.login', next=request.url))
+    return require_login
+
+def rate(client, path, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        response = client.get(path)
+        response.close()
+    return count / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ.update(USER_DATABASE_DIRECTORY=os.path.join(work_dir, 'users'), LOG_FILE_DIRECTORY=os.path.join(work_dir, 'logs'),
+                      EMAIL_FAIL_DIRECTORY=os.path.join(work_dir, 'email'), JOB_DIRECTORY=os.path.join(work_dir, 'jobs'))
+    os.chdir(work_dir)
+
+    from app.app import app
+    from app.services.auth_service_db import add_user
+    app.logger.disabled = True
+    user = add_user('bench_user', 'bench', 'bench@example.com', 'password', is_active=True)
+
+    static_file = next(name for name in sorted(os.listdir(os.path.join(app.static_folder, 'css'))) if name.endswith('.css'))
+    paths = {'static file': f"/static/css/{static_file}", 'login page': '/login', 'home (logged in)': '/about'}
+    hooks = app.before_request_funcs[None]
+    current_hook = next(hook for hook in hooks if hook.__name__ == 'require_login')
+
+    print(f"{args.requests} requests per case")
+    for name, hook in (('current hook', current_hook), ('previous hook', previous_hook(app))):
+        hooks[hooks.index(next(h for h in hooks if h.__name__ == 'require_login'))] = hook
+        for required in (False, True):
+            app.config['REQUIRE_LOGIN_FOR_SITE_ACCESS'] = required
+            with app.test_client() as client:
+                with client.session_transaction() as session:
+                    session['_user_id'] = user.id
+                    session['_fresh'] = True
+                rates = '  '.join(f"{case} {rate(client, path, args.requests):>6.0f}/s" for case, path in paths.items())
+            print(f"  {name:<14} login required {'on ' if required else 'off'}  {rates}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#----------------------------------------------------------------------------
+# Cold start of app.py with the startup profiler, in fresh interpreters
+#
+#   python benchmarks/bench_startup.py [--runs 5] [--budget-ms 0]
+#
+# Prints the median of each phase; with --budget-ms the exit code is 1 when the
+# median total is over the budget (for CI).
+#----------------------------------------------------------------------------
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def profile_once(work_dir):
+    report_path = os.path.join(work_dir, 'startup_profile.json')
+    env = dict(os.environ, STARTUP_PROFILE='True', STARTUP_PROFILE_REPORT=report_path,
+               USER_DATABASE_DIRECTORY=os.path.join(work_dir, 'users'), LOG_FILE_DIRECTORY=os.path.join(work_dir, 'logs'),
+               EMAIL_FAIL_DIRECTORY=os.path.join(work_dir, 'email'), JOB_DIRECTORY=os.path.join(work_dir, 'jobs'))
+    subprocess.run([sys.executable, '-c', f"import sys; sys.path.insert(0, {PROJECT_PATH!r}); import app.app"],
+                   cwd=work_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+    with open(report_path) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    reports = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for _ in range(args.runs):
+            reports.append(profile_once(work_dir))
+
+    print(f"app.py startup, median of {args.runs} runs")
+    for i, entry in enumerate(reports[0]['phases']):
+        name = f"  {entry['parent']}/{entry['name']}" if entry['parent'] else entry['name']
+        print(f"  {name:<40} {statistics.median(report['phases'][i]['ms'] for report in reports):>9.1f} ms")
+    total = statistics.median(report['total_ms'] for report in reports)
+    print(f"  {'total':<40} {total:>9.1f} ms")
+
+    if args.budget_ms and total > args.budget_ms:
+        print(f"Startup is over the budget of {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
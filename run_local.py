@@ -1,4 +1,7 @@
-from app.app import app
+# Process pool workers (log search, module discovery) import this script again as "__mp_main__";
+# they must not create a second app with its own email queue and resender threads
+if __name__ != '__mp_main__':
+    from app.app import app
 
 if __name__ == '__main__':
     #----------------------------------------------------------------------------------------------------------------